@@ -0,0 +1,95 @@
+import os
+import random
+import shutil
+from typing import Iterable, List
+
+from git import Repo
+
+GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@localhost",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@localhost",
+}
+
+PHP_TEMPLATE = """<?php
+
+declare(strict_types=1);
+
+namespace {namespace};
+
+final class {cls}
+{{
+{body}
+}}
+"""
+
+
+def plugin_names(count: int) -> List[str]:
+    return [f"Plugin{i:04d}" for i in range(count)]
+
+
+def _php_file(rng: random.Random, namespace: str, cls: str) -> str:
+    methods = "\n".join(
+        f"    public function method{i}(int $value): int\n    {{\n        return $value * {rng.randint(1, 999)};\n    }}\n"
+        for i in range(rng.randint(2, 40))
+    )
+    return PHP_TEMPLATE.format(namespace=namespace, cls=cls, body=methods)
+
+
+def write_plugin(root: str, name: str, files: int, author: str, seed: int = 0) -> None:
+    rng       = random.Random(f"{name}:{seed}")
+    namespace = f"bench\\{name.lower()}"
+    src       = os.path.join(root, "src", "bench", name.lower())
+
+    os.makedirs(src, exist_ok=True)
+    with open(os.path.join(root, "plugin.yml"), "w") as f:
+        f.write(f"name: {name}\nversion: 1.0.{seed}\nmain: {namespace}\\Main\napi: 5.0.0\nauthor: {author}\n")
+
+    for i in range(max(files - 1, 1)):
+        # quelques sous-dossiers pour avoir une arborescence réaliste
+        sub = os.path.join(src, f"module{i % 5}") if i % 3 else src
+        os.makedirs(sub, exist_ok=True)
+        cls = "Main" if i == 0 else f"Class{i}"
+        with open(os.path.join(sub, f"{cls}.php"), "w") as f:
+            f.write(_php_file(rng, namespace, cls))
+
+
+def generate_plugins_dir(root: str, plugins: int, files: int, author: str) -> List[str]:
+    names = plugin_names(plugins)
+    for name in names:
+        write_plugin(os.path.join(root, name), name, files, author)
+    return names
+
+
+def create_remotes(remotes_dir: str, account: str, names: Iterable[str], files: int, author: str,
+                   changed_files: int = 1) -> None:
+    # chaque remote contient le plugin déployé avec quelques fichiers modifiés: le cas d'un update réel
+    for name in names:
+        work = os.path.join(remotes_dir, "_work", name)
+        write_plugin(work, name, files, author)
+
+        for i, path in enumerate(sorted(_php_files(work))[:changed_files]):
+            with open(path, "a") as f:
+                f.write(f"// modification {i}\n")
+
+        repo = Repo.init(work)
+        repo.git.add(A=True)
+        with repo.git.custom_environment(**GIT_IDENTITY):
+            repo.git.commit(m="bench")
+
+        bare = os.path.join(remotes_dir, account, f"{name}.git")
+        Repo.init(bare, bare=True)
+        repo.git.push(bare, "HEAD:refs/heads/main")
+        Repo(bare).git.symbolic_ref("HEAD", "refs/heads/main")
+
+    shutil.rmtree(os.path.join(remotes_dir, "_work"), ignore_errors=True)
+
+
+def _php_files(root: str) -> List[str]:
+    return [
+        os.path.join(current, name)
+        for current, _, names in os.walk(root)
+        for name in names
+        if name.endswith(".php")
+    ]
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import tarfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class GitHubStub:
+    def __init__(self, account: str, repos: Iterable[str], host: str = "127.0.0.1",
+                 sources: Optional[Dict[str, str]] = None):
+        self.account  = account
+        self.repos    = sorted(repos)
+        # repository -> dossier servi comme archive du commit (endpoint tarball)
+        self.sources  = dict(sources or {})
+        self.heads    = {name: hashlib.sha1(name.encode()).hexdigest() for name in [*self.repos, *self.sources]}
+        self.requests = Counter()
+        self._lock    = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self)
+
+        self._server = ThreadingHTTPServer((host, 0), Handler)
+        self.host, self.port = self._server.server_address
+        self.url = f"http://{self.host}:{self.port}"
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] += 1
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        url = urlparse(request.path)
+        if url.path == "/user/repos":
+            self._count("list_repos")
+            return self._list_repos(request, parse_qs(url.query))
+
+        parts = url.path.strip("/").split("/")
+        if len(parts) == 5 and parts[:2] == ["repos", self.account] and parts[3:] == ["commits", "HEAD"]:
+            self._count("head")
+            return self._head(request, parts[2])
+        if len(parts) == 5 and parts[:2] == ["repos", self.account] and parts[3] == "tarball":
+            # comme GitHub: redirection vers codeload, qui sert l'archive
+            self._count("tarball")
+            request.send_response(302)
+            request.send_header("Location", f"{self.url}/codeload/{parts[2]}/{parts[4]}")
+            request.end_headers()
+            return
+        if len(parts) >= 5 and parts[:2] == ["repos", self.account] and parts[3] == "contents" and parts[2] in self.sources:
+            self._count("contents")
+            return self._send_file(request, parts[2], "/".join(parts[4:]))
+        if len(parts) == 3 and parts[0] == "codeload" and parts[1] in self.sources:
+            self._count("codeload")
+            return self._send_tarball(request, parts[1])
+
+        self._count("other")
+        request.send_response(404)
+        request.end_headers()
+
+    def _send_json(self, request: BaseHTTPRequestHandler, payload, headers: dict) -> None:
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            self._count("not_modified")
+            request.send_response(304)
+            for key, value in headers.items():
+                request.send_header(key, value)
+            request.send_header("ETag", etag)
+            request.end_headers()
+            return
+
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.send_header("ETag", etag)
+        for key, value in headers.items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _head(self, request: BaseHTTPRequestHandler, name: str) -> None:
+        sha = self.heads.get(name)
+        if sha is None:
+            request.send_response(404)
+            request.end_headers()
+            return
+        body = sha.encode()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/vnd.github.sha")
+        request.send_header("Content-Length", str(len(body)))
+        request.send_header("ETag", f'"{sha}"')
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _send_file(self, request: BaseHTTPRequestHandler, name: str, rel_path: str) -> None:
+        # contenu brut (Accept: application/vnd.github.raw), 404 pour un fichier absent comme GitHub
+        path = os.path.join(self.sources[name], *rel_path.split("/"))
+        if ".." in rel_path.split("/") or not os.path.isfile(path):
+            request.send_response(404)
+            request.end_headers()
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/vnd.github.raw")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _send_tarball(self, request: BaseHTTPRequestHandler, name: str) -> None:
+        # même forme que git archive: dossier racine <compte>-<repo>-<sha court>, commit dans l'en-tête pax global
+        # généré au fil de l'envoi, sans Content-Length: la fin de la connexion marque la fin du corps
+        root, sha = self.sources[name], self.heads[name]
+        prefix    = f"{self.account}-{name}-{sha[:7]}"
+        request.send_response(200)
+        request.send_header("Content-Type", "application/x-gzip")
+        request.end_headers()
+
+        with tarfile.open(fileobj=request.wfile, mode="w|gz", format=tarfile.PAX_FORMAT,
+                          pax_headers={"comment": sha}) as tar:
+            tar.add(root, prefix, recursive=False)
+            for current, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                rel_dir = os.path.relpath(current, root).replace(os.sep, "/")
+                for entry in [*dirnames, *sorted(filenames)]:
+                    rel_path = entry if rel_dir == "." else f"{rel_dir}/{entry}"
+                    tar.add(os.path.join(current, entry), f"{prefix}/{rel_path}", recursive=False)
+
+    def _list_repos(self, request: BaseHTTPRequestHandler, query: dict) -> None:
+        per_page = int(query.get("per_page", ["30"])[0])
+        page     = int(query.get("page", ["1"])[0])
+        start    = (page - 1) * per_page
+        repos    = [{"name": name, "owner": {"login": self.account}} for name in self.repos[start:start + per_page]]
+
+        headers = {}
+        if start + per_page < len(self.repos):
+            headers["Link"] = f'<{self.url}/user/repos?per_page={per_page}&page={page + 1}>; rel="next"'
+        self._send_json(request, repos, headers)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"http_requests": dict(self.requests), "http_total": sum(self.requests.values())}
+
+    def start(self) -> "GitHubStub":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
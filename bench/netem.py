@@ -0,0 +1,110 @@
+import heapq
+import socket
+import threading
+import time
+from typing import Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Direction:
+    # relaie un sens de la connexion: chaque bloc est livré latence/2 plus tard, sans sérialiser les requêtes en vol
+    def __init__(self, src: socket.socket, dst: socket.socket, delay: float, bandwidth: Optional[float]):
+        self.src       = src
+        self.dst       = dst
+        self.delay     = delay
+        self.bandwidth = bandwidth
+        self.bytes     = 0
+
+        self._pending = []
+        self._seq     = 0
+        self._cond    = threading.Condition()
+        self._closed  = False
+
+    def start(self) -> None:
+        threading.Thread(target=self._read, daemon=True).start()
+        threading.Thread(target=self._write, daemon=True).start()
+
+    def _read(self) -> None:
+        while True:
+            try:
+                data = self.src.recv(CHUNK_SIZE)
+            except OSError:
+                data = b""
+            with self._cond:
+                if not data:
+                    self._closed = True
+                    self._cond.notify()
+                    return
+                heapq.heappush(self._pending, (time.monotonic() + self.delay, self._seq, data))
+                self._seq += 1
+                self._cond.notify()
+
+    def _write(self) -> None:
+        next_free = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                deliver_at, _, data = heapq.heappop(self._pending)
+
+            now = time.monotonic()
+            if self.bandwidth:
+                # débit limité: le lien reste occupé le temps d'envoyer le bloc
+                next_free = max(next_free, deliver_at) + len(data) / self.bandwidth
+                deliver_at = next_free
+            if deliver_at > now:
+                time.sleep(deliver_at - now)
+
+            try:
+                self.dst.sendall(data)
+            except OSError:
+                break
+            self.bytes += len(data)
+
+        try:
+            self.dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+class LatencyProxy:
+    def __init__(self, upstream: Tuple[str, int], latency_ms: float = 0.0, bandwidth: Optional[float] = None,
+                 host: str = "127.0.0.1"):
+        self.upstream  = upstream
+        self.delay     = latency_ms / 1000.0 / 2
+        self.bandwidth = bandwidth  # octets/s, None: illimité
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, 0))
+        self._sock.listen(16)
+        self.host, self.port = self._sock.getsockname()
+        self._directions = []
+
+    def start(self) -> "LatencyProxy":
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            server = socket.create_connection(self.upstream)
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for direction in (_Direction(client, server, self.delay, self.bandwidth),
+                              _Direction(server, client, self.delay, self.bandwidth)):
+                self._directions.append(direction)
+                direction.start()
+
+    @property
+    def bytes_transferred(self) -> int:
+        return sum(direction.bytes for direction in self._directions)
+
+    def stop(self) -> None:
+        self._sock.close()
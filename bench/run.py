@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.fixtures import create_remotes, generate_plugins_dir  # noqa: E402
+from bench.github_stub import GitHubStub  # noqa: E402
+from bench.netem import LatencyProxy  # noqa: E402
+from bench.sftp_server import LocalSFTPServer  # noqa: E402
+from main import AutoSync  # noqa: E402
+
+ACCOUNT = "bench"
+
+# réglages du transport comparés par --transport, chacun sur un environnement neuf
+TRANSPORT_PRESETS = {
+    "default": {},
+    "compression": {"ssh_compression": True},
+    "aes128-gcm": {"ssh_ciphers": ["aes128-gcm@openssh.com"]},
+    "aes128-ctr+etm": {"ssh_ciphers": ["aes128-ctr"], "ssh_macs": ["hmac-sha2-256-etm@openssh.com"]},
+    "window-16m": {"sftp_window_size": 16 * 1024 * 1024},
+    "packet-8k": {"sftp_max_packet_size": 8192},
+}
+
+
+class BenchEnvironment:
+    def __init__(self, workdir: str, plugins: int, files: int, targets: int, latency_ms: float,
+                 bandwidth: Optional[float], allow_exec: bool, servers: int = 1):
+        self.workdir     = workdir
+        self.remotes_dir = os.path.join(workdir, "remotes")
+
+        # chaque serveur part du même dossier plugins
+        roots = [os.path.join(workdir, f"server-{i}") for i in range(servers)]
+        os.makedirs(roots[0])
+        self.names   = generate_plugins_dir(os.path.join(roots[0], "plugins"), plugins, files, ACCOUNT)
+        self.targets = self.names[:targets]
+        for root in roots[1:]:
+            shutil.copytree(roots[0], root, symlinks=True)
+        create_remotes(self.remotes_dir, ACCOUNT, self.targets, files, ACCOUNT)
+
+        self.servers = [LocalSFTPServer(root, allow_exec=allow_exec).start() for root in roots]
+        self.proxies = [LatencyProxy((server.host, server.port), latency_ms, bandwidth).start() for server in self.servers]
+        self.github  = GitHubStub(ACCOUNT, self.names).start()
+
+        os.environ.update({
+            "SFTP_HOST": self.proxies[0].host,
+            "SFTP_PORT": str(self.proxies[0].port),
+            "SFTP_USER": "bench",
+            "SFTP_PASS": "bench",
+            "GITHUB": ACCOUNT,
+            "GITHUB_TOKEN": "bench-token",
+        })
+
+    def write_config(self, name: str, modes: List[str], overrides: dict) -> str:
+        config = {
+            "plugins_dir": "plugins",
+            "authors": [ACCOUNT],
+            "modes": modes,
+            "target_plugins": self.targets,
+            "github_api_url": self.github.url,
+            "github_url": f"file://{self.remotes_dir}",
+            "state_db": os.path.join(self.workdir, "state.db"),
+            "git_cache_dir": os.path.join(self.workdir, "git"),
+        }
+        if len(self.proxies) > 1:
+            config["servers"] = [
+                {"name": f"bench-{i}", "host": proxy.host, "port": proxy.port, "user": "bench"}
+                for i, proxy in enumerate(self.proxies)
+            ]
+        config.update(overrides)
+        path = os.path.join(self.workdir, f"{name}.yml")
+        with open(path, "w") as f:
+            yaml.safe_dump(config, f)
+        return path
+
+    def run(self, name: str, modes: List[str], full: bool, overrides: dict) -> dict:
+        config_path = self.write_config(name, modes, overrides)
+        for server in self.servers:
+            server.stats.reset()
+        self.github.reset()
+        proxy_bytes = sum(proxy.bytes_transferred for proxy in self.proxies)
+
+        started = time.perf_counter()
+        status  = AutoSync(full=full, config_path=config_path).run()
+        elapsed = time.perf_counter() - started
+
+        result = {
+            "scenario": name,
+            "exit_code": status,
+            "wall_time": round(elapsed, 3),
+            "wire_bytes": sum(proxy.bytes_transferred for proxy in self.proxies) - proxy_bytes,
+        }
+        result.update(_merge_snapshots([server.stats.snapshot() for server in self.servers]))
+        result.update(self.github.snapshot())
+        result["throughput"] = round(result["bytes_written"] / elapsed, 1) if elapsed > 0 else 0.0
+        return result
+
+    def close(self) -> None:
+        self.github.stop()
+        for proxy in self.proxies:
+            proxy.stop()
+        for server in self.servers:
+            server.stop()
+
+
+def _merge_snapshots(snapshots: List[dict]) -> dict:
+    merged = dict(snapshots[0])
+    merged["sftp_requests"] = dict(merged["sftp_requests"])
+    for snapshot in snapshots[1:]:
+        for key, value in snapshot.items():
+            if key == "sftp_requests":
+                for name, count in value.items():
+                    merged[key][name] = merged[key].get(name, 0) + count
+            else:
+                merged[key] += value
+    return merged
+
+
+def run_suite(args) -> dict:
+    scan_modes   = ["valid", "owned", "github"]
+    update_modes = scan_modes + ["update"]
+    overrides    = yaml.safe_load(args.config_overrides) if args.config_overrides else {}
+
+    with tempfile.TemporaryDirectory(prefix="autosync-bench-") as workdir:
+        env = BenchEnvironment(workdir, args.plugins, args.files, args.targets, args.latency,
+                               args.bandwidth, not args.no_exec, args.servers)
+        try:
+            scenarios = [
+                env.run("full_scan", scan_modes, True, overrides),
+                env.run("incremental_scan", scan_modes, False, overrides),
+                env.run("update", update_modes, False, overrides),
+                env.run("update_noop", update_modes, False, overrides),
+            ]
+        finally:
+            env.close()
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {
+            "plugins": args.plugins,
+            "files_per_plugin": args.files,
+            "targets": args.targets,
+            "servers": args.servers,
+            "latency_ms": args.latency,
+            "bandwidth": args.bandwidth,
+            "exec": not args.no_exec,
+            "config_overrides": overrides,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def run_transport_suite(args) -> dict:
+    # un update complet par réglage: les octets sur le fil montrent l'effet de la compression, le temps celui du reste
+    update_modes = ["valid", "owned", "github", "update"]
+    overrides    = yaml.safe_load(args.config_overrides) if args.config_overrides else {}
+    presets      = args.transport.split(",") if args.transport != "all" else list(TRANSPORT_PRESETS)
+
+    scenarios = []
+    for preset in presets:
+        with tempfile.TemporaryDirectory(prefix="autosync-bench-") as workdir:
+            env = BenchEnvironment(workdir, args.plugins, args.files, args.targets, args.latency,
+                                   args.bandwidth, not args.no_exec, args.servers)
+            try:
+                scenarios.append(env.run(preset, update_modes, True, {**overrides, **TRANSPORT_PRESETS[preset]}))
+            finally:
+                env.close()
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {
+            "plugins": args.plugins,
+            "files_per_plugin": args.files,
+            "targets": args.targets,
+            "servers": args.servers,
+            "latency_ms": args.latency,
+            "bandwidth": args.bandwidth,
+            "exec": not args.no_exec,
+            "config_overrides": overrides,
+            "transport": presets,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(previous: dict, current: dict) -> None:
+    before = {s["scenario"]: s for s in previous["scenarios"]}
+    for scenario in current["scenarios"]:
+        old = before.get(scenario["scenario"])
+        if not old:
+            continue
+        ratio = scenario["wall_time"] / old["wall_time"] if old["wall_time"] else 0
+        print(f"{scenario['scenario']:<18} {old['wall_time']:>8.2f}s -> {scenario['wall_time']:>8.2f}s "
+              f"(x{ratio:.2f}), round-trips {old['sftp_round_trips']} -> {scenario['sftp_round_trips']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark sftp_auto_sync contre un serveur SFTP local")
+    parser.add_argument("--plugins", type=int, default=50)
+    parser.add_argument("--files", type=int, default=20, help="fichiers par plugin")
+    parser.add_argument("--targets", type=int, default=5, help="plugins à mettre à jour")
+    parser.add_argument("--latency", type=float, default=20.0, help="latence aller-retour injectée (ms)")
+    parser.add_argument("--bandwidth", type=float, default=None, help="débit max (octets/s)")
+    parser.add_argument("--servers", type=int, default=1, help="serveurs SFTP synchronisés en une exécution")
+    parser.add_argument("--no-exec", action="store_true", help="serveur en sftp-only")
+    parser.add_argument("--config-overrides", help="YAML inline ajouté au config.yml généré")
+    parser.add_argument("--transport", help=f"compare des réglages SSH ({', '.join(TRANSPORT_PRESETS)} ou all)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="résultats précédents à comparer")
+    args = parser.parse_args()
+
+    if args.transport and args.transport != "all":
+        unknown = set(args.transport.split(",")) - set(TRANSPORT_PRESETS)
+        if unknown:
+            parser.error(f"réglages inconnus: {', '.join(sorted(unknown))}")
+
+    results = run_transport_suite(args) if args.transport else run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for scenario in results["scenarios"]:
+        print(f"{scenario['scenario']:<18} {scenario['wall_time']:>8.2f}s  round-trips={scenario['sftp_round_trips']:<6} "
+              f"http={scenario['http_total']:<4} écrit={scenario['bytes_written']} ({scenario['throughput']:.0f} o/s) "
+              f"fil={scenario['wire_bytes']}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import os
+import socket
+import subprocess
+import threading
+from collections import Counter
+from typing import Optional
+
+import paramiko
+from paramiko.sftp import CMD_NAMES
+
+_host_key: Optional[paramiko.RSAKey] = None
+_host_key_lock = threading.Lock()
+
+
+def host_key() -> paramiko.RSAKey:
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class ServerStats:
+    def __init__(self):
+        self.requests      = Counter()
+        self.exec_commands = 0
+        self.bytes_written = 0
+        self.bytes_read    = 0
+        self.connections   = 0
+        self._lock = threading.Lock()
+
+    def count_request(self, name: str) -> None:
+        with self._lock:
+            self.requests[name] += 1
+
+    def add(self, field: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.exec_commands = self.bytes_written = self.bytes_read = self.connections = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "sftp_requests": dict(self.requests),
+                "sftp_round_trips": sum(self.requests.values()),
+                "exec_commands": self.exec_commands,
+                "bytes_written": self.bytes_written,
+                "bytes_read": self.bytes_read,
+                "ssh_connections": self.connections,
+            }
+
+
+class _CountingSFTPServer(paramiko.SFTPServer):
+    def _process(self, t, request_number, msg):
+        self.server.stats.count_request(CMD_NAMES.get(t, str(t)))
+        return super()._process(t, request_number, msg)
+
+
+class _Handle(paramiko.SFTPHandle):
+    def __init__(self, stats: ServerStats, flags: int = 0):
+        super().__init__(flags)
+        self.stats = stats
+
+    def stat(self):
+        f = getattr(self, "readfile", None) or getattr(self, "writefile")
+        return paramiko.SFTPAttributes.from_stat(os.fstat(f.fileno()))
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+    def read(self, offset, length):
+        data = super().read(offset, length)
+        if isinstance(data, bytes):
+            self.stats.add("bytes_read", len(data))
+        return data
+
+    def write(self, offset, data):
+        self.stats.add("bytes_written", len(data))
+        return super().write(offset, data)
+
+
+class LocalSFTPInterface(paramiko.SFTPServerInterface):
+    def __init__(self, server, root: str, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root  = root
+        self.stats = server.stats
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, os.path.normpath("/" + path).lstrip("/"))
+
+    @staticmethod
+    def _errno(e: OSError) -> int:
+        return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def canonicalize(self, path):
+        return os.path.normpath("/" + path)
+
+    def list_folder(self, path):
+        try:
+            base = self._path(path)
+            return [
+                paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(base, name)), name)
+                for name in os.listdir(base)
+            ]
+        except OSError as e:
+            return self._errno(e)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return self._errno(e)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._path(path)))
+        except OSError as e:
+            return self._errno(e)
+
+    def open(self, path, flags, attr):
+        path = self._path(path)
+        try:
+            fd = os.open(path, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return self._errno(e)
+
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            return self._errno(e)
+
+        handle = _Handle(self.stats, flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        if os.path.exists(self._path(newpath)):
+            return paramiko.SFTP_FAILURE
+        try:
+            os.rename(self._path(oldpath), self._path(newpath))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.rename(self._path(oldpath), self._path(newpath))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._path(path))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._path(path))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            if attr._flags & attr.FLAG_AMTIME:
+                os.utime(self._path(path), (attr.st_atime, attr.st_mtime))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def symlink(self, target_path, path):
+        try:
+            os.symlink(target_path, self._path(path))
+        except OSError as e:
+            return self._errno(e)
+        return paramiko.SFTP_OK
+
+    def readlink(self, path):
+        try:
+            return os.readlink(self._path(path))
+        except OSError as e:
+            return self._errno(e)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, root: str, stats: ServerStats, allow_exec: bool):
+        self.root       = root
+        self.stats      = stats
+        self.allow_exec = allow_exec
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        if not self.allow_exec:
+            return False
+        self.stats.add("exec_commands")
+        threading.Thread(target=self._exec, args=(channel, command), daemon=True).start()
+        return True
+
+    def _exec(self, channel, command: bytes) -> None:
+        # les chemins relatifs des commandes sont résolus depuis la racine du faux serveur
+        result = subprocess.run(command.decode(), shell=True, cwd=self.root, capture_output=True)
+        channel.sendall(result.stdout)
+        channel.sendall_stderr(result.stderr)
+        channel.send_exit_status(result.returncode)
+        channel.close()
+
+
+class LocalSFTPServer:
+    def __init__(self, root: str, allow_exec: bool = True, host: str = "127.0.0.1", port: int = 0):
+        self.root       = root
+        self.allow_exec = allow_exec
+        self.stats      = ServerStats()
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(16)
+        self.host, self.port = self._sock.getsockname()
+
+        self._transports = []
+        self._stopped = threading.Event()
+        self._thread  = threading.Thread(target=self._accept_loop, daemon=True)
+
+    def start(self) -> "LocalSFTPServer":
+        self._thread.start()
+        return self
+
+    def _accept_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+
+            self.stats.add("connections")
+            transport = paramiko.Transport(conn)
+            # comme OpenSSH (Compression yes): zlib accepté, utilisé seulement si le client le demande
+            transport.use_compression(True)
+            transport.add_server_key(host_key())
+            transport.set_subsystem_handler("sftp", _CountingSFTPServer, LocalSFTPInterface, root=self.root)
+            interface = _ServerInterface(self.root, self.stats, self.allow_exec)
+            transport.start_server(server=interface)
+            self._transports.append(transport)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
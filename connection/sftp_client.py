@@ -1,14 +1,22 @@
 import os
+import select
 import socket
+import threading
+import time
 from contextlib import contextmanager
 from getpass import getpass
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 import paramiko
 from dotenv import load_dotenv
 
-from utils.exceptions import AuthentificationError
-from utils.logger import debug, success, info, error
+from utils.bandwidth import BandwidthLimiter, ThrottledSocket
+from utils.exceptions import AuthentificationError, TransferError
+from utils.logger import debug, success, info, error, warn
+from utils.metrics import metrics
+
+# lecture de la sortie des commandes distantes
+EXEC_CHUNK = 32 * 1024
 
 
 def load_credentials() -> dict:
@@ -53,75 +61,285 @@ def _cleanup_client(client: paramiko.SSHClient) -> None:
         pass
 
 
+def _close_channel(sftp: paramiko.SFTPClient) -> None:
+    try:
+        sftp.close()
+    except:
+        pass
+
+
+def _channel_alive(sftp: paramiko.SFTPClient) -> bool:
+    channel = sftp.get_channel()
+    return channel is not None and not channel.closed and channel.get_transport().is_active()
+
+
+def _prefer(preferred: List[str], supported: Tuple[str, ...], kind: str) -> Tuple[str, ...]:
+    # les algorithmes choisis passent en tête, les autres restent en repli si le serveur ne les propose pas
+    unknown = [name for name in preferred if name not in supported]
+    if unknown:
+        warn(f"{kind} non supportés par paramiko, ignorés: {', '.join(unknown)}")
+    first = [name for name in preferred if name in supported]
+    return tuple(first + [name for name in supported if name not in first])
+
+
 class SFTPManager:
-    def __init__(self, timeout: int = 60, max_retries: int = 3):
-        self.timeout = timeout
+    def __init__(self, timeout: int = 60, max_retries: int = 3, pool_size: int = 4, keepalive: int = 30,
+                 allow_exec: bool = True, credentials: Optional[dict] = None, compression: bool = False,
+                 ciphers: Optional[List[str]] = None, macs: Optional[List[str]] = None,
+                 window_size: Optional[int] = None, max_packet_size: Optional[int] = None,
+                 limiters: Optional[List[BandwidthLimiter]] = None):
+        self.timeout     = timeout
         self.max_retries = max_retries
+        self.pool_size   = pool_size
+        self.keepalive   = keepalive
+        self.host        = None
+        self.allow_exec  = allow_exec
+        self.credentials = credentials
+
+        # réglages du transport SSH, None: valeurs par défaut de paramiko
+        self.compression     = compression
+        self.ciphers         = list(ciphers or [])
+        self.macs            = list(macs or [])
+        self.window_size     = window_size
+        self.max_packet_size = max_packet_size
+        # débits partagés (global) ou propres à ce serveur, appliqués au socket du transport
+        self.limiters        = list(limiters or [])
+        self._exec_available: Optional[bool] = None
         self._client: Optional[paramiko.SSHClient] = None
         self._sftp: Optional[paramiko.SFTPClient] = None
 
+        # canaux SFTP supplémentaires multiplexés sur le même Transport
+        self._lock      = threading.RLock()
+        self._idle: List[paramiko.SFTPClient] = []
+        self._available = threading.BoundedSemaphore(pool_size)
+
     def _cleanup(self) -> None:
-        if self._sftp:
-            try:
-                self._sftp.close()
-            except:
-                pass
-            self._sftp = None
-        if self._client:
-            try:
-                self._client.close()
-            except:
-                pass
-            self._client = None
+        with self._lock:
+            for channel in self._idle:
+                _close_channel(channel)
+            self._idle = []
+
+            if self._sftp:
+                _close_channel(self._sftp)
+                self._sftp = None
+            if self._client:
+                try:
+                    self._client.close()
+                except:
+                    pass
+                self._client = None
+
+    def is_alive(self) -> bool:
+        if not self._client:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _open_channel(self) -> paramiko.SFTPClient:
+        sftp = self._client.open_sftp()
+        sftp.get_channel().settimeout(self.timeout)
+        return sftp
+
+    def _transport_factory(self, sock, **kwargs) -> paramiko.Transport:
+        # appelé par SSHClient.connect: fenêtre, taille de paquet et ordre des algorithmes fixés avant la négociation
+        if self.limiters:
+            sock = ThrottledSocket(sock, self.limiters)
+        transport = paramiko.Transport(
+            sock,
+            default_window_size=self.window_size or paramiko.common.DEFAULT_WINDOW_SIZE,
+            default_max_packet_size=self.max_packet_size or paramiko.common.DEFAULT_MAX_PACKET_SIZE,
+            **kwargs,
+        )
+        options = transport.get_security_options()
+        if self.ciphers:
+            options.ciphers = _prefer(self.ciphers, transport.preferred_ciphers, "Chiffrements")
+        if self.macs:
+            options.digests = _prefer(self.macs, transport.preferred_macs, "MAC")
+        return transport
 
     def connect(self):
-        if self._client and self._sftp:
-            try:
-                self._sftp.listdir()
-                return self._client, self._sftp
-            except:
+        with self._lock:
+            if self._client and self._sftp:
+                if self.is_alive() and _channel_alive(self._sftp):
+                    return self._client, metrics.instrument_sftp(self._sftp)
                 self._cleanup()
 
-        creds  = load_credentials()
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            # sans identifiants explicites (un seul serveur), lecture depuis l'environnement
+            creds  = self.credentials or load_credentials()
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+            max_retries = self.max_retries
+            for attempt in range(max_retries):
+                try:
+                    debug(f"Tentative de connexion au serveur SFTP {attempt + 1}/{max_retries}")
+
+                    with metrics.timed("ssh.connect"):
+                        client.connect(
+                            hostname=creds["hostname"],
+                            port=creds["port"],
+                            username=creds["username"],
+                            password=creds["password"],
+                            timeout=self.timeout,
+                            banner_timeout=30,
+                            auth_timeout=30,
+                            compress=self.compression,
+                            transport_factory=self._transport_factory,
+                        )
+
+                    transport = client.get_transport()
+                    if self.keepalive:
+                        transport.set_keepalive(self.keepalive)
+                    debug(f"Transport SSH: {transport.local_cipher}, MAC {transport.local_mac or '-'}, "
+                          f"compression {transport.local_compression}")
+
+                    self._client = client
+                    self._sftp   = self._open_channel()
+                    self.host    = f"{creds['username']}@{creds['hostname']}:{creds['port']}"
+
+                    success(f"La connexion au serveur SFTP a bien été établie")
+
+                    return client, metrics.instrument_sftp(self._sftp)
+                except paramiko.AuthenticationException as e:
+                    _cleanup_client(client)
+                    raise AuthentificationError(f"Erreur d'authentification {e}")
 
-        max_retries = self.max_retries
-        for attempt in range(max_retries):
+                except (socket.timeout, socket.error, paramiko.SSHException) as e:
+                    _cleanup_client(client)
+                    self._client = None
+                    if attempt == max_retries - 1:
+                        raise ConnectionError(f"La connexion au serveur SFTP a échoué: {e}")
+                    info(f"Tentative de reconnexion au serveur SFTP {attempt + 1}/{max_retries} après une erreur de connexion: {e}")
+            return None
+
+    def _acquire_channel(self) -> paramiko.SFTPClient:
+        with self._lock:
+            if not self.is_alive():
+                self.connect()
+
+            while self._idle:
+                channel = self._idle.pop()
+                if _channel_alive(channel):
+                    return channel
+                debug("Canal SFTP cassé, remplacement...")
+                _close_channel(channel)
+
+            return self._open_channel()
+
+    def _release_channel(self, channel: paramiko.SFTPClient, broken: bool) -> None:
+        with self._lock:
+            if broken or not _channel_alive(channel) or len(self._idle) >= self.pool_size:
+                _close_channel(channel)
+            else:
+                self._idle.append(channel)
+
+    @contextmanager
+    def lease(self, blocking: bool = True):
+        # en non bloquant, yield None si tous les canaux sont déjà pris
+        if not self._available.acquire(blocking=blocking):
+            yield None
+            return
+
+        try:
+            channel = self._acquire_channel()
+            broken  = False
+            try:
+                yield metrics.instrument_sftp(channel)
+            except (socket.error, EOFError, paramiko.SSHException):
+                broken = True
+                raise
+            finally:
+                self._release_channel(channel, broken)
+        finally:
+            self._available.release()
+
+    @contextmanager
+    def replacement(self):
+        # canal neuf pour un appelant dont le canal emprunté a été coupé: il garde sa place dans le pool
+        with self._lock:
+            if not self.is_alive():
+                self.connect()
+            channel = self._open_channel()
+
+        broken = False
+        try:
+            yield metrics.instrument_sftp(channel)
+        except (socket.error, EOFError, paramiko.SSHException):
+            broken = True
+            raise
+        finally:
+            self._release_channel(channel, broken)
+
+    @property
+    def throttled(self) -> bool:
+        # débit borné en ce moment (plage horaire comprise)
+        return any(limiter.active() for limiter in self.limiters)
+
+    def can_exec(self) -> bool:
+        return self.allow_exec and self._exec_available is not False
+
+    @staticmethod
+    def _drain(channel, timeout: float) -> Tuple[bytes, bytes]:
+        # stdout et stderr lus en alternance: lire l'un jusqu'au bout bloquerait dès que l'autre remplit la fenêtre SSH
+        stdout, stderr = [], []
+        idle_since = time.monotonic()
+        while True:
+            if channel.recv_ready():
+                stdout.append(channel.recv(EXEC_CHUNK))
+            elif channel.recv_stderr_ready():
+                stderr.append(channel.recv_stderr(EXEC_CHUNK))
+            elif channel.exit_status_ready():
+                return b"".join(stdout), b"".join(stderr)
+            elif time.monotonic() - idle_since > timeout:
+                # ni sortie ni fin pendant timeout secondes
+                raise socket.timeout()
+            else:
+                # le descripteur du canal se réveille sur stdout comme sur stderr
+                select.select([channel], [], [], 0.1)
+                continue
+            idle_since = time.monotonic()
+
+    def exec_command(self, command: str, timeout: Optional[int] = None) -> Tuple[int, bytes, bytes]:
+        with self._lock:
+            if not self.is_alive():
+                self.connect()
+            transport = self._client.get_transport()
+
+        with metrics.timed("ssh.exec") as timer:
             try:
-                debug(f"Tentative de connexion au serveur SFTP {attempt + 1}/{max_retries}")
-
-                client.connect(
-                    hostname=creds["hostname"],
-                    port=creds["port"],
-                    username=creds["username"],
-                    password=creds["password"],
-                    timeout=self.timeout,
-                    banner_timeout=30,
-                    auth_timeout=30
-                )
-
-                sftp = client.open_sftp()
-                sftp.get_channel().settimeout(self.timeout)
-
-                sftp.listdir()
-
-                success(f"La connexion au serveur SFTP a bien été établie")
-
-                self._client = client
-                self._sftp   = sftp
-
-                return client, sftp
-            except paramiko.AuthenticationException as e:
-                _cleanup_client(client)
-                raise AuthentificationError(f"Erreur d'authentification {e}")
-
-            except (socket.timeout, socket.error) as e:
-                _cleanup_client(client)
-                if attempt == max_retries - 1:
-                    raise ConnectionError(f"La connexion au serveur SFTP a échoué: {e}")
-                info(f"Tentative de reconnexion au serveur SFTP {attempt + 1}/{max_retries} après une erreur de connexion: {e}")
-        return None
+                channel = transport.open_session(timeout=self.timeout)
+                channel.exec_command(command)
+            except (paramiko.SSHException, socket.error) as e:
+                if not transport.is_active():
+                    # connexion coupée, pas un refus du serveur: exec reste disponible après reconnexion
+                    raise ConnectionError(f"connexion perdue pendant {command.split()[0]}: {e}")
+                # typiquement un serveur en sftp-only (ForceCommand internal-sftp)
+                self._exec_available = False
+                debug(f"Exécution de commandes distantes indisponible: {e}")
+                return -1, b"", str(e).encode()
+
+            try:
+                stdout, stderr = self._drain(channel, timeout or self.timeout)
+                status = channel.recv_exit_status()
+            except socket.timeout:
+                # commande encore en cours (long rm -rf / cp -a): exec reste disponible, mais pas de repli SFTP
+                # sur le même arbre pendant qu'elle tourne
+                channel.close()
+                raise TransferError(f"{command.split()[0]} sans réponse après {timeout or self.timeout}s: {command}")
+            except (paramiko.SSHException, socket.error) as e:
+                channel.close()
+                if not transport.is_active():
+                    raise ConnectionError(f"connexion perdue pendant {command.split()[0]}: {e}")
+                raise
+            channel.close()
+            timer.add_bytes(len(stdout) + len(stderr))
+
+        if status in (126, 127):
+            self._exec_available = False
+            debug(f"Commande distante introuvable ou refusée ({status}): {command}")
+        else:
+            self._exec_available = True
+        return status, stdout, stderr
 
     def close(self) -> None:
         self._cleanup()
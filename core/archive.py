@@ -0,0 +1,110 @@
+import os
+import posixpath
+import shlex
+import tarfile
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+from core.transfer import TransferStats, format_size
+from utils.logger import debug
+
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+WRITE_CHUNK    = 1024 * 1024
+
+
+def archive_path(remote_root: str) -> str:
+    return posixpath.join(posixpath.dirname(remote_root), f".{posixpath.basename(remote_root)}.autosync.tar.gz")
+
+
+@dataclass
+class PackedArchive:
+    buffer: BinaryIO
+    files: int
+    raw_size: int
+    packed_size: int
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def chunks(self, size: int) -> Iterator[bytes]:
+        # lecture par offset: la même archive peut partir vers plusieurs serveurs en même temps
+        offset = 0
+        while True:
+            with self._lock:
+                self.buffer.seek(offset)
+                data = self.buffer.read(size)
+            if not data:
+                return
+            offset += len(data)
+            yield data
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+class ArchiveCache:
+    # une même liste de fichiers n'est compressée qu'une fois pour tous les serveurs
+    def __init__(self):
+        self._archives: Dict[Tuple[str, Tuple[str, ...]], PackedArchive] = {}
+        self._lock = threading.Lock()
+
+    def pack(self, local_root: str, rel_paths: Iterable[str]) -> PackedArchive:
+        key = (local_root, tuple(rel_paths))
+        with self._lock:
+            packed = self._archives.get(key)
+            if packed is None:
+                packed = self._archives[key] = pack_files(local_root, key[1])
+            else:
+                debug(f"Archive de {len(key[1])} fichiers réutilisée")
+            return packed
+
+    def close(self) -> None:
+        with self._lock:
+            for packed in self._archives.values():
+                packed.close()
+            self._archives.clear()
+
+
+def pack_files(local_root: str, rel_paths: Iterable[str]) -> PackedArchive:
+    # en mémoire tant que l'archive reste petite, sur disque au-delà
+    buffer   = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    raw_size = 0
+    count    = 0
+
+    with tarfile.open(fileobj=buffer, mode="w:gz", compresslevel=6) as tar:
+        for rel_path in rel_paths:
+            local_path = os.path.join(local_root, rel_path)
+            tar.add(local_path, arcname=rel_path, recursive=False)
+            raw_size += os.path.getsize(local_path)
+            count    += 1
+
+    packed_size = buffer.tell()
+    buffer.seek(0)
+    return PackedArchive(buffer, count, raw_size, packed_size)
+
+
+def upload_archive(sftp, remote_root: str, packed: PackedArchive, sftp_manager=None) -> Optional[TransferStats]:
+    if sftp_manager is None or not sftp_manager.can_exec():
+        return None
+
+    stats  = TransferStats()
+    remote = archive_path(remote_root)
+
+    with sftp.open(remote, "wb", bufsize=WRITE_CHUNK) as dst:
+        dst.set_pipelined(True)
+        for data in packed.chunks(WRITE_CHUNK):
+            dst.write(data)
+
+    q_root, q_archive = shlex.quote(remote_root), shlex.quote(remote)
+    status, _, stderr = sftp_manager.exec_command(
+        f"mkdir -p -- {q_root} && tar -xzf {q_archive} -C {q_root}; status=$?; rm -f -- {q_archive}; exit $status"
+    )
+    if status != 0:
+        debug(f"Extraction distante impossible ({status}: {stderr.decode(errors='replace').strip()}), upload fichier par fichier")
+        return None
+
+    stats.files       = packed.files
+    stats.bytes       = packed.packed_size
+    stats.saved_bytes = max(packed.raw_size - packed.packed_size, 0)
+    debug(f"Archive {remote}: {format_size(packed.raw_size)} -> {format_size(packed.packed_size)}")
+    return stats.finish()
@@ -0,0 +1,199 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Set
+
+from utils.exceptions import GitHubError
+from utils.logger import debug, error, info, warn
+
+MAX_PAYLOAD_SIZE = 5 * 1024 * 1024
+# pushes groupés quand plusieurs repositories sont poussés à la suite
+PUSH_DEBOUNCE = 2.0
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+class WebhookListener:
+    def __init__(self, host: str, port: int, secret: Optional[str], on_push: Callable[[str], None]):
+        self.secret  = secret
+        self.on_push = on_push
+
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                listener._handle(self)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="webhook", daemon=True)
+
+    def start(self) -> "WebhookListener":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _reply(request: BaseHTTPRequestHandler, status: int) -> None:
+        request.send_response(status)
+        request.send_header("Content-Length", "0")
+        request.end_headers()
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        length = int(request.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_PAYLOAD_SIZE:
+            return self._reply(request, 413 if length > 0 else 400)
+        body = request.rfile.read(length)
+
+        if self.secret and not verify_signature(self.secret, body, request.headers.get("X-Hub-Signature-256")):
+            warn("Webhook: signature invalide, requête ignorée")
+            return self._reply(request, 401)
+
+        event = request.headers.get("X-GitHub-Event")
+        if event == "ping":
+            return self._reply(request, 200)
+        if event != "push":
+            return self._reply(request, 204)
+
+        try:
+            payload    = json.loads(body)
+            repository = payload["repository"]
+        except (ValueError, KeyError, TypeError):
+            return self._reply(request, 400)
+
+        # seule la branche par défaut est déployée
+        default_branch = repository.get("default_branch")
+        if default_branch and payload.get("ref") != f"refs/heads/{default_branch}":
+            debug(f"Webhook: push sur {payload.get('ref')} ignoré pour {repository.get('name')}")
+            return self._reply(request, 204)
+
+        self.on_push(repository["name"])
+        self._reply(request, 202)
+
+
+class Daemon:
+    def __init__(self, app):
+        self.app            = app
+        self.config         = app.config
+        self.poll_interval  = self.config.daemon_poll_interval
+        self.sweep_interval = self.config.daemon_sweep_interval
+        self.selector       = self.config.target_selector()
+        self.debounce       = PUSH_DEBOUNCE
+        self._pushes: "queue.Queue[str]" = queue.Queue()
+        self._heads: Dict[str, str] = {}
+
+        self.webhook = None
+        if self.config.webhook_port:
+            secret = os.getenv(self.config.webhook_secret_env)
+            if not secret:
+                warn(f"Webhook sans secret ({self.config.webhook_secret_env} vide): les signatures ne sont pas vérifiées")
+            self.webhook = WebhookListener(self.config.webhook_host, self.config.webhook_port, secret, self.notify)
+
+    def targets(self) -> Dict[str, str]:
+        # noms exacts de la config, plus les plugins des serveurs qui correspondent aux globs / regex
+        targets = {
+            name.lower(): name
+            for host in getattr(self.app, "hosts", [])
+            for name in self.selector.filter(host.listing)
+        }
+        targets.update(self.selector.names)
+        return targets
+
+    def notify(self, name: str) -> None:
+        if not self.selector.matches(name):
+            debug(f"Push sur {name} ignoré: pas dans target_plugins")
+            return
+        target = self.targets().get(name.lower(), name)
+        info(f"Push reçu pour {target}")
+        self._pushes.put(target)
+
+    def poll(self) -> List[str]:
+        changed = []
+        for key, name in self.targets().items():
+            try:
+                sha = self.app.github.head_commit(name)
+            except GitHubError as e:
+                debug(f"{name}: dernier commit indisponible: {e}")
+                continue
+
+            previous = self._heads.get(key)
+            if sha:
+                self._heads[key] = sha
+            if previous and sha and sha != previous:
+                info(f"{name}: nouveau commit {sha[:7]} sur GitHub")
+                changed.append(name)
+        return changed
+
+    def _wait_for_pushes(self, timeout: float) -> Set[str]:
+        names: Set[str] = set()
+        try:
+            names.add(self._pushes.get(timeout=max(timeout, 0.0)))
+        except queue.Empty:
+            return names
+
+        deadline = time.monotonic() + self.debounce
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return names
+            try:
+                names.add(self._pushes.get(timeout=remaining))
+            except queue.Empty:
+                return names
+
+    def _sweep(self, names: Optional[List[str]] = None) -> None:
+        # une erreur (serveur injoignable...) ne fait pas tomber le daemon, le passage suivant réessaie
+        try:
+            self.app.sweep(names)
+        except Exception as e:
+            error(f"Passage {'ciblé ' + str(names) if names else 'complet'} en échec: {e}")
+
+    def run(self) -> int:
+        if self.webhook is not None:
+            self.webhook.start()
+            info(f"Webhook GitHub en écoute sur {self.webhook.host}:{self.webhook.port}")
+
+        try:
+            # commits connus avant le premier passage: un push pendant celui-ci sera vu au prochain poll
+            if self.poll_interval:
+                self.poll()
+            self._sweep()
+            self.app.full = False
+
+            next_poll  = time.monotonic() + self.poll_interval if self.poll_interval else float("inf")
+            next_sweep = time.monotonic() + self.sweep_interval
+            info(f"Daemon démarré: poll GitHub {self.poll_interval or 'désactivé'}s, passage complet toutes les {self.sweep_interval}s")
+
+            while True:
+                pushed = self._wait_for_pushes(min(next_poll, next_sweep) - time.monotonic())
+                if pushed:
+                    self._sweep(sorted(pushed))
+
+                if time.monotonic() >= next_poll:
+                    changed = [name for name in self.poll() if name not in pushed]
+                    if changed:
+                        self._sweep(changed)
+                    next_poll = time.monotonic() + self.poll_interval
+
+                if time.monotonic() >= next_sweep:
+                    self._sweep()
+                    next_sweep = time.monotonic() + self.sweep_interval
+        finally:
+            if self.webhook is not None:
+                self.webhook.stop()
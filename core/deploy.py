@@ -0,0 +1,403 @@
+import posixpath
+import shlex
+import socket
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set
+
+from core.archive import ArchiveCache, PackedArchive, pack_files, upload_archive
+from core.manifest import Manifest, build_manifest, manifest_delta, read_manifest, remove_manifest, write_manifest
+from core.remover import remove_tree
+from core.sync import SyncDelta, apply_delta, compute_delta, scan_remote_tree
+from core.transfer import (FileEntry, IgnoredFiles, TransferCheckpoint, TransferStats, channel_lost, run_on_channels,
+                           scan_local_tree, upload_tree)
+from utils.exceptions import AuthentificationError, TransferError
+from utils.ignore import IgnoreRules
+from utils.logger import debug, info, warn
+from utils.metrics import metrics
+
+# staging et ancienne version, renommés vers / depuis plugins_dir (même système de fichiers)
+WORK_DIR = ".autosync"
+
+_cleanups: List[threading.Thread] = []
+_cleanups_lock = threading.Lock()
+
+
+@dataclass
+class DeployOptions:
+    strategy: str = "delta"  # delta ou full
+    checksum: bool = False
+    mode: str = "staged"  # staged ou in_place
+    workers: int = 1
+    transfer: str = "files"  # files ou archive
+    plugin_transfer: Dict[str, str] = field(default_factory=dict)
+    manifest: bool = True
+    trust_manifest: bool = True  # False (--full): l'arbre distant est toujours parcouru, le manifeste est seulement écrit
+    spot_checks: int = 20  # fichiers contrôlés avant de faire confiance au manifeste, 0 pour tous
+    retries: int = 5  # reprises après une coupure de connexion, 0 pour abandonner tout de suite
+    retry_delay: float = 1.0  # attente avant la première reprise, doublée à chaque fois
+    retry_max_delay: float = 30.0
+    excludes: List[str] = field(default_factory=list)  # motifs gitignore communs à tous les plugins, avant leur .syncignore
+
+    def for_plugin(self, name: str) -> "DeployOptions":
+        transfer = self.plugin_transfer.get(name.lower(), self.transfer)
+        return replace(self, transfer=transfer) if transfer != self.transfer else self
+
+    @property
+    def archive(self) -> bool:
+        return self.transfer == "archive"
+
+
+def work_dir(path: str) -> str:
+    # à côté de plugins_dir, pas dedans: une copie complète du plugin y serait listée (et chargée) comme un plugin
+    return posixpath.join(posixpath.dirname(posixpath.dirname(path)), WORK_DIR)
+
+
+def staging_path(path: str) -> str:
+    return posixpath.join(work_dir(path), f"{posixpath.basename(path)}.autosync-new")
+
+
+def backup_path(path: str) -> str:
+    return posixpath.join(work_dir(path), f"{posixpath.basename(path)}.autosync-old")
+
+
+def make_work_dir(sftp, path: str) -> None:
+    try:
+        sftp.mkdir(work_dir(path))
+    except IOError:
+        pass  # déjà là
+
+
+def _exists(sftp, path: str) -> bool:
+    try:
+        sftp.lstat(path)
+        return True
+    except IOError:
+        return False
+
+
+@dataclass
+class DeployPlan:
+    local_root: str
+    remote_root: str
+    options: DeployOptions
+    delta: Optional[SyncDelta] = None  # None: upload complet
+    packed: Optional[PackedArchive] = None
+    shared_archive: bool = False  # appartient à un ArchiveCache, fermé avec lui
+    manifest: Optional[Manifest] = None  # à écrire sur le serveur, None si celui en place est à jour
+    checkpoint: TransferCheckpoint = field(default_factory=TransferCheckpoint)
+    ignore: Optional[IgnoreRules] = None  # compilées une fois pour tous les parcours du plan
+    ignored: IgnoredFiles = field(default_factory=IgnoredFiles)
+
+    @property
+    def up_to_date(self) -> bool:
+        return self.delta is not None and self.delta.is_empty
+
+    def release(self) -> None:
+        if self.packed is not None and not self.shared_archive:
+            self.packed.close()
+        self.packed = None
+
+
+def plan_deploy(sftp, local_root: str, remote_root: str, options: DeployOptions, sftp_manager=None,
+                archives: Optional[ArchiveCache] = None, head: Optional[str] = None) -> DeployPlan:
+    # head: commit déployé, enregistré dans le manifeste du plugin
+    plan   = DeployPlan(local_root, remote_root, options)
+    ignore = plan.ignore = IgnoreRules.for_tree(local_root, options.excludes)
+    remote_manifest = read_manifest(sftp, remote_root) if options.manifest and options.trust_manifest and head else None
+
+    if options.strategy == "delta":
+        if remote_manifest is not None:
+            plan.delta = manifest_delta(sftp, local_root, remote_root, remote_manifest, options.spot_checks,
+                                        sftp_manager, options.workers, ignore, plan.ignored)
+        if plan.delta is None:
+            # manifeste présent mais contredit par le serveur: ses entrées encore exactes évitent de relire ces fichiers
+            plan.delta = compute_delta(sftp, local_root, remote_root, options.checksum, ignore, plan.ignored,
+                                       remote_manifest.files if remote_manifest is not None else None)
+
+    if options.manifest and head and not (plan.up_to_date and remote_manifest is not None and remote_manifest.sha == head):
+        plan.manifest = build_manifest(local_root, head, plan.delta, ignore)
+    if plan.up_to_date:
+        return plan
+
+    if options.archive and sftp_manager is not None and sftp_manager.can_exec():
+        if plan.delta is not None:
+            rel_paths = plan.delta.added + plan.delta.changed
+        else:
+            rel_paths = sorted(scan_local_tree(local_root, ignore, plan.ignored)[0])
+        if rel_paths and archives is not None:
+            plan.packed         = archives.pack(local_root, rel_paths)
+            plan.shared_archive = True
+        elif rel_paths:
+            plan.packed = pack_files(local_root, rel_paths)
+
+    return plan
+
+
+def _upload_tree(sftp, plan: DeployPlan, target: str, sftp_manager=None) -> TransferStats:
+    # l'archive d'un plan delta ne contient que les changements, elle ne convient pas pour un upload complet
+    if plan.packed is not None and plan.delta is None:
+        stats = upload_archive(sftp, target, plan.packed, sftp_manager)
+        if stats is not None:
+            return stats
+    return upload_tree(sftp, plan.local_root, target, sftp_manager, plan.options.workers, plan.checkpoint, plan.ignore,
+                       plan.ignored)
+
+
+def _apply_delta(sftp, plan: DeployPlan, target: str, sftp_manager=None) -> TransferStats:
+    info(f"{posixpath.basename(plan.remote_root)}: application des changements ({plan.delta.summary()})...")
+    return apply_delta(sftp, plan.local_root, target, plan.delta, sftp_manager, plan.options.workers, plan.packed,
+                       plan.checkpoint)
+
+
+def execute_in_place(sftp, plan: DeployPlan, sftp_manager=None) -> TransferStats:
+    checkpoint = plan.checkpoint
+    if plan.delta is not None:
+        # un déploiement interrompu ne doit pas laisser un manifeste qui ne correspond plus au contenu
+        remove_manifest(sftp, plan.remote_root)
+        stats = _apply_delta(sftp, plan, plan.remote_root, sftp_manager)
+    else:
+        if "cleared" not in checkpoint.steps:
+            remove_tree(sftp, plan.remote_root, sftp_manager, plan.options.workers)
+            checkpoint.steps.add("cleared")
+        stats = _upload_tree(sftp, plan, plan.remote_root, sftp_manager)
+
+    if plan.manifest is not None:
+        write_manifest(sftp, plan.remote_root, plan.manifest)
+    return stats
+
+
+def _prepare_staging(sftp, plan: DeployPlan, staging: str, sftp_manager=None) -> Optional[TransferStats]:
+    # None: delta sans copie côté serveur possible, à appliquer en place plutôt que de tout renvoyer dans le staging
+    remote_root = plan.remote_root
+    checkpoint  = plan.checkpoint
+
+    # reprise: la copie de la version en ligne est déjà faite, seuls les fichiers manquants partent
+    if "copied" in checkpoint.steps:
+        return _apply_delta(sftp, plan, staging, sftp_manager)
+
+    # copie côté serveur de la version en ligne, puis seul le delta est envoyé dans la copie
+    if plan.delta is not None and _exists(sftp, remote_root):
+        if sftp_manager is None or not sftp_manager.can_exec():
+            return None
+        status, _, stderr = sftp_manager.exec_command(f"cp -a -- {shlex.quote(remote_root)} {shlex.quote(staging)}")
+        if status == 0:
+            checkpoint.steps.update(("staging", "copied"))
+            return _apply_delta(sftp, plan, staging, sftp_manager)
+        debug(f"cp -a a échoué ({status}: {stderr.decode(errors='replace').strip()})")
+        remove_tree(sftp, staging, sftp_manager, plan.options.workers)
+        return None
+
+    checkpoint.steps.add("staging")
+    return _upload_tree(sftp, plan, staging, sftp_manager)
+
+
+def verify_tree(sftp, expected: Dict[str, FileEntry], staging: str) -> Dict[str, FileEntry]:
+    # tous les fichiers attendus sont présents avec la bonne taille, et rien de plus
+    remote_files, _ = scan_remote_tree(sftp, staging)
+
+    missing   = [p for p in expected if p not in remote_files]
+    extra     = [p for p in remote_files if p not in expected]
+    truncated = [p for p, entry in expected.items() if p in remote_files and remote_files[p].size != entry.size]
+    if missing or extra or truncated:
+        raise TransferError(f"vérification de {staging} échouée: {len(missing)} manquants, "
+                            f"{len(extra)} en trop, {len(truncated)} de taille différente")
+    return remote_files
+
+
+def remove_strays(sftp, staging: str, local_files: Dict[str, FileEntry], local_dirs: Set[str], sftp_manager=None,
+                  workers: int = 1) -> None:
+    # ajouts à la main dans un sous-dossier: le manifeste ne les voit pas, mais cp -a les a copiés dans le staging
+    remote_files, remote_dirs = scan_remote_tree(sftp, staging)
+    strays     = sorted(set(remote_files) - set(local_files))
+    stray_dirs = sorted(remote_dirs - local_dirs, key=lambda d: (-d.count("/"), d))
+    if not strays and not stray_dirs:
+        return
+
+    debug(f"{staging}: {len(strays)} fichiers absents du repository supprimés ({', '.join(strays[:5])})")
+    run_on_channels(sftp, strays, lambda channel, rel_path: channel.remove(posixpath.join(staging, rel_path)),
+                    sftp_manager, workers)
+    for rel_dir in stray_dirs:
+        sftp.rmdir(posixpath.join(staging, rel_dir))
+
+
+def _verify(sftp, plan: DeployPlan, staging: str, sftp_manager=None) -> Dict[str, FileEntry]:
+    local_files, local_dirs = scan_local_tree(plan.local_root, plan.ignore)
+    if "copied" in plan.checkpoint.steps:
+        remove_strays(sftp, staging, local_files, local_dirs, sftp_manager, plan.options.workers)
+    return verify_tree(sftp, local_files, staging)
+
+
+def swap_in(sftp, staging: str, live: str, sftp_manager=None, workers: int = 1) -> None:
+    old = backup_path(live)
+    if _exists(sftp, old):
+        remove_tree(sftp, old, sftp_manager, workers)
+
+    has_live = _exists(sftp, live)
+
+    # les deux renommages en une seule commande quand c'est possible: un seul aller-retour réseau
+    if sftp_manager is not None and sftp_manager.can_exec():
+        q_live, q_old, q_staging = shlex.quote(live), shlex.quote(old), shlex.quote(staging)
+        command = f"mv -- {q_staging} {q_live}"
+        if has_live:
+            command = f"mv -- {q_live} {q_old} && {command} || {{ mv -- {q_old} {q_live}; exit 1; }}"
+        status, _, _ = sftp_manager.exec_command(command)
+        if status == 0:
+            _cleanup_in_background(sftp, sftp_manager, old, workers, has_live)
+            return
+
+    if has_live:
+        sftp.rename(live, old)
+    try:
+        try:
+            sftp.posix_rename(staging, live)
+        except IOError:
+            sftp.rename(staging, live)
+    except IOError:
+        if has_live:
+            sftp.rename(old, live)
+        raise
+
+    _cleanup_in_background(sftp, sftp_manager, old, workers, has_live)
+
+
+def _cleanup_in_background(sftp, sftp_manager, old: str, workers: int, has_old: bool) -> None:
+    if not has_old:
+        return
+    if sftp_manager is None:
+        remove_tree(sftp, old)
+        return
+
+    plugin = metrics.current_plugin()
+
+    def cleanup() -> None:
+        try:
+            with metrics.plugin(plugin), sftp_manager.lease() as channel:
+                remove_tree(channel, old, sftp_manager, workers)
+            debug(f"Ancienne version {old} supprimée")
+        except Exception as e:
+            warn(f"Impossible de supprimer l'ancienne version {old}: {e}")
+
+    thread = threading.Thread(target=cleanup, name=f"cleanup-{posixpath.basename(old)}")
+    with _cleanups_lock:
+        _cleanups.append(thread)
+    thread.start()
+
+
+def wait_for_cleanups(timeout: Optional[float] = None) -> None:
+    with _cleanups_lock:
+        threads = list(_cleanups)
+        _cleanups.clear()
+    for thread in threads:
+        thread.join(timeout)
+
+
+def execute_staged(sftp, plan: DeployPlan, sftp_manager=None) -> TransferStats:
+    if "in_place" in plan.checkpoint.steps:
+        # reprise d'un delta déjà commencé dans le plugin en ligne
+        return execute_in_place(sftp, plan, sftp_manager)
+
+    staging = staging_path(plan.remote_root)
+    workers = plan.options.workers
+    make_work_dir(sftp, plan.remote_root)
+    if "staging" not in plan.checkpoint.steps:
+        plan.checkpoint.reset()
+        if _exists(sftp, staging):
+            # reste d'un déploiement interrompu (autre exécution, ou copie coupée en cours de route)
+            remove_tree(sftp, staging, sftp_manager, workers)
+
+    try:
+        stats = _prepare_staging(sftp, plan, staging, sftp_manager)
+        if stats is None:
+            # serveur en SFTP seul: remplir le staging coûterait un upload complet au lieu du seul delta
+            plan.checkpoint.steps.add("in_place")
+            warn(f"{posixpath.basename(plan.remote_root)}: pas de copie côté serveur (cp -a), changements appliqués "
+                 f"directement dans le plugin en ligne")
+            return execute_in_place(sftp, plan, sftp_manager)
+        remote_files = _verify(sftp, plan, staging, sftp_manager)
+        if plan.manifest is not None:
+            # écrit avant l'échange: le manifeste en ligne correspond toujours au contenu en ligne
+            plan.manifest.refresh(remote_files)
+            write_manifest(sftp, staging, plan.manifest)
+        else:
+            # copié par cp -a, il ne décrirait plus le contenu
+            remove_manifest(sftp, staging)
+        swap_in(sftp, staging, plan.remote_root, sftp_manager, workers)
+    except Exception as e:
+        if not connection_lost(e, sftp_manager):
+            remove_tree(sftp, staging, sftp_manager, workers)
+        # sinon le staging est gardé pour la reprise
+        raise
+    return stats
+
+
+def connection_lost(e: Exception, sftp_manager=None, sftp=None) -> bool:
+    # coupure du transport SSH ou du canal (reprise possible), par opposition à une opération refusée par le serveur
+    if sftp_manager is None or not hasattr(sftp_manager, "replacement") or isinstance(e, AuthentificationError):
+        return False
+    if isinstance(e, (ConnectionError, EOFError, socket.timeout)) or not sftp_manager.is_alive():
+        return True
+    return sftp is not None and channel_lost(sftp)
+
+
+def _execute(sftp, plan: DeployPlan, sftp_manager=None) -> Optional[TransferStats]:
+    if plan.up_to_date:
+        # contenu identique: seul le manifeste est (re)écrit s'il manque ou date d'un autre commit
+        if plan.manifest is not None and sftp is not None:
+            write_manifest(sftp, plan.remote_root, plan.manifest)
+        return None
+    if plan.options.mode == "staged":
+        return execute_staged(sftp, plan, sftp_manager)
+    return execute_in_place(sftp, plan, sftp_manager)
+
+
+def _count_ignored(plan: DeployPlan, stats: TransferStats) -> None:
+    ignored = plan.ignored
+    stats.ignored_files, stats.ignored_bytes = ignored.files, ignored.bytes
+
+    # le contenu des dossiers élagués n'a pas été parcouru: sa taille vient de l'index git (.git n'est pas du contenu)
+    dirs = [d for d in ignored.dirs if posixpath.basename(d) != ".git"]
+    if dirs:
+        from core.git_cache import tracked_size
+
+        size = tracked_size(plan.local_root, dirs)
+        if size is not None:
+            stats.ignored_files += size[0]
+            stats.ignored_bytes += size[1]
+
+
+def execute_deploy(sftp, plan: DeployPlan, sftp_manager=None) -> Optional[TransferStats]:
+    options    = plan.options
+    checkpoint = plan.checkpoint
+    name       = posixpath.basename(plan.remote_root)
+    try:
+        with ExitStack() as channels:
+            while True:
+                try:
+                    if sftp is None and checkpoint.attempts:
+                        sftp = channels.enter_context(sftp_manager.replacement())
+                    stats = _execute(sftp, plan, sftp_manager)
+                    if stats is not None:
+                        _count_ignored(plan, stats)
+                    return stats
+                except Exception as e:
+                    if not connection_lost(e, sftp_manager, sftp) or checkpoint.attempts >= options.retries:
+                        raise
+                    error = e
+
+                # reprise sur une nouvelle connexion, à partir du dernier fichier terminé
+                delay = min(options.retry_delay * 2 ** checkpoint.attempts, options.retry_max_delay)
+                checkpoint.attempts += 1
+                warn(f"{name}: connexion perdue ({error}), reprise {checkpoint.attempts}/{options.retries} "
+                     f"dans {delay:.0f}s ({len(checkpoint.uploaded)} fichiers déjà envoyés)")
+                time.sleep(delay)
+                channels.close()
+                sftp = None
+    finally:
+        plan.release()
+
+
+def deploy(sftp, local_root: str, remote_root: str, options: DeployOptions, sftp_manager=None) -> Optional[TransferStats]:
+    return execute_deploy(sftp, plan_deploy(sftp, local_root, remote_root, options, sftp_manager), sftp_manager)
@@ -0,0 +1,151 @@
+import base64
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from git import Git, Repo
+from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+
+from utils.logger import debug, info, warn
+from utils.metrics import metrics
+
+
+class GitSource:
+    # clone ou worktree sur disque, à l'inverse de TarballSource qui extrait l'archive directement sur le serveur
+    streaming = False
+
+    def __init__(self, account: str, token: Optional[str], cache_dir: Optional[str] = None, mirror: bool = True,
+                 shallow: bool = False, single_branch: bool = False, base_url: str = "https://github.com"):
+        self.account       = account
+        self.token         = token
+        self.cache_dir     = cache_dir
+        self.mirror        = mirror and bool(cache_dir)
+        self.shallow       = shallow
+        self.single_branch = single_branch
+        self.base_url      = base_url.rstrip("/")
+
+    def repo_url(self, name: str) -> str:
+        return f"{self.base_url}/{self.account}/{name}.git"
+
+    def _env(self) -> Dict[str, str]:
+        # le token passe par un header http, il n'est jamais écrit dans la config des miroirs
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if self.token:
+            credentials = base64.b64encode(f"x-access-token:{self.token}".encode()).decode()
+            env.update({
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": f"http.{self.base_url}/.extraheader",
+                "GIT_CONFIG_VALUE_0": f"AUTHORIZATION: basic {credentials}",
+            })
+        return env
+
+    def remote_head(self, name: str) -> Optional[str]:
+        try:
+            with metrics.timed("git.ls_remote"):
+                output = Git().ls_remote(self.repo_url(name), "HEAD", env=self._env())
+        except GitCommandError as e:
+            debug(f"{name}: ls-remote impossible: {e}")
+            return None
+        return output.split()[0] if output else None
+
+    def _mirror_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, "mirrors", f"{name}.git")
+
+    def _worktree_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, "worktrees", name)
+
+    def _sync_mirror(self, name: str) -> Repo:
+        path = self._mirror_path(name)
+        if os.path.isdir(path):
+            repo = Repo(path)
+            debug(f"{name}: fetch du miroir {path}")
+            with metrics.timed("git.fetch"):
+                repo.git.fetch("--prune", "origin", env=self._env())
+            return repo
+
+        info(f"{name}: création du miroir local...")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with metrics.timed("git.clone_mirror"):
+            return Repo.clone_from(self.repo_url(name), path, mirror=True, env=self._env())
+
+    def _mirror_corrupt(self, name: str) -> bool:
+        # distingue un miroir abîmé d'un échec réseau / d'authentification, où le cache reste bon
+        try:
+            repo = Repo(self._mirror_path(name))
+            repo.git.rev_parse("--verify", "HEAD")
+            repo.git.fsck("--connectivity-only", "--no-dangling")
+        except (GitCommandError, InvalidGitRepositoryError, NoSuchPathError):
+            return True
+        return False
+
+    def _checkout_worktree(self, name: str, mirror: Repo) -> Tuple[str, str]:
+        with metrics.timed("git.checkout"):
+            return self._update_worktree(name, mirror)
+
+    def _update_worktree(self, name: str, mirror: Repo) -> Tuple[str, str]:
+        path = self._worktree_path(name)
+        sha  = mirror.git.rev_parse("HEAD")
+
+        if os.path.isdir(path):
+            worktree = Repo(path)
+            # checkout ne réécrit que les fichiers modifiés, leur mtime reste stable pour le delta
+            worktree.git.checkout("--detach", "--force", sha)
+            worktree.git.clean("-fdx")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            mirror.git.worktree("prune")
+            mirror.git.worktree("add", "--detach", "--force", path, sha)
+
+        return path, sha
+
+    def _clone(self, name: str, path: str) -> str:
+        kwargs = {}
+        if self.shallow:
+            kwargs["depth"] = 1
+        if self.single_branch:
+            kwargs["single_branch"] = True
+
+        with metrics.timed("git.clone"):
+            repo = Repo.clone_from(self.repo_url(name), path, env=self._env(), **kwargs)
+        return repo.head.commit.hexsha
+
+    @contextmanager
+    def checkout(self, name: str) -> Iterator[Tuple[str, str]]:
+        if self.mirror:
+            try:
+                mirror = self._sync_mirror(name)
+            except (GitCommandError, InvalidGitRepositoryError):
+                # réseau, DNS, authentification, 5xx: le miroir est gardé, un nouveau clone échouerait pareil
+                if not os.path.isdir(self._mirror_path(name)) or not self._mirror_corrupt(name):
+                    raise
+                warn(f"{name}: miroir local corrompu, nouveau clone")
+                shutil.rmtree(self._mirror_path(name), ignore_errors=True)
+                shutil.rmtree(self._worktree_path(name), ignore_errors=True)
+                mirror = self._sync_mirror(name)
+
+            yield self._checkout_worktree(name, mirror)
+            return
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, name)
+            yield path, self._clone(name, path)
+
+
+def tracked_size(path: str, rel_dirs: List[str]) -> Optional[Tuple[int, int]]:
+    # (fichiers, octets) suivis par git sous rel_dirs, lus dans la base d'objets sans parcourir le disque
+    try:
+        output = Git(path).ls_tree("-r", "-l", "HEAD", "--", *rel_dirs)
+    except GitCommandError as e:
+        debug(f"{path}: taille des dossiers ignorés inconnue: {e}")
+        return None
+
+    files = size = 0
+    for line in output.splitlines():
+        # <mode> blob <sha> <taille>\t<chemin>, les sous-modules (commit) n'ont pas de taille
+        fields = line.split("\t", 1)[0].split()
+        if len(fields) == 4 and fields[1] == "blob":
+            files += 1
+            size  += int(fields[3])
+    return files, size
@@ -0,0 +1,202 @@
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.exceptions import GitHubError
+from utils.logger import debug
+from utils.metrics import metrics
+
+GITHUB_API_URL = "https://api.github.com"
+# réponse réduite au sha du commit
+SHA_MEDIA_TYPE = "application/vnd.github.sha"
+# contenu brut d'un fichier, sans l'enveloppe JSON en base64
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+
+
+def _slim_repo(repo: dict) -> dict:
+    # seuls ces champs sont utilisés, inutile de garder toute la réponse en cache
+    return {"name": repo["name"], "owner": {"login": (repo.get("owner") or {}).get("login", "")}}
+
+
+class GitHubClient:
+    def __init__(self, account: str, token: Optional[str], timeout: int = 30,
+                 api_url: str = GITHUB_API_URL, pool_size: int = 10, state=None):
+        self.account = account or ""
+        self.token   = token
+        self.timeout = timeout
+        self.api_url = api_url.rstrip("/")
+        self.state   = state
+        self.failed  = False
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+        self._repos: Optional[Set[str]] = None
+        self._heads: Dict[str, dict] = {}
+        self._lookups: Dict[str, Future] = {}  # repositories absents du listing, vérifiés un par un
+        self._lock = threading.Lock()
+
+    def _get(self, url: str, params: Optional[dict] = None, etag: Optional[str] = None,
+             accept: Optional[str] = None, statuses: Tuple[int, ...] = (200, 304)) -> requests.Response:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if accept:
+            headers["Accept"] = accept
+        try:
+            with metrics.timed("github.get") as timer:
+                resp = self.session.get(url, params=params, headers=headers or None, timeout=self.timeout)
+                timer.add_bytes(len(resp.content))
+        except requests.RequestException as e:
+            raise GitHubError(f"Requête GitHub échouée ({url}): {e}")
+
+        if resp.status_code == 304:
+            metrics.count("github.not_modified")
+
+        if resp.status_code not in statuses:
+            raise GitHubError(f"Réponse GitHub inattendue ({url}): {resp.status_code}")
+        return resp
+
+    def _pages(self, url: str, params: dict) -> Iterator[List[dict]]:
+        while url:
+            # chaque page est mise en cache avec son ETag, un 304 ne compte pas dans la limite d'API
+            cache_key = f"github:{self.account.lower()}:{url}"
+            cached    = self.state.get_meta(cache_key) if self.state else None
+            resp      = self._get(url, params=params, etag=cached["etag"] if cached else None)
+
+            if resp.status_code == 304 and cached:
+                page, next_url, etag = cached["items"], cached["next"], cached["etag"]
+            else:
+                page     = [_slim_repo(repo) for repo in resp.json()]
+                next_url = resp.links.get("next", {}).get("url")
+                etag     = resp.headers.get("ETag")
+                if self.state and etag:
+                    self.state.set_meta(cache_key, {"etag": etag, "next": next_url, "items": page})
+
+            yield page
+            # les pages suivantes contiennent déjà les paramètres dans l'url
+            url    = next_url
+            params = None
+
+    def load_repositories(self) -> Set[str]:
+        account = self.account.lower()
+        repos   = set()
+        pages   = self._pages(f"{self.api_url}/user/repos", {
+            "per_page": 100,
+            "affiliation": "owner,organization_member",
+        })
+
+        for page in pages:
+            for repo in page:
+                owner = (repo.get("owner") or {}).get("login", "")
+                if owner.lower() == account:
+                    repos.add(repo["name"].lower())
+
+        debug(f"GitHub: {len(repos)} repositories trouvés pour {self.account}")
+        return repos
+
+    @property
+    def repositories(self) -> Set[str]:
+        with self._lock:
+            if self._repos is None:
+                if not self.token:
+                    self._repos = set()
+                else:
+                    try:
+                        self._repos = self.load_repositories()
+                    except GitHubError:
+                        # on ne retente pas à chaque plugin
+                        self._repos = set()
+                        self.failed = True
+                        raise
+            return self._repos
+
+    def has_repository(self, name: str) -> bool:
+        if name.lower() in self.repositories:
+            return True
+        if not self.token or self.failed:
+            return False
+        # le listing ne couvre que les repositories possédés ou d'une organisation dont on est membre: un repository
+        # public du compte, ou dont on n'est que collaborateur, est vérifié directement comme avant le listing
+        # les workers d'analyse qui demandent le même nom attendent la première requête au lieu d'en envoyer une autre
+        key = name.lower()
+        with self._lock:
+            lookup = self._lookups.get(key)
+            owner  = lookup is None
+            if owner:
+                lookup = self._lookups[key] = Future()
+        if owner:
+            try:
+                resp = self._get(f"{self.api_url}/repos/{self.account}/{name}", statuses=(200, 404))
+            except GitHubError as e:
+                # pas mis en cache: retenté au prochain plugin du même nom
+                with self._lock:
+                    if self._lookups.get(key) is lookup:
+                        del self._lookups[key]
+                lookup.set_exception(e)
+                raise
+            lookup.set_result(resp.status_code == 200)
+        return lookup.result()
+
+    def refresh(self) -> None:
+        # relisté au prochain accès, les pages inchangées reviennent en 304
+        with self._lock:
+            self._repos = None
+            self._lookups.clear()
+            self.failed = False
+
+    def head_commit(self, name: str) -> Optional[str]:
+        # conditionnelle: tant que rien n'a été poussé la réponse est un 304, gratuit pour la limite d'API
+        cache_key = f"github:{self.account.lower()}:head:{name.lower()}"
+        cached    = self._heads.get(cache_key) or (self.state.get_meta(cache_key) if self.state else None)
+        resp      = self._get(f"{self.api_url}/repos/{self.account}/{name}/commits/HEAD",
+                              etag=cached["etag"] if cached else None, accept=SHA_MEDIA_TYPE)
+
+        if resp.status_code == 304 and cached:
+            return cached["sha"]
+
+        sha  = resp.text.strip() or None
+        etag = resp.headers.get("ETag")
+        if etag and sha:
+            entry = {"etag": etag, "sha": sha}
+            self._heads[cache_key] = entry
+            if self.state:
+                self.state.set_meta(cache_key, entry)
+        return sha
+
+    def file_contents(self, name: str, path: str, ref: str = "HEAD") -> Optional[bytes]:
+        # None quand le fichier n'existe pas dans ce commit
+        resp = self._get(f"{self.api_url}/repos/{self.account}/{name}/contents/{path}", params={"ref": ref},
+                         accept=RAW_MEDIA_TYPE, statuses=(200, 404))
+        return resp.content if resp.status_code == 200 else None
+
+    @contextmanager
+    def tarball(self, name: str, ref: str = "HEAD") -> Iterator[requests.Response]:
+        # réponse en streaming (redirigée vers codeload), le corps est lu au fur et à mesure par l'appelant
+        url = f"{self.api_url}/repos/{self.account}/{name}/tarball/{ref}"
+        try:
+            resp = self.session.get(url, stream=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise GitHubError(f"Requête GitHub échouée ({url}): {e}")
+
+        try:
+            if resp.status_code != 200:
+                raise GitHubError(f"Réponse GitHub inattendue ({url}): {resp.status_code}")
+            with metrics.timed("github.tarball") as timer:
+                yield resp
+                # octets reçus sur le fil, archive encore compressée
+                timer.add_bytes(resp.raw.tell())
+        finally:
+            resp.close()
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,55 @@
+import socket
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import paramiko
+
+from utils.exceptions import AuthentificationError
+from utils.logger import error
+
+# erreurs qui rendent tout le serveur inutilisable, les autres ne concernent qu'un plugin
+CONNECTION_ERRORS = (ConnectionError, EOFError, socket.timeout, paramiko.SSHException, AuthentificationError)
+
+
+@dataclass
+class HostSync:
+    name: str
+    plugins_dir: str
+    sftp_manager: object
+    index: Optional[object] = None
+    plugin_names: List[str] = field(default_factory=list)
+    listing: List[str] = field(default_factory=list)  # dernier listing complet de plugins_dir
+    plugin_mtimes: Dict[str, float] = field(default_factory=dict)
+    plugins: List[object] = field(default_factory=list)
+    error: Optional[str] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    @property
+    def label(self) -> str:
+        # pas de crochets: rich les interprète comme du balisage
+        return f"{self.name}: " if self.name else ""
+
+    def reset(self) -> None:
+        # nouveau passage: un serveur en échec est retenté, le listing complet est conservé
+        self.index        = None
+        self.plugin_names = []
+        self.plugin_mtimes = {}
+        self.plugins      = []
+        if self.sftp_manager is not None:
+            self.error = None
+
+    def fail(self, e: Exception) -> None:
+        with self._lock:
+            if self.error is not None:
+                return
+            self.error = str(e) or type(e).__name__
+        error(f"{self.label}Serveur abandonné pour cette exécution: {self.error}")
+
+    def check(self, e: Exception) -> None:
+        if isinstance(e, CONNECTION_ERRORS):
+            self.fail(e)
@@ -0,0 +1,187 @@
+import json
+import os
+import posixpath
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from core.sync import MANIFEST_NAME, SyncDelta, hash_local_file
+from core.transfer import FileEntry, IgnoredFiles, run_on_channels, scan_local_tree
+from utils.ignore import IgnoreRules
+from utils.logger import debug
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestEntry:
+    size: int
+    mtime: int
+    sha1: str
+
+
+@dataclass
+class Manifest:
+    sha: str
+    files: Dict[str, ManifestEntry] = field(default_factory=dict)
+    dirs: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+
+    def to_bytes(self) -> bytes:
+        data = {
+            "version": MANIFEST_VERSION,
+            "sha": self.sha,
+            "created_at": round(self.created_at, 3),
+            "dirs": self.dirs,
+            "files": {rel_path: asdict(entry) for rel_path, entry in sorted(self.files.items())},
+        }
+        return json.dumps(data, indent=1).encode()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "Manifest":
+        # ValueError si le fichier est illisible ou d'une autre version
+        try:
+            data = json.loads(raw)
+            if data.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"version {data.get('version')} non supportée")
+            return cls(
+                sha=data["sha"],
+                files={rel_path: ManifestEntry(**entry) for rel_path, entry in data["files"].items()},
+                dirs=list(data.get("dirs") or []),
+                created_at=data.get("created_at") or 0.0,
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"manifeste invalide: {e}")
+
+    def refresh(self, remote_files: Dict[str, FileEntry]) -> None:
+        # mtimes réels du serveur après le transfert
+        for rel_path, remote in remote_files.items():
+            entry = self.files.get(rel_path)
+            if entry is not None:
+                entry.mtime = remote.mtime
+
+
+def manifest_path(remote_root: str) -> str:
+    return posixpath.join(remote_root, MANIFEST_NAME)
+
+
+def read_manifest(sftp, remote_root: str) -> Optional[Manifest]:
+    try:
+        with sftp.open(manifest_path(remote_root), "rb") as f:
+            f.prefetch()
+            raw = f.read()
+    except IOError:
+        return None
+
+    try:
+        return Manifest.from_bytes(raw)
+    except ValueError as e:
+        debug(f"{manifest_path(remote_root)} ignoré: {e}")
+        return None
+
+
+def write_manifest(sftp, remote_root: str, manifest: Manifest) -> None:
+    with sftp.open(manifest_path(remote_root), "wb") as f:
+        f.write(manifest.to_bytes())
+
+
+def remove_manifest(sftp, remote_root: str) -> None:
+    try:
+        sftp.remove(manifest_path(remote_root))
+    except IOError:
+        pass
+
+
+def build_manifest(local_root: str, sha: str, delta: Optional[SyncDelta] = None,
+                   ignore: Optional[IgnoreRules] = None) -> Manifest:
+    # les fichiers non transférés gardent le mtime qu'ils ont sur le serveur
+    local_files, local_dirs = scan_local_tree(local_root, ignore)
+    hashes      = delta.local_hashes if delta is not None else {}
+    transferred = set(delta.added) | set(delta.changed) if delta is not None else set()
+
+    manifest = Manifest(sha, dirs=sorted(local_dirs))
+    for rel_path, local in local_files.items():
+        mtime  = local.mtime
+        remote = delta.remote_files.get(rel_path) if delta is not None and rel_path not in transferred else None
+        if remote is not None:
+            mtime = remote.mtime
+        digest = hashes.get(rel_path) or hash_local_file(os.path.join(local_root, rel_path))
+        manifest.files[rel_path] = ManifestEntry(local.size, mtime, digest)
+    return manifest
+
+
+def find_drift(sftp, remote_root: str, manifest: Manifest, spot_checks: int = 0, listing: Optional[Iterable[str]] = None,
+               sftp_manager=None, workers: int = 1) -> List[str]:
+    # spot_checks: nombre de fichiers dont la taille et le mtime sont contrôlés, 0 pour tous
+    drift: List[str] = []
+    lock = threading.Lock()
+
+    if listing is not None:
+        # premier niveau déjà listé (index distant): les ajouts manuels à la racine sont visibles sans requête
+        known = {rel_path.split("/", 1)[0] for rel_path in [*manifest.files, *manifest.dirs]}
+        drift.extend(name for name in listing if name not in known and name != MANIFEST_NAME)
+
+    paths = sorted(manifest.files)
+    if 0 < spot_checks < len(paths):
+        paths = random.sample(paths, spot_checks)
+
+    def check(channel, rel_path: str) -> None:
+        entry = manifest.files[rel_path]
+        try:
+            attr    = channel.stat(posixpath.join(remote_root, rel_path))
+            changed = attr.st_size != entry.size or int(attr.st_mtime or 0) != entry.mtime
+        except IOError:
+            changed = True
+        if changed:
+            with lock:
+                drift.append(rel_path)
+
+    run_on_channels(sftp, paths, check, sftp_manager, workers)
+    return sorted(drift)
+
+
+def compare_manifest(manifest: Manifest, local_root: str, ignore: Optional[IgnoreRules] = None,
+                     ignored: Optional[IgnoredFiles] = None) -> SyncDelta:
+    # même résultat que compute_delta, sans parcourir l'arbre distant
+    local_files, local_dirs = scan_local_tree(local_root, ignore, ignored)
+    delta = SyncDelta(remote_files={p: FileEntry(e.size, e.mtime) for p, e in manifest.files.items()})
+
+    for rel_path, local in sorted(local_files.items()):
+        entry = manifest.files.get(rel_path)
+        if entry is None:
+            delta.added.append(rel_path)
+        elif entry.size != local.size:
+            delta.changed.append(rel_path)
+        else:
+            digest = delta.local_hashes[rel_path] = hash_local_file(os.path.join(local_root, rel_path))
+            if digest != entry.sha1:
+                delta.changed.append(rel_path)
+            else:
+                delta.unchanged += 1
+
+    remote_dirs          = set(manifest.dirs)
+    delta.removed        = sorted(set(manifest.files) - set(local_files))
+    delta.dirs_to_create = sorted(local_dirs - remote_dirs, key=lambda d: (d.count("/"), d))
+    delta.dirs_to_remove = sorted(remote_dirs - local_dirs, key=lambda d: (-d.count("/"), d))
+    return delta
+
+
+def manifest_delta(sftp, local_root: str, remote_root: str, manifest: Manifest, spot_checks: int = 0,
+                   sftp_manager=None, workers: int = 1, ignore: Optional[IgnoreRules] = None,
+                   ignored: Optional[IgnoredFiles] = None) -> Optional[SyncDelta]:
+    # None quand le serveur ne correspond plus au manifeste: l'appelant revient au parcours complet
+    try:
+        listing = sftp.listdir(remote_root)
+    except IOError:
+        return None
+
+    drift = find_drift(sftp, remote_root, manifest, spot_checks, listing, sftp_manager, workers)
+    if drift:
+        debug(f"{remote_root}: modifié depuis le déploiement de {manifest.sha[:7]} ({', '.join(drift[:5])}), manifeste ignoré")
+        return None
+
+    delta = compare_manifest(manifest, local_root, ignore, ignored)
+    debug(lambda: f"Delta {remote_root} (manifeste {manifest.sha[:7]}): {delta.summary()}")
+    return delta
@@ -0,0 +1,286 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+from core.archive import ArchiveCache
+from core.deploy import DeployOptions, DeployPlan
+from core.hosts import HostSync
+from core.plugin import Plugin
+from utils.logger import debug, error, info, success, warn
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from core.git_cache import GitSource
+
+_DONE = object()
+
+
+@dataclass
+class DeployTarget:
+    plugin: Plugin
+    host: HostSync
+    last_sha: Optional[str] = None
+    plan: Optional[DeployPlan] = None
+
+    def release(self) -> None:
+        if self.plan is not None:
+            self.plan.release()
+
+
+@dataclass
+class UpdateJob:
+    # un repository, récupéré une seule fois, déployé sur un ou plusieurs serveurs
+    name: str
+    targets: List[DeployTarget]
+    stack: ExitStack = field(default_factory=ExitStack)
+    archives: ArchiveCache = field(default_factory=ArchiveCache)
+    local_path: Optional[str] = None
+    head: Optional[str] = None
+
+    def release(self) -> None:
+        # supprime le clone temporaire / libère les archives dès que le job quitte le pipeline
+        for target in self.targets:
+            target.release()
+        self.archives.close()
+        self.stack.close()
+
+
+class _Stage:
+    def __init__(self, name: str, workers: int, handler: Callable[[UpdateJob], bool], inbox: queue.Queue,
+                 outbox: Optional[queue.Queue], cancelled: threading.Event):
+        self.name      = name
+        self.handler   = handler
+        self.inbox     = inbox
+        self.outbox    = outbox
+        self.cancelled = cancelled
+        self.threads   = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self.inbox.get()
+            if job is _DONE:
+                return
+
+            if self.cancelled.is_set():
+                job.release()
+                continue
+
+            try:
+                with metrics.plugin(job.name), metrics.timed(f"pipeline.{self.name}"):
+                    keep = self.handler(job)
+            except Exception as e:
+                error(f"{job.name}: échec de l'étape {self.name}: {e}")
+                keep = False
+
+            if keep and self.outbox is not None:
+                # bloque quand l'étape suivante est saturée: c'est ce qui borne le disque utilisé
+                self.outbox.put(job)
+            else:
+                job.release()
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join()
+
+
+class UpdatePipeline:
+    def __init__(self, sftp_manager, source: "GitSource", options: DeployOptions, fetch_workers: int = 2,
+                 prepare_workers: int = 1, deploy_workers: int = 1, queue_size: int = 2,
+                 on_deployed: Optional[Callable[[Plugin], None]] = None):
+        self.sftp_manager = sftp_manager
+        # serveur utilisé par submit(), les jobs multi-serveurs portent le leur
+        self.host         = HostSync("", "", sftp_manager)
+        self.source       = source
+        self.options      = options
+        self.on_deployed  = on_deployed
+        self.cancelled    = threading.Event()
+        self._closed      = False
+
+        self._fetch_queue   = queue.Queue(maxsize=queue_size)
+        self._prepare_queue = queue.Queue(maxsize=queue_size)
+        self._deploy_queue  = queue.Queue(maxsize=queue_size)
+
+        self._stages: List[_Stage] = [
+            _Stage("fetch", fetch_workers, self._fetch, self._fetch_queue, self._prepare_queue, self.cancelled),
+            _Stage("prepare", prepare_workers, self._prepare, self._prepare_queue, self._deploy_queue, self.cancelled),
+            _Stage("deploy", deploy_workers, self._deploy, self._deploy_queue, None, self.cancelled),
+        ]
+        for stage in self._stages:
+            stage.start()
+
+    def _fan_out(self, stage: str, job: UpdateJob, action: Callable[[DeployTarget], bool]) -> bool:
+        # chaque serveur avance de son côté: un serveur en échec n'arrête pas les autres
+        def run(target: DeployTarget) -> bool:
+            try:
+                with metrics.plugin(job.name):
+                    return action(target)
+            except Exception as e:
+                error(f"{target.plugin.label}: échec de l'étape {stage}: {e}")
+                target.host.check(e)
+                return False
+
+        targets = [target for target in job.targets if not target.host.failed]
+        if len(targets) == 1:
+            keep = [run(targets[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=max(len(targets), 1), thread_name_prefix=stage) as executor:
+                keep = list(executor.map(run, targets))
+
+        job.targets = []
+        for target, kept in zip(targets, keep):
+            if kept:
+                job.targets.append(target)
+            else:
+                target.release()
+        return bool(job.targets)
+
+    def _already_deployed(self, target: DeployTarget, remote_sha: Optional[str]) -> bool:
+        if not remote_sha or target.last_sha != remote_sha:
+            return False
+        success(f"{target.plugin.label}: déjà déployé au commit {remote_sha[:7]}, rien à faire")
+        target.plugin.deployed_sha = remote_sha
+        return True
+
+    def _fetch(self, job: UpdateJob) -> bool:
+        streaming  = self.source.streaming
+        targets    = [target for target in job.targets if not target.host.failed]
+        remote_sha = None
+        if targets and (streaming or all(target.last_sha for target in targets)):
+            # ls-remote seulement si tous les serveurs connaissent leur commit, sinon le clone est nécessaire de toute façon
+            # en streaming le commit est toujours demandé: c'est lui qui fixe l'archive téléchargée
+            remote_sha = self.source.remote_head(job.name)
+            targets    = [target for target in targets if not self._already_deployed(target, remote_sha)]
+
+        job.targets = targets
+        if not targets:
+            return False
+
+        if streaming:
+            # rien à récupérer sur disque, l'étape deploy lit l'archive directement
+            job.head = remote_sha
+            return True
+
+        info(f"{job.name}: Récupération du repository...")
+        job.local_path, job.head = job.stack.enter_context(self.source.checkout(job.name))
+        info(f"{job.name}: Repository prêt au commit {job.head[:7]}")
+        return True
+
+    def _prepare(self, job: UpdateJob) -> bool:
+        if self.source.streaming:
+            # sans arbre local, pas de delta à calculer
+            return True
+
+        def prepare(target: DeployTarget) -> bool:
+            manager = target.host.sftp_manager
+            with manager.lease() as sftp:
+                target.plan = target.plugin.prepare(sftp, job.local_path, self.options, manager, job.archives, job.head)
+                if target.plan.up_to_date:
+                    # rien à transférer, au plus le manifeste à écrire
+                    target.plugin.deploy_plan(sftp, target.plan, job.head, manager)
+
+            if target.plan.up_to_date:
+                self._deployed(target.plugin)
+                return False
+            return True
+
+        return self._fan_out("prepare", job, prepare)
+
+    def _deploy(self, job: UpdateJob) -> bool:
+        def deploy(target: DeployTarget) -> bool:
+            manager = target.host.sftp_manager
+            with manager.lease() as sftp:
+                if self.source.streaming:
+                    target.plugin.deploy_tarball(sftp, self.source, job.head, self.options, manager)
+                else:
+                    target.plugin.deploy_plan(sftp, target.plan, job.head, manager)
+            self._deployed(target.plugin)
+            return False
+
+        self._fan_out("deploy", job, deploy)
+        return False
+
+    def _deployed(self, plugin: Plugin) -> None:
+        if self.on_deployed is not None:
+            self.on_deployed(plugin)
+
+    def submit(self, plugin: Plugin, last_sha: Optional[str] = None) -> None:
+        self.submit_targets(plugin.name, [DeployTarget(plugin, self.host, last_sha)])
+
+    def submit_targets(self, name: str, targets: List[DeployTarget]) -> None:
+        if self.cancelled.is_set() or not targets:
+            return
+        servers = f" ({len(targets)} serveurs)" if len(targets) > 1 else ""
+        debug("%s: ajouté au pipeline de mise à jour%s", name, servers)
+        self._fetch_queue.put(UpdateJob(name, targets))
+
+    def cancel(self) -> None:
+        if not self.cancelled.is_set():
+            warn("Annulation du pipeline de mise à jour, les étapes en cours se terminent...")
+        self.cancelled.set()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        # chaque étape se termine après avoir vidé sa file, puis libère la suivante
+        inboxes = [self._fetch_queue, self._prepare_queue, self._deploy_queue]
+        for stage, inbox in zip(self._stages, inboxes):
+            for _ in stage.threads:
+                inbox.put(_DONE)
+            stage.join()
+
+
+class UpdateBatcher:
+    # regroupe un même plugin de tous les serveurs en un seul job, soumis dès que chaque serveur concerné l'a analysé
+    def __init__(self, pipeline: UpdatePipeline, hosts: List[HostSync]):
+        self.pipeline = pipeline
+        self._lock    = threading.Lock()
+        self._waiting: Dict[str, Set[str]] = {}
+        self._targets: Dict[str, List[DeployTarget]] = {}
+
+        for host in hosts:
+            for name in host.plugin_names:
+                self._waiting.setdefault(name.lower(), set()).add(host.name)
+
+    def report(self, host: HostSync, name: str, plugin: Optional[Plugin] = None) -> None:
+        key = name.lower()
+        with self._lock:
+            if plugin is not None and plugin.pending_update:
+                self._targets.setdefault(key, []).append(DeployTarget(plugin, host, plugin.last_sha))
+            ready = self._reported(key, host.name)
+        self._submit(ready)
+
+    def host_done(self, host: HostSync) -> None:
+        # serveur terminé ou abandonné: les plugins qui n'attendaient plus que lui partent
+        with self._lock:
+            ready = [job for key in list(self._waiting) for job in self._reported(key, host.name)]
+        self._submit(ready)
+
+    def _reported(self, key: str, host_name: str) -> List[Tuple[str, List[DeployTarget]]]:
+        waiting = self._waiting.get(key)
+        if waiting is None or host_name not in waiting:
+            return []
+
+        waiting.discard(host_name)
+        if waiting:
+            return []
+
+        del self._waiting[key]
+        targets = self._targets.pop(key, [])
+        return [(targets[0].plugin.name, targets)] if targets else []
+
+    def _submit(self, ready: List[Tuple[str, List[DeployTarget]]]) -> None:
+        # hors du verrou: submit bloque quand le pipeline est saturé
+        for name, targets in ready:
+            self.pipeline.submit_targets(name, targets)
@@ -1,39 +1,24 @@
 import os
-import posixpath
-import stat
-import tempfile
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, Optional, Tuple
 
-from git import Repo
+from core.archive import ArchiveCache
+from core.deploy import DeployOptions, DeployPlan, execute_deploy, plan_deploy
+from core.remover import remove_tree
+from core.transfer import upload_tree
+from utils.logger import success, error, info, warn
 
-from utils.logger import success, error, info
+if TYPE_CHECKING:
+    # GitPython n'est chargé que si un update a lieu
+    from core.git_cache import GitSource
+    from core.tarball import TarballSource
 
 
-def remove_sftp_dir_recursive(sftp, path):
-    files = sftp.listdir_attr(path)
-    for entry in files:
-        entry_path = posixpath.join(path, entry.filename)
-        if stat.S_ISDIR(entry.st_mode):
-            remove_sftp_dir_recursive(sftp, entry_path)
-            sftp.rmdir(entry_path)
-        else:
-            sftp.remove(entry_path)
-    pass
-
-def upload_dir_to_sftp(sftp, local_path, path):
-    for item in os.listdir(local_path):
-        if item.endswith(".git"):
-            continue
-
-        local_item_path  = posixpath.join(local_path, item)
-        remote_item_path = posixpath.join(path, item)
-
-        if os.path.isdir(local_item_path):
-            try:
-                sftp.mkdir(remote_item_path)
-            except IOError:
-                pass
-        else:
-            sftp.put(local_item_path, remote_item_path)
+def remove_sftp_dir_recursive(sftp, path, sftp_manager=None, workers: int = 1):
+    remove_tree(sftp, path, sftp_manager, workers)
+
+def upload_dir_to_sftp(sftp, local_path, path, sftp_manager=None, workers: int = 1):
+    return upload_tree(sftp, local_path, path, sftp_manager, workers)
 
 class Plugin:
     def __init__(self, name, path):
@@ -45,40 +30,112 @@ class Plugin:
         self.authors   = None
         self.explain   = None
         self.updated   = False
+        self.yml_hash     = None
+        self.deployed_sha = None
+        self.transfer_stats = None
+        self.pending_update = False
+        self.last_sha       = None
+        self.manifest_sha   = None  # commit indiqué par le manifeste du serveur
+        self.drift          = None  # fichiers modifiés sur le serveur depuis le déploiement (mode verify)
+        self.skipped        = []  # vérifications sautées après l'échec d'une vérification moins coûteuse
+        self.host           = ""
+        # préfixé par le nom du serveur quand plusieurs serveurs sont synchronisés
+        self.label          = name
+
+    def _already_deployed(self, remote_sha: Optional[str], last_sha: Optional[str]) -> bool:
+        if not last_sha or remote_sha != last_sha:
+            return False
+        success(f"{self.label}: déjà déployé au commit {last_sha[:7]}, rien à faire")
+        self.deployed_sha = last_sha
+        return True
+
+    def fetch(self, source: "GitSource", last_sha: Optional[str], stack: ExitStack) -> Optional[Tuple[str, str]]:
+        # None quand le commit distant est celui déjà déployé
+        if last_sha and self._already_deployed(source.remote_head(self.name), last_sha):
+            return None
+
+        info(f"{self.label}: Récupération du repository...")
+        local_repo_path, head = stack.enter_context(source.checkout(self.name))
+        info(f"{self.label}: Repository prêt au commit {head[:7]}")
+        return local_repo_path, head
+
+    def prepare(self, sftp, local_repo_path: str, options: DeployOptions, sftp_manager=None,
+                archives: Optional[ArchiveCache] = None, head: Optional[str] = None) -> DeployPlan:
+        options = options.for_plugin(self.name)
+        info(f"{self.label}: Préparation du déploiement ({options.strategy}, {options.mode}, {options.transfer})...")
+        return plan_deploy(sftp, local_repo_path, self.path, options, sftp_manager, archives, head)
+
+    def deploy_plan(self, sftp, plan: DeployPlan, head: str, sftp_manager=None) -> None:
+        stats = execute_deploy(sftp, plan, sftp_manager)
+        if stats is None:
+            success(f"{self.label}: Plugin déjà à jour")
+            self.deployed_sha = head
+            return
+        self._updated(stats, head)
+
+    def deploy_tarball(self, sftp, source: "TarballSource", head: Optional[str], options: DeployOptions,
+                       sftp_manager=None) -> None:
+        from core.tarball import deploy_tarball
+
+        options = options.for_plugin(self.name)
+        info(f"{self.label}: Extraction de l'archive GitHub {head[:7] if head else 'HEAD'} sur le serveur (staged)...")
+        stats, manifest = deploy_tarball(sftp, source, self.name, self.path, options, sftp_manager, head)
+        self._updated(stats, manifest.sha or head)
+
+    def _updated(self, stats, head: Optional[str]) -> None:
+        info(f"{self.label}: {stats.summary()}")
+        self.transfer_stats = stats
+        success(f"{self.label}: Plugin mis à jour avec succès.")
+        self.updated      = True
+        self.deployed_sha = head
+
+    def update(self, sftp, options: Optional[DeployOptions] = None, source: Optional["GitSource"] = None,
+               last_sha: Optional[str] = None, sftp_manager=None):
+        options = options or DeployOptions()
+        if source is None:
+            from core.git_cache import GitSource
+            source = GitSource(os.getenv("GITHUB"), os.getenv("GITHUB_TOKEN"), mirror=False)
+
+        try:
+            if source.streaming:
+                # ni clone ni plan: l'archive du commit est extraite directement sur le serveur
+                head = source.remote_head(self.name)
+                if not self._already_deployed(head, last_sha):
+                    self.deploy_tarball(sftp, source, head, options, sftp_manager)
+                return
+
+            with ExitStack() as stack:
+                fetched = self.fetch(source, last_sha, stack)
+                if fetched is None:
+                    return
+
+                local_repo_path, head = fetched
+                plan = self.prepare(sftp, local_repo_path, options, sftp_manager, head=head)
+                self.deploy_plan(sftp, plan, head, sftp_manager)
+        except Exception as e:
+            error(f"{self.label}: échec de la mise à jour {e}")
 
-    def update(self, sftp):
-        github_token = os.getenv("GITHUB_TOKEN")
-        github       = os.getenv("GITHUB")
-        repo_url     = f"https://{github_token}@github.com/{github}/{self.name}.git"
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            try:
-                info(f"{self.name}: Clonage du repository dans le dossier temporaire...")
-
-                local_repo_path = posixpath.join(tmpdir, self.name)
-                Repo.clone_from(repo_url, local_repo_path)
-
-                info(f"{self.name}: Repository cloné avec succès sur le dossier temporaire")
+    def setExplain(self):
+        self._setStatusExplain()
+        if not self.drift:
+            return
 
-                info(f"{self.name}: Suppression des fichiers SFTP...")
-                remove_sftp_dir_recursive(sftp, self.path)
+        status = self.explain
+        drift  = ", ".join(self.drift[:5]) + ("..." if len(self.drift) > 5 else "")
 
-                info(f"{self.name}: Upload des fichiers mis à jour...")
-                upload_dir_to_sftp(sftp, local_repo_path, self.path)
+        def explain():
+            status()
+            warn(f"{self.label}: modifié sur le serveur depuis le déploiement de {self.manifest_sha[:7]} ({drift})")
 
-                success(f"{self.name}: Plugin mis à jour avec succès.")
-                self.updated = True
-            except Exception as e:
-                error(f"{self.name}: échec de la mise à jour {e}")
-        pass
+        self.explain = explain
 
-    def setExplain(self):
+    def _setStatusExplain(self):
         if self.is_valid and self.is_owned and self.is_github:
-            self.explain = lambda: success(f"{self.name}: prêt pour synchronisation")
+            self.explain = lambda: success(f"{self.label}: prêt pour synchronisation")
             return
 
         if not (self.is_valid or self.is_owned or self.is_github):
-            self.explain = lambda: info(f"{self.name}: aucune vérification effectuée")
+            self.explain = lambda: info(f"{self.label}: aucune vérification effectuée")
             return
 
         states = []
@@ -91,12 +148,12 @@ class Plugin:
 
         if self.is_owned:
             states.append("vous appartient")
-        else:
+        elif "owned" not in self.skipped:
             issues.append("ne vous appartient pas")
 
         if self.is_github:
             states.append("lié à votre GitHub")
-        else:
+        elif "github" not in self.skipped:
             issues.append("n'est pas sur GitHub")
 
         if issues:
@@ -120,4 +177,4 @@ class Plugin:
             log_func = info
             message = " et ".join(states)
 
-        self.explain = lambda: log_func(f"{self.name}: {message}")
\ No newline at end of file
+        self.explain = lambda: log_func(f"{self.label}: {message}")
\ No newline at end of file
@@ -1,16 +1,43 @@
-import os
+import hashlib
 import posixpath
+import stat
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-import requests
 import yaml
 
+from .deploy import DeployOptions
+from .manifest import Manifest, find_drift, read_manifest
 from .plugin import Plugin
+from .remote_index import RemoteTreeIndex, load_yaml
+from .state import PluginState, StateStore
+from .sync import MANIFEST_NAME
+from utils.exceptions import GitHubError
 from utils.logger import error
+from utils.selector import PluginSelector
 
+if TYPE_CHECKING:
+    from .github import GitHubClient
 
-def is_valid(plugin: Plugin, sftp) -> bool:
+
+def remote_fingerprint(sftp, plugin: Plugin, remote_mtime: Optional[int] = None, entries=None) -> Tuple[Optional[str], Optional[List[str]]]:
+    if entries is None:
+        try:
+            entries = sftp.listdir_attr(plugin.path)
+        except IOError:
+            return None, None
+
+    h = hashlib.sha1(str(remote_mtime).encode())
+    for entry in sorted(entries, key=lambda e: e.filename):
+        kind = "d" if stat.S_ISDIR(entry.st_mode or 0) else "f"
+        h.update(f"|{kind}:{entry.filename}:{entry.st_size}:{entry.st_mtime}".encode())
+
+    return h.hexdigest(), [entry.filename for entry in entries]
+
+def is_valid(plugin: Plugin, sftp, files: Optional[List[str]] = None) -> bool:
     try:
-        files = sftp.listdir(plugin.path)
+        if files is None:
+            files = sftp.listdir(plugin.path)
         return "plugin.yml" in files and "src" in files
     except IOError:
         plugin.explain = lambda: error(f"{plugin.name} structure invalide")
@@ -26,10 +53,13 @@ def parse_authors(info: dict):
             authors.update(a.lower() for a in val if isinstance(a, str))
     return list(authors)
 
-def is_owned(plugin: Plugin, sftp, valid_authors) -> bool:
+def is_owned(plugin: Plugin, sftp, valid_authors, raw: Optional[bytes] = None) -> bool:
     try:
-        with sftp.open(posixpath.join(plugin.path, "plugin.yml"), "r") as f:
-            info = yaml.safe_load(f.read().decode())
+        if raw is None:
+            with sftp.open(posixpath.join(plugin.path, "plugin.yml"), "r") as f:
+                raw = f.read()
+        plugin.yml_hash = hashlib.sha1(raw).hexdigest()
+        info = load_yaml(raw)
     except (IOError, yaml.YAMLError) as e:
         plugin.is_valid = False
         plugin.reason = lambda: error(f"{plugin.name} plugin.yml invalide: {e}")
@@ -40,39 +70,145 @@ def is_owned(plugin: Plugin, sftp, valid_authors) -> bool:
         return False
 
     plugin.authors = parse_authors(info)
+    return has_valid_author(plugin.authors, valid_authors)
+
+def has_valid_author(authors, valid_authors) -> bool:
     valid = [a.lower() for a in valid_authors]
-    return any(a in valid for a in plugin.authors)
+    return any(a in valid for a in authors or [])
+
+def is_plugin_on_github(plugin_name, github: "GitHubClient") -> bool:
+    if github is None:
+        return False
 
-def is_plugin_on_github(plugin_name) -> bool:
-    token = os.getenv("GITHUB_TOKEN")
-    if not token:
+    try:
+        return github.has_repository(plugin_name)
+    except GitHubError as e:
+        error(f"{plugin_name}: impossible de vérifier GitHub: {e}")
         return False
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+def load_manifest(plugin: Plugin, sftp, files: Optional[List[str]] = None) -> Optional[Manifest]:
+    # le listing du plugin dit déjà si un manifeste est présent
+    if files is not None and MANIFEST_NAME not in files:
+        return None
+    manifest = read_manifest(sftp, plugin.path)
+    plugin.manifest_sha = manifest.sha if manifest is not None else None
+    return manifest
 
-    resp = requests.get(f"https://api.github.com/repos/{os.getenv("GITHUB")}/{plugin_name}", headers=headers)
-    return resp.status_code == 200
+def check_drift(plugin: Plugin, sftp, files: Optional[List[str]] = None, spot_checks: int = 0) -> None:
+    manifest = load_manifest(plugin, sftp, files)
+    if manifest is not None:
+        plugin.drift = find_drift(sftp, plugin.path, manifest, spot_checks, files)
 
-def analyze_plugin(sftp, name, plugins_dir, authors, target_plugins, check_valid=True, check_author=True, check_github=True, update=False):
-    path = posixpath.join(plugins_dir, name)
-    plugin = Plugin(name, path)
+# du moins cher au plus cher: listing du dossier, lecture de plugin.yml, appel à l'API GitHub
+CHECKS = ("valid", "owned", "github")
 
-    if check_valid:
-        plugin.is_valid = is_valid(plugin, sftp)
-    if check_author:
-        plugin.is_owned = is_owned(plugin, sftp, authors)
-    if check_github:
-        plugin.is_github = is_plugin_on_github(plugin.name)
 
-    plugin.setExplain()
+def plan_checks(check_valid: bool, check_author: bool, check_github: bool) -> List[str]:
+    enabled = {"valid": check_valid, "owned": check_author, "github": check_github}
+    return [check for check in CHECKS if enabled[check]]
 
-    target_plugins = [pl.lower() for pl in target_plugins]
-    plugin_name    = plugin.name.lower()
+def analyze_plugin(sftp, name, plugins_dir, authors, target_plugins, github=None, check_valid=True, check_author=True, check_github=True, update=False,
+                   deploy_options: Optional[DeployOptions] = None, state: Optional[StateStore] = None, host="", remote_mtime=None,
+                   full=False, github_ttl=3600, source=None, sftp_manager=None, index: Optional[RemoteTreeIndex] = None,
+                   defer_update=False, verify=False, spot_checks=20):
+    path = posixpath.join(plugins_dir, name)
+    plugin = Plugin(name, path)
+    plugin.host = host
+
+    # avec l'index, listing et plugin.yml sont déjà en mémoire: aucune requête SFTP ici
+    entries  = index.entries(name) if index is not None else None
+    yml_raw  = index.plugin_yml(name) if index is not None else None
+    files    = [entry.filename for entry in entries] if entries is not None else None
+    if index is not None and remote_mtime is None:
+        remote_mtime = index.dir_mtime(name)
+
+    record = state.get(host, path) if state is not None else None
+    fingerprint = None
+    if state is not None and (entries is not None or index is None):
+        fingerprint, files = remote_fingerprint(sftp, plugin, remote_mtime, entries)
+
+    # rien n'a bougé côté serveur depuis le dernier passage: on réutilise les résultats enregistrés. Un plugin invalide
+    # n'a jamais lu son plugin.yml (vérifications suivantes sautées), son échec est gardé tel quel tant que le mode
+    # valid passe en premier
+    cached = (
+        record is not None and not full
+        and fingerprint is not None and record.fingerprint == fingerprint
+        and (record.yml_hash is not None or not check_author or (check_valid and not record.is_valid))
+    )
+
+    if cached:
+        plugin.authors  = record.authors
+        plugin.yml_hash = record.yml_hash
+        plugin.is_valid = record.is_valid
+    elif state is not None and not check_valid:
+        # enregistré pour les passages suivants même si le mode valid n'est pas demandé
+        plugin.is_valid = is_valid(plugin, sftp, files)
+
+    github_status     = record.github_status if record else None
+    github_checked_at = record.github_checked_at if record else None
+
+    # premier échec: les vérifications suivantes, plus coûteuses, ne servent plus à rien
+    checks = plan_checks(check_valid, check_author, check_github)
+    for i, check in enumerate(checks):
+        if check == "valid":
+            if not cached:
+                plugin.is_valid = is_valid(plugin, sftp, files)
+            passed = plugin.is_valid
+        elif check == "owned":
+            if cached:
+                plugin.is_owned = has_valid_author(plugin.authors, authors)
+            else:
+                # plugin.yml absent de l'index: inutile de retenter une lecture
+                plugin.is_owned = is_owned(plugin, sftp, authors, yml_raw) if index is None or yml_raw is not None else False
+            passed = plugin.is_owned
+        else:
+            if record is not None and not full and record.github_fresh(github_ttl):
+                plugin.is_github = record.github_status
+            else:
+                plugin.is_github = is_plugin_on_github(plugin.name, github)
+                if github is not None and not github.failed:
+                    github_status, github_checked_at = plugin.is_github, time.time()
+            passed = plugin.is_github
+
+        if not passed:
+            plugin.skipped = checks[i + 1:]
+            break
+
+    if verify:
+        # toujours refait: une modification dans un sous-dossier ne change pas l'empreinte
+        check_drift(plugin, sftp, files, spot_checks)
 
-    if update and (plugin_name in target_plugins ) and plugin.is_github:
-        plugin.update(sftp)
+    plugin.setExplain()
 
-    return plugin
\ No newline at end of file
+    if update and plugin.is_github and PluginSelector.of(target_plugins).matches(plugin.name):
+        plugin.last_sha = None if full or record is None else record.deployed_sha
+        if plugin.last_sha is None and not full and (deploy_options is None or deploy_options.manifest):
+            # pas de base d'état (autre machine, premier passage): le manifeste indique le commit en ligne
+            if not verify:
+                load_manifest(plugin, sftp, files)
+            plugin.last_sha = plugin.manifest_sha
+        if plugin.drift:
+            # modifié à la main sur le serveur: redéployé même si le commit n'a pas changé
+            plugin.last_sha = None
+        if defer_update:
+            # l'appelant se charge de l'update via UpdatePipeline
+            plugin.pending_update = True
+        else:
+            plugin.update(sftp, deploy_options, source=source, last_sha=plugin.last_sha, sftp_manager=sftp_manager)
+
+    if state is not None:
+        state.save(PluginState(
+            host=host,
+            path=path,
+            remote_mtime=remote_mtime,
+            # après un update le contenu distant a changé, l'empreinte sera recalculée au prochain passage
+            fingerprint=None if plugin.updated else fingerprint,
+            yml_hash=plugin.yml_hash,
+            is_valid=plugin.is_valid,
+            authors=plugin.authors or [],
+            github_status=github_status,
+            github_checked_at=github_checked_at,
+            deployed_sha=plugin.deployed_sha or (record.deployed_sha if record else None),
+        ))
+
+    return plugin
@@ -0,0 +1,138 @@
+import posixpath
+import shlex
+import stat
+import threading
+from typing import Callable, Dict, List, Optional
+
+import paramiko
+import yaml
+
+from core.transfer import run_on_channels
+from utils.logger import debug
+
+# chargeur C de libyaml quand il est disponible, nettement plus rapide que la version pure Python
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+FIND_TYPES = {"d": stat.S_IFDIR, "f": stat.S_IFREG, "l": stat.S_IFLNK}
+
+
+def load_yaml(raw: bytes):
+    return yaml.load(raw, Loader=YAML_LOADER)
+
+
+def _attributes(name: str, mode: int, size: int, mtime: int) -> paramiko.SFTPAttributes:
+    attr = paramiko.SFTPAttributes()
+    attr.filename = name
+    attr.st_mode  = mode
+    attr.st_size  = size
+    attr.st_mtime = mtime
+    return attr
+
+
+class RemoteTreeIndex:
+    def __init__(self, sftp, plugins_dir: str, sftp_manager=None, workers: int = 1, use_exec: bool = True,
+                 select: Optional[Callable[[str], bool]] = None):
+        self.sftp         = sftp
+        self.plugins_dir  = plugins_dir
+        self.sftp_manager = sftp_manager
+        self.workers      = workers
+        self.use_exec     = use_exec
+        # plugins retenus, les autres ne sont ni listés ni lus (passage limité aux cibles)
+        self.select       = select
+
+        self._dirs: Dict[str, paramiko.SFTPAttributes] = {}
+        self._entries: Dict[str, Optional[List[paramiko.SFTPAttributes]]] = {}
+        self._yml: Dict[str, Optional[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def build(self) -> "RemoteTreeIndex":
+        if not (self.use_exec and self.sftp_manager is not None and self.sftp_manager.can_exec() and self._build_with_find()):
+            self._build_with_sftp()
+
+        self._fetch_plugin_ymls()
+        debug(f"Index de {self.plugins_dir}: {len(self._dirs)} plugins, {len(self._yml)} plugin.yml lus")
+        return self
+
+    def _build_with_find(self) -> bool:
+        # tout l'arbre utile (plugins + leur premier niveau) en une seule commande
+        status, stdout, stderr = self.sftp_manager.exec_command(
+            f"find {shlex.quote(self.plugins_dir)} -mindepth 1 -maxdepth 2 -printf '%y %s %T@ %P\\0'"
+        )
+        if status != 0:
+            debug(f"find indisponible ({status}: {stderr.decode(errors='replace').strip()}), listing via SFTP")
+            return False
+
+        dirs: Dict[str, paramiko.SFTPAttributes] = {}
+        entries: Dict[str, List[paramiko.SFTPAttributes]] = {}
+        for record in stdout.split(b"\0"):
+            if not record:
+                continue
+            kind, size, mtime, rel_path = record.decode(errors="surrogateescape").split(" ", 3)
+            attr_mode = FIND_TYPES.get(kind, stat.S_IFREG)
+            if "/" not in rel_path:
+                if kind == "d":
+                    dirs[rel_path] = _attributes(rel_path, attr_mode, int(size), int(float(mtime)))
+                    entries.setdefault(rel_path, [])
+                continue
+
+            parent, name = rel_path.split("/", 1)
+            entries.setdefault(parent, []).append(_attributes(name, attr_mode, int(size), int(float(mtime))))
+
+        self._dirs    = self._selected(dirs)
+        self._entries = {name: entries.get(name, []) for name in self._dirs}
+        return True
+
+    def _selected(self, dirs: Dict[str, paramiko.SFTPAttributes]) -> Dict[str, paramiko.SFTPAttributes]:
+        if self.select is None:
+            return dirs
+        return {name: attr for name, attr in dirs.items() if self.select(name)}
+
+    def _build_with_sftp(self) -> None:
+        self._dirs = self._selected({
+            entry.filename: entry
+            for entry in self.sftp.listdir_attr(self.plugins_dir)
+            if stat.S_ISDIR(entry.st_mode)
+        })
+
+        def list_plugin(channel, name: str) -> None:
+            try:
+                entries = channel.listdir_attr(posixpath.join(self.plugins_dir, name))
+            except IOError:
+                entries = None
+            with self._lock:
+                self._entries[name] = entries
+
+        run_on_channels(self.sftp, sorted(self._dirs), list_plugin, self.sftp_manager, self.workers)
+
+    def _fetch_plugin_ymls(self) -> None:
+        def read_yml(channel, name: str) -> None:
+            path = posixpath.join(self.plugins_dir, name, "plugin.yml")
+            size = next((e.st_size for e in self._entries[name] if e.filename == "plugin.yml"), None)
+            try:
+                with channel.open(path, "rb") as f:
+                    # toutes les requêtes de lecture partent d'un coup, la taille connue évite un stat
+                    f.prefetch(size)
+                    raw = f.read()
+            except IOError:
+                raw = None
+            with self._lock:
+                self._yml[name] = raw
+
+        names = [name for name in self._dirs if "plugin.yml" in self.listdir(name)]
+        run_on_channels(self.sftp, names, read_yml, self.sftp_manager, self.workers)
+
+    def plugin_names(self) -> List[str]:
+        return sorted(self._dirs)
+
+    def dir_mtime(self, name: str) -> Optional[int]:
+        attr = self._dirs.get(name)
+        return attr.st_mtime if attr else None
+
+    def entries(self, name: str) -> Optional[List[paramiko.SFTPAttributes]]:
+        return self._entries.get(name)
+
+    def listdir(self, name: str) -> List[str]:
+        return [entry.filename for entry in self._entries.get(name) or []]
+
+    def plugin_yml(self, name: str) -> Optional[bytes]:
+        return self._yml.get(name)
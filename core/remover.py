@@ -0,0 +1,59 @@
+import posixpath
+import shlex
+import stat
+from typing import Dict, List, Tuple
+
+from core.transfer import run_on_channels
+from utils.logger import debug
+
+
+def collect_remote_tree(sftp, root: str, sftp_manager=None, workers: int = 1) -> Tuple[List[str], Dict[int, List[str]]]:
+    files: List[str] = []
+    dirs_by_depth: Dict[int, List[str]] = {}
+    level = [root]
+    depth = 0
+
+    # un listing par dossier, tous les dossiers d'un même niveau en parallèle
+    while level:
+        next_level: List[str] = []
+
+        def list_dir(channel, path: str) -> None:
+            for entry in channel.listdir_attr(path):
+                entry_path = posixpath.join(path, entry.filename)
+                # un lien symbolique vers un dossier se supprime comme un fichier, on ne le suit pas
+                if stat.S_ISDIR(entry.st_mode) and not stat.S_ISLNK(entry.st_mode):
+                    next_level.append(entry_path)
+                else:
+                    files.append(entry_path)
+
+        run_on_channels(sftp, level, list_dir, sftp_manager, workers)
+        depth += 1
+        if next_level:
+            dirs_by_depth[depth] = next_level
+        level = next_level
+
+    return files, dirs_by_depth
+
+
+def remove_tree(sftp, path: str, sftp_manager=None, workers: int = 1) -> None:
+    if sftp_manager is not None and sftp_manager.can_exec():
+        status, _, stderr = sftp_manager.exec_command(f"rm -rf -- {shlex.quote(path)}")
+        if status == 0:
+            debug(f"Suppression de {path} via rm -rf")
+            return
+        debug(f"rm -rf a échoué ({status}: {stderr.decode(errors='replace').strip()}), suppression via SFTP")
+
+    try:
+        sftp.lstat(path)
+    except IOError:
+        return
+
+    files, dirs_by_depth = collect_remote_tree(sftp, path, sftp_manager, workers)
+    run_on_channels(sftp, files, lambda channel, file_path: channel.remove(file_path), sftp_manager, workers)
+
+    # les dossiers les plus profonds d'abord: un rmdir ne part qu'une fois ses enfants supprimés
+    for depth in sorted(dirs_by_depth, reverse=True):
+        run_on_channels(sftp, dirs_by_depth[depth], lambda channel, dir_path: channel.rmdir(dir_path),
+                        sftp_manager, workers)
+
+    sftp.rmdir(path)
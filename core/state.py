@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plugins (
+    host              TEXT NOT NULL,
+    path              TEXT NOT NULL,
+    remote_mtime      INTEGER,
+    fingerprint       TEXT,
+    yml_hash          TEXT,
+    is_valid          INTEGER NOT NULL DEFAULT 0,
+    authors           TEXT,
+    github_status     INTEGER,
+    github_checked_at REAL,
+    deployed_sha      TEXT,
+    updated_at        REAL,
+    PRIMARY KEY (host, path)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+@dataclass
+class PluginState:
+    host: str
+    path: str
+    remote_mtime: Optional[int] = None
+    fingerprint: Optional[str] = None
+    yml_hash: Optional[str] = None
+    is_valid: bool = False
+    authors: List[str] = field(default_factory=list)
+    github_status: Optional[bool] = None
+    github_checked_at: Optional[float] = None
+    deployed_sha: Optional[str] = None
+    updated_at: Optional[float] = None
+
+    def github_fresh(self, ttl: int) -> bool:
+        if self.github_status is None or self.github_checked_at is None:
+            return False
+        return time.time() - self.github_checked_at < ttl
+
+
+class StateStore:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # partagé entre les workers d'analyse, les accès sont sérialisés par le verrou
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def get(self, host: str, path: str) -> Optional[PluginState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM plugins WHERE host = ? AND path = ?", (host, path)
+            ).fetchone()
+
+        return self._from_row(row) if row is not None else None
+
+    def all(self) -> List[PluginState]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM plugins ORDER BY host, path").fetchall()
+        return [self._from_row(row) for row in rows]
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> PluginState:
+        return PluginState(
+            host=row["host"],
+            path=row["path"],
+            remote_mtime=row["remote_mtime"],
+            fingerprint=row["fingerprint"],
+            yml_hash=row["yml_hash"],
+            is_valid=bool(row["is_valid"]),
+            authors=json.loads(row["authors"]) if row["authors"] else [],
+            github_status=None if row["github_status"] is None else bool(row["github_status"]),
+            github_checked_at=row["github_checked_at"],
+            deployed_sha=row["deployed_sha"],
+            updated_at=row["updated_at"],
+        )
+
+    def save(self, state: PluginState) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO plugins (host, path, remote_mtime, fingerprint, yml_hash, is_valid, authors,
+                                     github_status, github_checked_at, deployed_sha, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (host, path) DO UPDATE SET
+                    remote_mtime      = excluded.remote_mtime,
+                    fingerprint       = excluded.fingerprint,
+                    yml_hash          = excluded.yml_hash,
+                    is_valid          = excluded.is_valid,
+                    authors           = excluded.authors,
+                    github_status     = excluded.github_status,
+                    github_checked_at = excluded.github_checked_at,
+                    deployed_sha      = excluded.deployed_sha,
+                    updated_at        = excluded.updated_at
+                """,
+                (
+                    state.host, state.path, state.remote_mtime, state.fingerprint, state.yml_hash,
+                    int(state.is_valid), json.dumps(state.authors),
+                    None if state.github_status is None else int(state.github_status),
+                    state.github_checked_at, state.deployed_sha, time.time(),
+                ),
+            )
+
+    def set_deployed(self, host: str, path: str, sha: str) -> None:
+        # le contenu distant a changé: l'empreinte est invalidée pour forcer une nouvelle analyse
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE plugins SET deployed_sha = ?, fingerprint = NULL, updated_at = ? WHERE host = ? AND path = ?",
+                (sha, time.time(), host, path),
+            )
+
+    def get_meta(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def set_meta(self, key: str, value: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import posixpath
+import stat
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from core.archive import PackedArchive, upload_archive
+from core.transfer import (FileEntry, IgnoredFiles, TransferCheckpoint, TransferStats, make_remote_dirs, run_on_channels,
+                           scan_local_tree, upload_files)
+from utils.ignore import IgnoreRules
+from utils.logger import debug
+
+if TYPE_CHECKING:
+    from core.manifest import ManifestEntry
+
+HASH_CHUNK_SIZE = 64 * 1024
+# écrit par chaque déploiement à la racine du plugin, ne fait pas partie du repository
+MANIFEST_NAME = ".autosync-manifest.json"
+
+
+@dataclass
+class SyncDelta:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    dirs_to_create: List[str] = field(default_factory=list)
+    dirs_to_remove: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    # état distant connu et sha1 locaux déjà calculés, réutilisés pour écrire le manifeste
+    remote_files: Dict[str, FileEntry] = field(default_factory=dict, repr=False)
+    local_hashes: Dict[str, str] = field(default_factory=dict, repr=False)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed or self.dirs_to_create or self.dirs_to_remove)
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} ajoutés, {len(self.changed)} modifiés, "
+                f"{len(self.removed)} supprimés, {self.unchanged} inchangés")
+
+
+def scan_remote_tree(sftp, remote_root: str) -> Tuple[Dict[str, FileEntry], Set[str]]:
+    files: Dict[str, FileEntry] = {}
+    dirs: Set[str] = set()
+
+    try:
+        pending = [("", sftp.listdir_attr(remote_root))]
+    except IOError:
+        return files, dirs
+
+    while pending:
+        rel_dir, entries = pending.pop()
+        for entry in entries:
+            if not rel_dir and entry.filename == MANIFEST_NAME:
+                continue
+            rel_path = posixpath.join(rel_dir, entry.filename)
+            if stat.S_ISDIR(entry.st_mode):
+                dirs.add(rel_path)
+                pending.append((rel_path, sftp.listdir_attr(posixpath.join(remote_root, rel_path))))
+            else:
+                files[rel_path] = FileEntry(entry.st_size or 0, int(entry.st_mtime or 0))
+
+    return files, dirs
+
+
+def hash_local_file(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_remote_file(sftp, path: str) -> str:
+    h = hashlib.sha1()
+    with sftp.open(path, "rb") as f:
+        f.prefetch()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compute_delta(sftp, local_root: str, remote_root: str, checksum: bool = False, ignore: Optional[IgnoreRules] = None,
+                  ignored: Optional[IgnoredFiles] = None, known: Optional[Dict[str, "ManifestEntry"]] = None) -> SyncDelta:
+    # les fichiers ignorés encore présents sur le serveur sont supprimés, comme s'ils avaient quitté le repository
+    # known: entrées du manifeste distant, leur sha1 évite de relire un fichier que le déploiement précédent a décrit
+    # checksum: relit (télécharge) les fichiers de même taille mais de mtime différent au lieu de les renvoyer
+    local_files, local_dirs   = scan_local_tree(local_root, ignore, ignored)
+    remote_files, remote_dirs = scan_remote_tree(sftp, remote_root)
+
+    delta = SyncDelta(remote_files=remote_files)
+
+    for rel_path, local in sorted(local_files.items()):
+        remote = remote_files.get(rel_path)
+        if remote is None:
+            delta.added.append(rel_path)
+        elif remote.size != local.size:
+            delta.changed.append(rel_path)
+        elif remote.mtime == local.mtime:
+            delta.unchanged += 1
+        else:
+            # même taille, mtime différent (clone récent): le contenu tranche, sans le relire sur le serveur si possible
+            entry       = known.get(rel_path) if known else None
+            remote_hash = entry.sha1 if entry is not None and (entry.size, entry.mtime) == (remote.size, remote.mtime) else None
+            if remote_hash is None and checksum:
+                remote_hash = hash_remote_file(sftp, posixpath.join(remote_root, rel_path))
+            if remote_hash is None:
+                delta.changed.append(rel_path)
+                continue
+            local_hash = delta.local_hashes[rel_path] = hash_local_file(os.path.join(local_root, rel_path))
+            if local_hash != remote_hash:
+                delta.changed.append(rel_path)
+            else:
+                delta.unchanged += 1
+
+    delta.removed        = sorted(set(remote_files) - set(local_files))
+    # parents avant enfants pour la création, enfants avant parents pour la suppression
+    delta.dirs_to_create = sorted(local_dirs - remote_dirs, key=lambda d: (d.count("/"), d))
+    delta.dirs_to_remove = sorted(remote_dirs - local_dirs, key=lambda d: (-d.count("/"), d))
+
+    debug(lambda: f"Delta {remote_root}: {delta.summary()}")
+    return delta
+
+
+def apply_delta(sftp, local_root: str, remote_root: str, delta: SyncDelta, sftp_manager=None, workers: int = 1,
+                packed: Optional[PackedArchive] = None, checkpoint: Optional[TransferCheckpoint] = None) -> TransferStats:
+    stats = None
+    if packed is not None:
+        # les dossiers manquants sont créés par l'extraction
+        stats = upload_archive(sftp, remote_root, packed, sftp_manager)
+
+    if stats is None:
+        make_remote_dirs(sftp, remote_root, delta.dirs_to_create, sftp_manager, workers)
+        stats = upload_files(sftp, local_root, remote_root, delta.added + delta.changed, sftp_manager, workers,
+                             checkpoint=checkpoint)
+
+    # suppressions déjà faites par une tentative précédente: la seconde échouerait
+    done = checkpoint.removed if checkpoint is not None else set()
+
+    def remove(channel, rel_path: str) -> None:
+        channel.remove(posixpath.join(remote_root, rel_path))
+        done.add(rel_path)
+
+    run_on_channels(sftp, [rel_path for rel_path in delta.removed if rel_path not in done], remove, sftp_manager, workers)
+
+    for rel_dir in delta.dirs_to_remove:
+        if rel_dir + "/" not in done:
+            sftp.rmdir(posixpath.join(remote_root, rel_dir))
+            done.add(rel_dir + "/")
+
+    return stats
@@ -0,0 +1,210 @@
+import hashlib
+import posixpath
+import queue
+import tarfile
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.deploy import DeployOptions, connection_lost, make_work_dir, staging_path, swap_in, verify_tree
+from core.github import GitHubClient
+from core.manifest import Manifest, ManifestEntry, write_manifest
+from core.remover import remove_tree
+from core.transfer import LARGE_FILE_CHUNK, TransferStats, channel_lost
+from utils.exceptions import GitHubError, TransferError
+from utils.ignore import SYNCIGNORE_NAME, IgnoreRules
+from utils.logger import debug
+from utils.metrics import metrics
+
+# les petits fichiers sont lus en entier et confiés aux canaux du pool, les autres écrits au fil de la lecture
+BUFFERED_MEMBER_SIZE = 256 * 1024
+
+
+class TarballSource:
+    # archive tar.gz d'un commit via l'API GitHub, extraite directement sur le serveur: ni clone ni fichier temporaire
+    streaming = True
+
+    def __init__(self, github: GitHubClient):
+        self.github = github
+        self._rules: Dict[Tuple[str, str, Tuple[str, ...]], IgnoreRules] = {}
+
+    def remote_head(self, name: str) -> Optional[str]:
+        try:
+            return self.github.head_commit(name)
+        except GitHubError as e:
+            debug(f"{name}: commit distant inconnu: {e}")
+            return None
+
+    def ignore_rules(self, name: str, ref: Optional[str] = None, excludes: Iterable[str] = ()) -> IgnoreRules:
+        # le .syncignore doit être connu avant le premier membre de l'archive: lu à part, une fois par commit
+        # seul un sha est mis en cache, HEAD peut avoir bougé entre deux exécutions
+        key   = (name, ref or "", tuple(excludes))
+        rules = self._rules.get(key)
+        if rules is None:
+            content = self.github.file_contents(name, SYNCIGNORE_NAME, ref or "HEAD")
+            lines   = content.decode("utf-8", errors="replace").splitlines() if content else []
+            rules   = IgnoreRules([*excludes, *lines])
+            if ref:
+                self._rules[key] = rules
+        return rules
+
+    @contextmanager
+    def open(self, name: str, ref: Optional[str] = None) -> Iterator[tarfile.TarFile]:
+        with self.github.tarball(name, ref or "HEAD") as resp:
+            # mode r|gz: décompression au fil de la lecture, sans retour en arrière ni mise en mémoire de l'archive
+            resp.raw.decode_content = True
+            with tarfile.open(fileobj=resp.raw, mode="r|gz") as tar:
+                yield tar
+
+
+def member_path(name: str) -> Optional[str]:
+    # <compte>-<repo>-<sha>/chemin: le dossier racine de l'archive est retiré, None pour ce qui ne se déploie pas
+    _, _, rel_path = name.partition("/")
+    rel_path = posixpath.normpath(rel_path) if rel_path else ""
+    if rel_path in ("", ".") or rel_path.startswith("/") or rel_path.split("/")[0] == "..":
+        return None
+    return rel_path
+
+
+def stream_tarball(sftp, tar: tarfile.TarFile, remote_root: str, sftp_manager=None, workers: int = 1,
+                   sha: Optional[str] = None, ignore: Optional[IgnoreRules] = None) -> Tuple[TransferStats, Manifest]:
+    # mémoire bornée: au plus workers petits fichiers en attente, plus un bloc du fichier en cours de lecture
+    ignore   = ignore or IgnoreRules()
+    stats    = TransferStats()
+    manifest = Manifest(sha or "")
+    created  = {""}
+    pending: "queue.Queue" = queue.Queue(maxsize=max(workers, 1))
+    errors: List[Tuple[str, Exception, object]] = []
+    plugin   = metrics.current_plugin()
+
+    def write(channel, rel_path: str, data: bytes, mtime: int) -> None:
+        remote_path = posixpath.join(remote_root, rel_path)
+        with channel.open(remote_path, "wb") as dst:
+            dst.set_pipelined(True)
+            dst.write(data)
+        channel.utime(remote_path, (mtime, mtime))
+        stats.add(len(data))
+
+    def drain(channel) -> None:
+        with metrics.plugin(plugin):
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                if errors:
+                    # la lecture s'arrête, la file est seulement vidée
+                    continue
+                try:
+                    write(channel, *item)
+                except Exception as e:
+                    errors.append((item[0], e, channel))
+
+    def stream(src, rel_path: str, mtime: int) -> str:
+        remote_path = posixpath.join(remote_root, rel_path)
+        digest      = hashlib.sha1()
+        with sftp.open(remote_path, "wb", bufsize=LARGE_FILE_CHUNK) as dst:
+            dst.set_pipelined(True)
+            for data in iter(lambda: src.read(LARGE_FILE_CHUNK), b""):
+                digest.update(data)
+                dst.write(data)
+        sftp.utime(remote_path, (mtime, mtime))
+        return digest.hexdigest()
+
+    def make_dirs(rel_dir: str) -> None:
+        # les dossiers précèdent leur contenu dans une archive git, les parents manquants sont créés au besoin
+        if rel_dir in created:
+            return
+        make_dirs(posixpath.dirname(rel_dir))
+        sftp.mkdir(posixpath.join(remote_root, rel_dir))
+        created.add(rel_dir)
+
+    with ExitStack() as leases:
+        channels = []
+        if sftp_manager is not None:
+            for _ in range(workers - 1):
+                channel = leases.enter_context(sftp_manager.lease(blocking=False))
+                if channel is None:
+                    break
+                channels.append(channel)
+
+        threads = [threading.Thread(target=drain, args=(channel,), daemon=True) for channel in channels]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for member in tar:
+                if errors:
+                    break
+                rel_path = member_path(member.name)
+                if rel_path is None:
+                    continue
+                if ignore.excludes(rel_path, member.isdir()):
+                    # l'archive ne peut pas être élaguée: le membre est sauté sans être lu, mais compté exactement
+                    if member.isfile():
+                        stats.ignored_files += 1
+                        stats.ignored_bytes += member.size
+                    continue
+                if member.isdir():
+                    make_dirs(rel_path)
+                    continue
+                if not member.isfile():
+                    debug(f"{rel_path}: entrée de type {member.type!r} ignorée (lien ou fichier spécial)")
+                    continue
+
+                make_dirs(posixpath.dirname(rel_path))
+                src   = tar.extractfile(member)
+                mtime = int(member.mtime)
+                if member.size <= BUFFERED_MEMBER_SIZE:
+                    data   = src.read()
+                    digest = hashlib.sha1(data).hexdigest()
+                    if threads:
+                        pending.put((rel_path, data, mtime))
+                    else:
+                        write(sftp, rel_path, data, mtime)
+                else:
+                    digest = stream(src, rel_path, mtime)
+                    stats.add(member.size)
+                manifest.files[rel_path] = ManifestEntry(member.size, mtime, digest)
+        finally:
+            for _ in threads:
+                pending.put(None)
+            for thread in threads:
+                thread.join()
+
+    if errors:
+        rel_path, e, channel = errors[0]
+        if channel_lost(channel):
+            raise ConnectionError(f"connexion perdue: {e}") from e
+        raise TransferError(f"{len(errors)} fichier(s) en échec, ex: {rel_path}: {e}")
+
+    # git archive indique le commit dans l'en-tête pax global
+    manifest.sha  = manifest.sha or tar.pax_headers.get("comment", "")
+    manifest.dirs = sorted(created - {""})
+    return stats.finish(), manifest
+
+
+def deploy_tarball(sftp, source: TarballSource, name: str, remote_root: str, options: DeployOptions,
+                   sftp_manager=None, head: Optional[str] = None) -> Tuple[TransferStats, Manifest]:
+    # toujours un envoi complet: sans arbre local il n'y a ni delta ni archive à extraire côté serveur
+    # toujours en staged, même avec deploy_mode: in_place: vider le plugin en ligne avant un téléchargement qui peut
+    # être coupé laisserait le serveur sans plugin
+    target  = staging_path(remote_root)
+    workers = options.workers
+
+    # reste d'un déploiement interrompu
+    make_work_dir(sftp, remote_root)
+    remove_tree(sftp, target, sftp_manager, workers)
+    try:
+        ignore = source.ignore_rules(name, head, options.excludes)
+        sftp.mkdir(target)
+        with source.open(name, head) as tar:
+            stats, manifest = stream_tarball(sftp, tar, target, sftp_manager, workers, head, ignore)
+        verify_tree(sftp, manifest.files, target)
+        if options.manifest and manifest.sha:
+            write_manifest(sftp, target, manifest)
+        swap_in(sftp, target, remote_root, sftp_manager, workers)
+    except Exception as e:
+        if not connection_lost(e, sftp_manager):
+            remove_tree(sftp, target, sftp_manager, workers)
+        raise
+    return stats, manifest
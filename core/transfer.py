@@ -0,0 +1,288 @@
+import os
+import posixpath
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.exceptions import TransferError
+from utils.ignore import IgnoreRules
+from utils.logger import debug, info
+from utils.metrics import metrics
+
+SMALL_FILE_CHUNK = 32 * 1024
+LARGE_FILE_CHUNK = 1024 * 1024
+LARGE_FILE_SIZE  = 4 * 1024 * 1024
+
+
+@dataclass
+class FileEntry:
+    size: int
+    mtime: int
+
+
+@dataclass
+class IgnoredFiles:
+    # écartés par les règles d'exclusion: les dossiers élagués ne sont pas parcourus, leur contenu n'est pas compté ici
+    files: int = 0
+    bytes: int = 0
+    dirs: List[str] = field(default_factory=list)
+
+
+def scan_local_tree(local_root: str, ignore: Optional[IgnoreRules] = None,
+                    ignored: Optional[IgnoredFiles] = None) -> Tuple[Dict[str, FileEntry], Set[str]]:
+    # sans règles explicites: .syncignore du dossier, sans les excludes globaux
+    ignore = ignore or IgnoreRules.for_tree(local_root)
+    if ignored is not None:
+        # recompté à chaque parcours: les parcours successifs d'un même plan ne s'additionnent pas
+        ignored.files, ignored.bytes, ignored.dirs = 0, 0, []
+    files: Dict[str, FileEntry] = {}
+    dirs: Set[str] = set()
+
+    for current, dirnames, filenames in os.walk(local_root):
+        rel_dir = os.path.relpath(current, local_root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+
+        kept = []
+        for d in dirnames:
+            rel_path = posixpath.join(rel_dir, d)
+            if ignore.matches(rel_path, is_dir=True):
+                # élagué: os.walk n'y descend pas
+                if ignored is not None:
+                    ignored.dirs.append(rel_path)
+                continue
+            kept.append(d)
+            dirs.add(rel_path)
+        dirnames[:] = kept
+
+        for name in filenames:
+            rel_path = posixpath.join(rel_dir, name)
+            st = os.stat(os.path.join(current, name))
+            if ignore.matches(rel_path):
+                if ignored is not None:
+                    ignored.files += 1
+                    ignored.bytes += st.st_size
+                continue
+            files[rel_path] = FileEntry(st.st_size, int(st.st_mtime))
+
+    return files, dirs
+
+
+@dataclass
+class TransferStats:
+    files: int = 0
+    bytes: int = 0
+    saved_bytes: int = 0
+    ignored_files: int = 0  # exclus par .syncignore / sync_excludes, jamais envoyés
+    ignored_bytes: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, size: int, saved: int = 0) -> None:
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.saved_bytes += saved
+
+    def finish(self) -> "TransferStats":
+        self.finished_at = time.monotonic()
+        return self
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        summary = (f"{self.files} fichiers, {format_size(self.bytes)} en {self.elapsed:.2f}s "
+                   f"({format_size(self.throughput)}/s, {self.files / self.elapsed if self.elapsed > 0 else 0:.1f} fichiers/s)")
+        if self.saved_bytes:
+            summary += f", {format_size(self.saved_bytes)} économisés"
+        if self.ignored_files:
+            summary += f", {self.ignored_files} fichiers ignorés ({format_size(self.ignored_bytes)})"
+        return summary
+
+
+@dataclass
+class TransferCheckpoint:
+    # progression d'un déploiement, conservée d'une tentative à l'autre quand la connexion coupe
+    uploaded: Set[str] = field(default_factory=set)
+    started: Set[str] = field(default_factory=set)  # envois commencés, un gros fichier reprend à la taille atteinte
+    removed: Set[str] = field(default_factory=set)
+    steps: Set[str] = field(default_factory=set)  # étapes terminées (dossier de staging prêt, copie de la version en ligne...)
+    stats: TransferStats = field(default_factory=TransferStats)
+    attempts: int = 0
+
+    def reset(self) -> None:
+        # le dossier cible est reparti de zéro: rien de ce qui a été envoyé n'y est encore
+        self.uploaded.clear()
+        self.started.clear()
+        self.removed.clear()
+        self.steps.clear()
+        self.stats = TransferStats()
+
+    def resume_offset(self, sftp, rel_path: str, local_size: int, remote_path: str) -> int:
+        # seuls les gros fichiers commencés par une tentative précédente sont repris, les autres sont réécrits
+        if rel_path not in self.started or local_size < LARGE_FILE_SIZE:
+            return 0
+        try:
+            remote_size = sftp.stat(remote_path).st_size or 0
+        except IOError:
+            return 0
+        return remote_size if remote_size <= local_size else 0
+
+
+def format_size(size: float) -> str:
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if size < 1024 or unit == "Go":
+            return f"{size:.1f} {unit}" if unit != "o" else f"{int(size)} o"
+        size /= 1024
+    return f"{size:.1f} Go"
+
+
+def channel_lost(channel) -> bool:
+    # canal paramiko dont le transport est tombé (les faux serveurs des tests n'ont pas de canal)
+    try:
+        inner = channel.get_channel()
+        return inner is None or inner.closed or not inner.get_transport().is_active()
+    except Exception:
+        return False
+
+
+def run_on_channels(sftp, items: Iterable, action: Callable, sftp_manager=None, workers: int = 1) -> None:
+    # le thread appelant travaille avec son propre canal, les autres empruntent un canal au pool s'il en reste
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+
+    errors: List[Tuple[object, Exception]] = []
+    lost: List[Exception] = []
+
+    def drain(channel) -> None:
+        while not lost:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                action(channel, item)
+            except Exception as e:
+                if channel_lost(channel):
+                    # connexion coupée: les éléments restants attendent la prochaine tentative
+                    lost.append(e)
+                    return
+                errors.append((item, e))
+
+    plugin = metrics.current_plugin()
+
+    def leased_drain() -> None:
+        try:
+            with metrics.plugin(plugin), sftp_manager.lease(blocking=False) as channel:
+                if channel is not None:
+                    drain(channel)
+        except Exception as e:
+            lost.append(e)
+
+    threads = []
+    if sftp_manager is not None:
+        for _ in range(min(workers - 1, pending.qsize())):
+            thread = threading.Thread(target=leased_drain, daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    drain(sftp)
+    for thread in threads:
+        thread.join()
+
+    if lost:
+        raise ConnectionError(f"connexion perdue: {lost[0]}") from lost[0]
+    if errors:
+        item, e = errors[0]
+        raise TransferError(f"{len(errors)} opération(s) en échec, ex: {item}: {e}")
+
+
+def make_remote_dirs(sftp, remote_root: str, rel_dirs: Iterable[str], sftp_manager=None, workers: int = 1) -> None:
+    def mkdir(channel, rel_dir: str) -> None:
+        try:
+            channel.mkdir(posixpath.join(remote_root, rel_dir) if rel_dir else remote_root)
+        except IOError:
+            pass
+
+    # un niveau de profondeur à la fois: les parents existent toujours avant leurs enfants
+    levels = {}
+    for rel_dir in rel_dirs:
+        levels.setdefault(rel_dir.count("/"), []).append(rel_dir)
+
+    mkdir(sftp, "")
+    for depth in sorted(levels):
+        run_on_channels(sftp, levels[depth], mkdir, sftp_manager, workers)
+
+
+def upload_file(sftp, local_path: str, remote_path: str, preserve_mtime: bool = True, offset: int = 0) -> int:
+    # offset: octets déjà présents sur le serveur (reprise), seule la suite est envoyée
+    st    = os.stat(local_path)
+    chunk = LARGE_FILE_CHUNK if st.st_size >= LARGE_FILE_SIZE else SMALL_FILE_CHUNK
+
+    with open(local_path, "rb") as src, sftp.open(remote_path, "r+b" if offset else "wb", bufsize=chunk) as dst:
+        if offset:
+            src.seek(offset)
+            dst.seek(offset)
+        # les écritures partent sans attendre chaque ack, close() attend la fin
+        dst.set_pipelined(True)
+        for data in iter(lambda: src.read(chunk), b""):
+            dst.write(data)
+
+    if preserve_mtime:
+        sftp.utime(remote_path, (int(st.st_atime), int(st.st_mtime)))
+    return st.st_size - offset
+
+
+def upload_files(sftp, local_root: str, remote_root: str, rel_paths: Iterable[str], sftp_manager=None,
+                 workers: int = 1, stats: Optional[TransferStats] = None,
+                 checkpoint: Optional[TransferCheckpoint] = None) -> TransferStats:
+    if checkpoint is not None:
+        # reprise: les fichiers terminés lors d'une tentative précédente ne repartent pas
+        stats     = stats or checkpoint.stats
+        rel_paths = [rel_path for rel_path in rel_paths if rel_path not in checkpoint.uploaded]
+    stats = stats or TransferStats()
+    if sftp_manager is not None and sftp_manager.throttled:
+        # débit borné: les petits fichiers passent devant les gros assets, le plugin est complet plus tôt
+        rel_paths = sorted(rel_paths, key=lambda rel_path: os.path.getsize(os.path.join(local_root, rel_path)))
+
+    def upload(channel, rel_path: str) -> None:
+        started     = time.monotonic()
+        local_path  = os.path.join(local_root, rel_path)
+        remote_path = posixpath.join(remote_root, rel_path)
+        offset      = 0
+        if checkpoint is not None:
+            offset = checkpoint.resume_offset(channel, rel_path, os.path.getsize(local_path), remote_path)
+            checkpoint.started.add(rel_path)
+
+        size = upload_file(channel, local_path, remote_path, offset=offset)
+        stats.add(size, saved=offset)
+        if checkpoint is not None:
+            checkpoint.uploaded.add(rel_path)
+        elapsed = time.monotonic() - started
+        resumed = f" (reprise à {format_size(offset)})" if offset else ""
+        debug(lambda: f"upload {rel_path}: {format_size(size)} en {elapsed * 1000:.0f}ms{resumed}")
+
+    run_on_channels(sftp, rel_paths, upload, sftp_manager, workers)
+    return stats.finish()
+
+
+def upload_tree(sftp, local_root: str, remote_root: str, sftp_manager=None, workers: int = 1,
+                checkpoint: Optional[TransferCheckpoint] = None, ignore: Optional[IgnoreRules] = None,
+                ignored: Optional[IgnoredFiles] = None) -> TransferStats:
+    files, dirs = scan_local_tree(local_root, ignore, ignored)
+    make_remote_dirs(sftp, remote_root, dirs, sftp_manager, workers)
+
+    # les gros fichiers partent en premier pour ne pas finir avec un seul canal occupé (sauf débit borné)
+    ordered = sorted(files, key=lambda rel_path: -files[rel_path].size)
+    stats   = upload_files(sftp, local_root, remote_root, ordered, sftp_manager, workers, checkpoint=checkpoint)
+    info(f"Upload {remote_root}: {stats.summary()}")
+    return stats
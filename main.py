@@ -1,41 +1,140 @@
+import argparse
+import json
+import os
+import posixpath
 import signal
 import stat
 import sys
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, List, Optional
 
-from connection.sftp_client import SFTPManager
-from core.plugin_manager import analyze_plugin
-from utils.config_loader import load_config, validate_environment
-from utils.exceptions import ConfigurationError, AutoSyncError
-from utils.logger import debug, warn, info, error, success
+from core.deploy import DeployOptions, wait_for_cleanups
+from core.state import StateStore
+from core.transfer import format_size
+from utils.config_loader import ServerConfig, load_config, validate_environment
+from utils.exceptions import ConfigurationError, AutoSyncError, AuthentificationError, GitHubError
+from utils.logger import build_sinks, debug, warn, info, error, logger, separator, success
+from utils.metrics import metrics
+
+# paramiko, GitPython et requests ne sont importés que par les modes qui s'en servent
+if TYPE_CHECKING:
+    from connection.sftp_client import SFTPManager
+    from core.hosts import HostSync
 
 
 class AutoSync:
-    def __init__(self):
-        self.sftp_manager = None
+    def __init__(self, full: bool = False, config_path: Optional[str] = None, log_level: Optional[str] = None,
+                 command: Optional[str] = None, targets: Optional[List[str]] = None):
+        # command: scan ou update ajustent les modes de config.yml, targets remplace target_plugins
+        self.hosts: List["HostSync"] = []
+        self.github       = None
+        self.git_source   = None
+        self.deploy_options = None
+        self.state        = None
         self.config       = None
         self.interrupted  = None
+        self.full         = full
+        self.config_path  = config_path
+        self.log_level    = log_level
+        self.command      = command
+        self.targets      = targets
+        self.selector     = None
+        self.bandwidth    = None
+        self.pipeline     = None
+        self.batcher      = None
 
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
 
     def _signal_handler(self, signum, frame):
         warn(f"Signal {signum} reçu, arrêt en cours...")
-        if self.sftp_manager:
-            self.sftp_manager.close()
+        if self.interrupted or not self.pipeline:
+            # second signal, ou rien à vider: on coupe tout de suite
+            for host in self.hosts:
+                if host.sftp_manager:
+                    host.sftp_manager.close()
+        else:
+            # les étapes en cours se terminent, le reste du pipeline est abandonné proprement dans run()
+            self.pipeline.cancel()
         self.interrupted = True
         sys.exit(0)
 
-    def initialize(self) -> bool:
+    def initialize(self, daemon: bool = False) -> bool:
         try:
-            validate_environment()
-
-            self.config = load_config()
+            self.config = load_config(self.config_path)
+            logger.configure(level=self.log_level or self.config.log_level,
+                             sinks=build_sinks(self.config.log_format, self.config.log_json))
+            if self.command == "scan":
+                self.config.modes = [mode for mode in self.config.modes if mode != "update"]
+            elif self.command == "update":
+                # l'update ne concerne que les plugins liés à GitHub
+                self.config.modes = list(dict.fromkeys([*self.config.modes, "github", "update"]))
+            if self.targets:
+                self.config.target_plugins     = self.targets
+                self.config.target_all_plugins = False
+            self.selector = self.config.target_selector()
+            validate_environment(require_sftp=not self.config.servers)
             info(f"Configuration initialisée")
             debug(f"Modes: {self.config.modes}")
-            debug(f"Target plugins: {self.config.target_plugins}")
+            debug(f"Target plugins: {'tous' if self.selector.all else self.config.target_plugins}")
+            debug(f"Workers d'analyse: {self.config.analysis_workers}")
+
+            if self.config.metrics:
+                metrics.enable()
+                metrics.reset()
 
-            self.sftp_manager = SFTPManager(timeout=self.config.sftp_timeout, max_retries=self.config.max_retries)
+            # limiteur global créé une fois: tous les serveurs se partagent son débit
+            self.bandwidth = self.config.bandwidth_limiter()
+            self.hosts = self._build_hosts()
+            if self.config.state_db:
+                self.state = StateStore(self.config.state_db)
+                debug(f"Base d'état: {self.config.state_db}{' (rescan complet)' if self.full else ''}")
+
+            tarball = self.config.mode_flags["update"] and self.config.update_source == "tarball"
+            if self.config.mode_flags["github"] or daemon or tarball:
+                from core.github import GitHubClient
+
+                self.github = GitHubClient(
+                    account=os.getenv("GITHUB"),
+                    token=os.getenv("GITHUB_TOKEN"),
+                    timeout=self.config.github_timeout,
+                    api_url=self.config.github_api_url,
+                    state=self.state,
+                )
+            self.deploy_options = DeployOptions(
+                strategy=self.config.update_strategy,
+                checksum=self.config.delta_checksum,
+                mode=self.config.deploy_mode,
+                workers=self.config.upload_workers,
+                transfer=self.config.transfer_mode,
+                plugin_transfer={name.lower(): mode for name, mode in self.config.plugin_transfer_modes.items()},
+                manifest=self.config.deploy_manifest,
+                # --full: le manifeste en ligne n'est pas cru, le serveur est parcouru en entier
+                trust_manifest=not self.full,
+                spot_checks=self.config.manifest_spot_checks,
+                retries=self.config.transfer_retries,
+                retry_delay=self.config.transfer_retry_delay,
+                retry_max_delay=self.config.transfer_retry_max_delay,
+                excludes=self.config.sync_excludes,
+            )
+
+            if tarball:
+                from core.tarball import TarballSource
+
+                self.git_source = TarballSource(self.github)
+            elif self.config.mode_flags["update"]:
+                from core.git_cache import GitSource
+
+                self.git_source = GitSource(
+                    account=os.getenv("GITHUB"),
+                    token=os.getenv("GITHUB_TOKEN"),
+                    cache_dir=self.config.git_cache_dir,
+                    mirror=self.config.git_mirror,
+                    shallow=self.config.git_shallow,
+                    single_branch=self.config.git_single_branch,
+                    base_url=self.config.github_url,
+                )
 
             return True
         except ConfigurationError as e:
@@ -45,82 +144,191 @@ class AutoSync:
             warn(f"Erreur lors de l'initialisation: {e}")
             return False
 
-    def get_plugin_names(self, sftp) -> List[str]:
+    def _sftp_manager(self, channels: int, credentials: Optional[dict] = None,
+                      server: Optional[ServerConfig] = None) -> "SFTPManager":
+        from connection.sftp_client import SFTPManager
+
+        # débit global partagé, plus celui propre au serveur
+        limiters = [self.bandwidth, self.config.bandwidth_limiter(server) if server else None]
+        return SFTPManager(
+            timeout=self.config.sftp_timeout,
+            max_retries=self.config.max_retries,
+            pool_size=channels,
+            keepalive=self.config.sftp_keepalive,
+            allow_exec=self.config.remote_exec,
+            credentials=credentials,
+            limiters=[limiter for limiter in limiters if limiter],
+            **self.config.transport_options(server),
+        )
+
+    def _build_hosts(self) -> List["HostSync"]:
+        from core.hosts import HostSync
+
+        if not self.config.servers:
+            # un seul serveur, identifiants lus dans l'environnement
+            return [HostSync("", self.config.plugins_dir, self._sftp_manager(self.config.sftp_channels))]
+
+        hosts = []
+        for server in self.config.servers:
+            host = HostSync(server.name, server.plugins_dir or self.config.plugins_dir, None)
+            try:
+                host.sftp_manager = self._sftp_manager(server.channels or self.config.sftp_channels, server.credentials(), server)
+            except AuthentificationError as e:
+                host.fail(e)
+            hosts.append(host)
+
+        debug(f"Serveurs: {[host.name for host in hosts]}")
+        return hosts
+
+    @property
+    def update_only(self) -> bool:
+        # commande update: seuls les plugins ciblés sont listés et analysés
+        return self.command == "update"
+
+    def get_plugin_names(self, host: "HostSync", sftp) -> List[str]:
+        select = self.selector.matches if self.update_only else None
         try:
-            entries      = sftp.listdir_attr(self.config.plugins_dir)
+            if self.config.remote_index:
+                from core.remote_index import RemoteTreeIndex
+
+                host.index = RemoteTreeIndex(
+                    sftp,
+                    host.plugins_dir,
+                    sftp_manager=host.sftp_manager,
+                    workers=host.sftp_manager.pool_size,
+                    use_exec=self.config.remote_exec,
+                    select=select,
+                ).build()
+                return host.index.plugin_names()
+
+            entries      = sftp.listdir_attr(host.plugins_dir)
             plugins_name = []
 
             for entry in entries:
-                if stat.S_ISDIR(entry.st_mode):
+                if stat.S_ISDIR(entry.st_mode) and (select is None or select(entry.filename)):
                     plugins_name.append(entry.filename)
+                    host.plugin_mtimes[entry.filename] = entry.st_mtime
 
             return sorted(plugins_name)
 
         except Exception as e:
-            warn(f"Erreur lors de la récupération des noms de plugins: {e}")
+            warn(f"{host.label}Erreur lors de la récupération des noms de plugins: {e}")
             return []
 
-    def analyze_plugins(self, sftp, plugin_names: List[str]) -> List:
-        plugins = []
-        total = len(plugin_names)
+    def _scan_host(self, host: "HostSync", names: Optional[List[str]] = None) -> None:
+        if host.failed:
+            return
 
-        for i, name in enumerate(plugin_names, 1):
-            if self.interrupted:
-                break
+        try:
+            client, sftp = host.sftp_manager.connect()
+        except (ConnectionError, AutoSyncError) as e:
+            host.fail(e)
+            return
 
-            debug(f"[{i}/{total}] Analyzing {name}")
-            try:
-                plugin = analyze_plugin(
-                    sftp=sftp,
-                    name=name,
-                    plugins_dir=self.config.plugins_dir,
-                    authors=self.config.authors,
-                    target_plugins=self.config.target_plugins,
-                    check_valid=self.config.mode_flags["valid"],
-                    check_author=self.config.mode_flags["owned"],
-                    check_github=self.config.mode_flags["github"],
-                    update=self.config.mode_flags["update"],
-                )
+        if names is not None and host.listing:
+            # passage ciblé: pas de nouvel index, les plugins concernés sont relus directement
+            wanted = {name.lower() for name in names}
+            host.plugin_names = [name for name in host.listing if name.lower() in wanted]
+            return
 
-                if plugin:
-                    plugins.append(plugin)
-                    if plugin.explain:
-                        plugin.explain()
-            except Exception as e:
-                error(f"Failed to analyze plugin {name}: {e}")
+        host.plugin_names = host.listing = self.get_plugin_names(host, sftp)
+        if not host.plugin_names:
+            warn(f"{host.label}Aucun plugin trouvé dans {host.plugins_dir}")
+        else:
+            debug("%sPlugins trouvés: %s", host.label, host.plugin_names)
 
-            print("-" * 80)
+    def _analyze_one(self, host: "HostSync", name: str, logs: Optional[list] = None):
+        from core.plugin_manager import analyze_plugin
 
-        return plugins
+        if self.interrupted or host.failed:
+            return None
 
-    def run(self) -> int:
-        # 0 succès, 1 erreur
+        with logger.capture(logs), metrics.plugin(name), host.sftp_manager.lease() as sftp:
+            plugin = analyze_plugin(
+                sftp=sftp,
+                name=name,
+                plugins_dir=host.plugins_dir,
+                authors=self.config.authors,
+                target_plugins=self.selector,
+                github=self.github,
+                check_valid=self.config.mode_flags["valid"],
+                check_author=self.config.mode_flags["owned"],
+                check_github=self.config.mode_flags["github"],
+                update=self.config.mode_flags["update"],
+                deploy_options=self.deploy_options,
+                state=self.state,
+                host=host.sftp_manager.host,
+                remote_mtime=host.plugin_mtimes.get(name),
+                full=self.full,
+                github_ttl=self.config.github_cache_ttl,
+                source=self.git_source,
+                sftp_manager=host.sftp_manager,
+                index=host.index,
+                defer_update=self.pipeline is not None,
+                verify=self.config.mode_flags["verify"],
+                spot_checks=self.config.manifest_spot_checks,
+            )
+
+        if plugin is not None and host.name:
+            plugin.label = f"{host.label}{plugin.name}"
+        return plugin
+
+    def analyze_plugins(self, host: "HostSync") -> List:
+        plugins = []
+        total   = len(host.plugin_names)
+
+        # plusieurs workers: leurs messages sont gardés par plugin et affichés avec son bloc, pas entre deux blocs
+        logs = {name: [] for name in host.plugin_names} if self.config.analysis_workers > 1 else {}
+
+        executor = ThreadPoolExecutor(max_workers=self.config.analysis_workers, thread_name_prefix="analyze")
         try:
-            if not self.initialize():
-                return 1
+            futures = [executor.submit(self._analyze_one, host, name, logs.get(name)) for name in host.plugin_names]
 
-            client, sftp = self.sftp_manager.connect()
+            # résultats affichés dans l'ordre de soumission, un bloc complet par plugin
+            for i, (name, future) in enumerate(zip(host.plugin_names, futures), 1):
+                if self.interrupted:
+                    break
 
-            try:
-                plugin_names = self.get_plugin_names(sftp)
-                if not plugin_names:
-                    warn(f"Aucun plugin trouvé dans {self.config.plugins_dir}")
-                    return 1
+                plugin = None
+                try:
+                    wait([future])
+                    debug("%s[%d/%d] Analyzing %s", host.label, i, total, name)
+                    logger.replay(logs.pop(name, []))
+                    plugin = future.result()
+                    if plugin:
+                        plugins.append(plugin)
+                        if plugin.explain:
+                            plugin.explain()
+                except Exception as e:
+                    error(f"{host.label}Failed to analyze plugin {name}: {e}")
+                    host.check(e)
 
-                debug(f"Plugins trouvés: {plugin_names}")
+                if self.batcher:
+                    self.batcher.report(host, name, plugin)
 
-                debug(f"Analyse de {len(plugin_names)} plugins dans {self.config.plugins_dir}...")
-                plugins = self.analyze_plugins(sftp, plugin_names)
+                separator()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if self.batcher:
+                self.batcher.host_done(host)
 
-                if not plugins:
-                    warn("Aucun plugin valide trouvé.")
-                    return 1
+        host.plugins = plugins
+        return plugins
 
-                self.print_summary(plugins)
+    def run(self, daemon: bool = False) -> int:
+        # 0 succès, 1 erreur
+        try:
+            if not self.initialize(daemon):
+                return 1
+
+            try:
+                if daemon:
+                    from core.daemon import Daemon
 
-                return 0
+                    return Daemon(self).run()
+                return self.sweep()
             finally:
-                self.sftp_manager.close()
+                self.shutdown()
         except ConnectionError as e:
             error(f"Erreur de connexion SFTP: {e}")
             return 1
@@ -134,15 +342,237 @@ class AutoSync:
             error(f"Erreur inattendue: {e}")
             return 1
 
+    def sweep(self, names: Optional[List[str]] = None) -> int:
+        # names: seulement ces plugins (daemon), sinon tout plugins_dir
+        plugins = []
+        status  = 1
+        if metrics.enabled:
+            metrics.reset()
+
+        try:
+            for host in self.hosts:
+                host.reset()
+            # connexion (réutilisée si encore active) et index de chaque serveur en parallèle
+            self._for_each_host(lambda host: self._scan_host(host, names), self.hosts)
+            hosts = [host for host in self.hosts if not host.failed and host.plugin_names]
+            if not hosts:
+                if not any(host.failed for host in self.hosts):
+                    return 1
+                raise ConnectionError("aucun serveur joignable")
+
+            if self.config.mode_flags["github"]:
+                if names is None:
+                    self.github.refresh()
+                try:
+                    info(f"GitHub: {len(self.github.repositories)} repositories chargés")
+                except GitHubError as e:
+                    warn(f"Impossible de lister les repositories GitHub: {e}")
+
+            if self.config.mode_flags["update"]:
+                from core.pipeline import UpdateBatcher, UpdatePipeline
+
+                self.pipeline = UpdatePipeline(
+                    hosts[0].sftp_manager,
+                    self.git_source,
+                    self.deploy_options,
+                    fetch_workers=self.config.fetch_workers,
+                    prepare_workers=self.config.prepare_workers,
+                    deploy_workers=self.config.deploy_workers,
+                    queue_size=self.config.pipeline_queue_size,
+                    on_deployed=self._on_deployed,
+                )
+                # chaque repository est récupéré une fois puis déployé sur tous les serveurs qui en ont besoin
+                self.batcher = UpdateBatcher(self.pipeline, hosts)
+
+            for host in hosts:
+                debug(f"{host.label}Analyse de {len(host.plugin_names)} plugins dans {host.plugins_dir}...")
+            self._for_each_host(self.analyze_plugins, hosts)
+
+            if self.pipeline:
+                # attend la fin des updates encore dans le pipeline
+                self.pipeline.close()
+
+            plugins = [plugin for host in self.hosts for plugin in host.plugins]
+            if not plugins:
+                warn("Aucun plugin valide trouvé.")
+                return 1
+
+            self.print_summary(plugins)
+
+            status = 1 if any(host.failed for host in self.hosts) else 0
+            return status
+        finally:
+            if self.pipeline:
+                self.pipeline.close()
+            self.pipeline = None
+            self.batcher  = None
+            wait_for_cleanups()
+            self.export_metrics(plugins, status)
+
+    def shutdown(self) -> None:
+        for host in self.hosts:
+            if host.sftp_manager:
+                host.sftp_manager.close()
+        if self.github:
+            self.github.close()
+        if self.state:
+            self.state.close()
+
+    def _for_each_host(self, action, hosts: List["HostSync"]) -> None:
+        if len(hosts) == 1:
+            action(hosts[0])
+            return
+
+        with ThreadPoolExecutor(max_workers=self.config.server_workers, thread_name_prefix="server") as executor:
+            list(executor.map(action, hosts))
+
+    def _on_deployed(self, plugin) -> None:
+        if self.state and plugin.deployed_sha:
+            self.state.set_deployed(plugin.host, plugin.path, plugin.deployed_sha)
+
+    def export_metrics(self, plugins, status: int) -> None:
+        if not metrics.enabled:
+            return
+
+        transferred = [p.transfer_stats for p in plugins if p.transfer_stats]
+        metrics.set_gauge("run_duration_seconds", round(time.time() - metrics.started_at, 3))
+        metrics.set_gauge("run_success", int(status == 0))
+        metrics.set_gauge("last_run_timestamp_seconds", int(time.time()))
+        metrics.set_gauge("servers_failed", sum(host.failed for host in self.hosts))
+        metrics.set_gauge("plugins_analyzed", len(plugins))
+        metrics.set_gauge("plugins_updated", sum(p.updated for p in plugins))
+        metrics.set_gauge("transfer_bytes", sum(s.bytes for s in transferred))
+        metrics.set_gauge("transfer_saved_bytes", sum(s.saved_bytes for s in transferred))
+        metrics.set_gauge("transfer_ignored_files", sum(s.ignored_files for s in transferred))
+        metrics.set_gauge("transfer_ignored_bytes", sum(s.ignored_bytes for s in transferred))
+
+        try:
+            if self.config.metrics_report:
+                metrics.write_json(self.config.metrics_report)
+                debug(f"Rapport de mesures écrit dans {self.config.metrics_report}")
+            if self.config.metrics_textfile:
+                metrics.write_prometheus(self.config.metrics_textfile)
+                debug(f"Mesures Prometheus écrites dans {self.config.metrics_textfile}")
+        except OSError as e:
+            warn(f"Impossible d'écrire les mesures: {e}")
+
     def print_summary(self, plugins) -> None:
-        if self.config.mode_flags["valid"]: debug(f"{sum(p.is_valid for p in plugins)} plugins valides")
-        if self.config.mode_flags["owned"]: warn(f"{sum(p.is_owned for p in plugins)} vous appartiennent")
-        if self.config.mode_flags["github"]: info(f"{sum(p.is_github for p in plugins)} sont sur GitHub (et vous appartiennent)")
-        if self.config.mode_flags["update"]: success(f"{sum(p.updated for p in plugins)} ont été update")
-
-def main() -> int:
-    app = AutoSync()
-    return app.run()
+        if len(self.hosts) == 1:
+            self._print_counts(plugins)
+            return
+
+        for host in self.hosts:
+            separator()
+            if host.failed:
+                error(f"{host.label}Échec: {host.error}")
+                continue
+            self._print_counts(host.plugins, host.label)
+
+        separator()
+        self._print_counts(plugins, "total: ")
+
+    def _print_counts(self, plugins, label: str = "") -> None:
+        if self.config.mode_flags["valid"]: info(f"{label}{sum(p.is_valid for p in plugins)} plugins valides")
+        if self.config.mode_flags["owned"]: warn(f"{label}{sum(p.is_owned for p in plugins)} vous appartiennent")
+        if self.config.mode_flags["github"]: info(f"{label}{sum(p.is_github for p in plugins)} sont sur GitHub (et vous appartiennent)")
+        if self.config.mode_flags["update"]: success(f"{label}{sum(p.updated for p in plugins)} ont été update")
+        if self.config.mode_flags["verify"]: warn(f"{label}{sum(bool(p.drift) for p in plugins)} modifiés sur le serveur depuis leur déploiement")
+
+        transferred = [p.transfer_stats for p in plugins if p.transfer_stats]
+        if transferred:
+            info(f"{label}Transfert: {sum(s.files for s in transferred)} fichiers, {format_size(sum(s.bytes for s in transferred))} envoyés, "
+                 f"{format_size(sum(s.saved_bytes for s in transferred))} économisés")
+            ignored = sum(s.ignored_files for s in transferred)
+            if ignored:
+                info(f"{label}Exclus (.syncignore, sync_excludes): {ignored} fichiers, "
+                     f"{format_size(sum(s.ignored_bytes for s in transferred))} non envoyés")
+
+def show_status(config_path: Optional[str] = None, log_level: Optional[str] = None) -> int:
+    # lecture seule de la base d'état et du dernier rapport: aucune connexion, aucun import de paramiko / GitPython
+    try:
+        config = load_config(config_path)
+    except ConfigurationError as e:
+        warn(f"Erreur de configuration: {e}")
+        return 1
+    logger.configure(level=log_level or config.log_level, sinks=build_sinks(config.log_format, config.log_json))
+
+    if not config.state_db or not os.path.exists(config.state_db):
+        warn("Aucune base d'état, lancez d'abord un scan (state_db doit être configuré)")
+        return 1
+
+    state = StateStore(config.state_db)
+    try:
+        records = state.all()
+    finally:
+        state.close()
+
+    targets = config.target_selector()
+    for record in records:
+        name    = posixpath.basename(record.path)
+        checks  = ["valide" if record.is_valid else "structure invalide"]
+        if record.github_status is not None:
+            checks.append("sur GitHub" if record.github_status else "absent de GitHub")
+        deployed = f"commit {record.deployed_sha[:7]}" if record.deployed_sha else "jamais déployé"
+        seen     = time.strftime("%Y-%m-%d %H:%M", time.localtime(record.updated_at)) if record.updated_at else "?"
+        target   = " (cible)" if targets.matches(name) else ""
+        info(f"{record.host} {name}{target}: {', '.join(checks)}, {deployed}, vu le {seen}")
+
+    separator()
+    info(f"{len(records)} plugins connus, {sum(bool(r.deployed_sha) for r in records)} déployés par l'auto-sync")
+
+    if config.metrics_report and os.path.exists(config.metrics_report):
+        try:
+            with open(config.metrics_report, encoding="utf-8") as f:
+                gauges = json.load(f).get("gauges", {})
+        except (OSError, ValueError) as e:
+            warn(f"Rapport de mesures illisible: {e}")
+            return 0
+        if "last_run_timestamp_seconds" in gauges:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(gauges["last_run_timestamp_seconds"]))
+            log  = success if gauges.get("run_success") else error
+            log(f"Dernier passage le {when}: {'succès' if gauges.get('run_success') else 'échec'} "
+                f"en {gauges.get('run_duration_seconds', 0):.1f}s, {gauges.get('plugins_updated', 0)} plugins mis à jour")
+    return 0
+
+def _add_common_arguments(parser: argparse.ArgumentParser, suppress: bool = False) -> None:
+    # sur les sous-commandes, SUPPRESS évite d'écraser une option déjà donnée avant la sous-commande
+    default = argparse.SUPPRESS if suppress else None
+    parser.add_argument("--config", default=default, help="chemin du fichier de configuration (config.yml du projet par défaut)")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_const", const="debug", dest="log_level", default=default,
+                           help="affiche aussi les messages de debug")
+    verbosity.add_argument("-q", "--quiet", action="store_const", const="warn", dest="log_level", default=default,
+                           help="n'affiche que les avertissements et les erreurs")
+
+def _add_run_arguments(parser: argparse.ArgumentParser, suppress: bool = False) -> None:
+    parser.add_argument("--full", action="store_true", default=argparse.SUPPRESS if suppress else False,
+                        help="ignore la base d'état et les manifestes en ligne, force une analyse complète")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="sftp-auto-sync", description="sans sous-commande: modes de config.yml")
+    _add_common_arguments(parser)
+    _add_run_arguments(parser)
+    parser.add_argument("--daemon", action="store_true",
+                        help="reste connecté et met à jour les plugins à chaque push (polling GitHub et/ou webhook)")
+
+    commands = parser.add_subparsers(dest="command", metavar="commande")
+    scan = commands.add_parser("scan", help="analyse les plugins sans rien mettre à jour")
+    update = commands.add_parser("update", help="analyse puis met à jour target_plugins (ou les plugins donnés)")
+    update.add_argument("plugins", nargs="*", help="plugins à mettre à jour à la place de target_plugins")
+    daemon = commands.add_parser("daemon", help="équivalent de --daemon")
+    status = commands.add_parser("status", help="état connu de chaque plugin, lu dans la base locale (sans connexion)")
+    for command in (scan, update, daemon, status):
+        _add_common_arguments(command, suppress=True)
+    for command in (scan, update, daemon):
+        _add_run_arguments(command, suppress=True)
+
+    args = parser.parse_args(argv)
+    if args.command == "status":
+        return show_status(args.config, args.log_level)
+
+    app = AutoSync(full=args.full, config_path=args.config, log_level=args.log_level, command=args.command,
+                   targets=getattr(args, "plugins", None) or None)
+    return app.run(daemon=args.daemon or args.command == "daemon")
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -1,4 +1,4 @@
-from setuptools import setup, find_packages
+from setuptools import setup, find_namespace_packages
 
 setup(
     name="sftp_auto_sync",
@@ -9,13 +9,16 @@ setup(
     long_description=open("README.md", encoding="utf-8").read(),
     long_description_content_type="text/markdown",
     url="https://github.com/khIbrahim/sftp_auto_sync",
-    packages=find_packages(exclude=["tests*"]),
+    # pas de __init__.py: paquets "namespace", main.py est le point d'entrée de la commande
+    packages=find_namespace_packages(include=["core", "connection", "utils"]),
+    py_modules=["main"],
     install_requires=[
         "paramiko>=3.5.0",
         "python-dotenv>=1.1.0",
         "rich>=14.0.0",
         "PyYAML>=6.0.0",
         "GitPython>=3.1.0",
+        "requests>=2.31.0",
     ],
     classifiers=[
         "Programming Language :: Python :: 3.10",
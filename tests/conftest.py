@@ -0,0 +1,29 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# doubles de test partagés: importés par les tests depuis tests.helpers, jamais depuis conftest
+from tests.helpers import LocalSFTP  # noqa: E402
+
+
+@pytest.fixture
+def local_sftp(tmp_path):
+    root = tmp_path / "remote"
+    root.mkdir()
+    return LocalSFTP(str(root))
+
+
+@pytest.fixture
+def mock_ssh_client_class():
+    with patch("connection.sftp_client.paramiko.SSHClient") as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_load_credentials():
+    with patch("connection.sftp_client.load_credentials") as mock:
+        yield mock
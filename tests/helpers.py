@@ -0,0 +1,101 @@
+import os
+import subprocess
+from unittest.mock import MagicMock
+
+import paramiko
+
+
+class LocalSFTP:
+    # imite l'API de paramiko.SFTPClient sur un dossier local
+    def __init__(self, root):
+        self.root = root
+
+    def _p(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def listdir(self, path="."):
+        return os.listdir(self._p(path))
+
+    def listdir_attr(self, path="."):
+        entries = []
+        for name in os.listdir(self._p(path)):
+            attr = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(self._p(path), name)), name)
+            entries.append(attr)
+        return entries
+
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(self._p(path)))
+
+    def lstat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.lstat(self._p(path)))
+
+    def mkdir(self, path, mode=0o777):
+        os.mkdir(self._p(path))
+
+    def rmdir(self, path):
+        os.rmdir(self._p(path))
+
+    def remove(self, path):
+        os.remove(self._p(path))
+
+    def rename(self, old, new):
+        if os.path.exists(self._p(new)):
+            raise IOError(f"{new} existe déjà")
+        os.rename(self._p(old), self._p(new))
+
+    def posix_rename(self, old, new):
+        os.replace(self._p(old), self._p(new))
+
+    def utime(self, path, times):
+        os.utime(self._p(path), times)
+
+    def put(self, localpath, remotepath, callback=None, confirm=True):
+        with open(localpath, "rb") as src, open(self._p(remotepath), "wb") as dst:
+            dst.write(src.read())
+        return self.stat(remotepath)
+
+    def open(self, path, mode="r", bufsize=-1):
+        return _LocalFile(self._p(path), mode)
+
+
+class _LocalFile:
+    def __init__(self, path, mode):
+        mode = mode.replace("b", "")
+        self._f = open(path, mode + "b")
+
+    def prefetch(self, file_size=None):
+        pass
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def __getattr__(self, item):
+        return getattr(self._f, item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+class ShellManager:
+    # exécute les commandes "distantes" en local, dans la racine du faux serveur
+    def __init__(self, root, allowed=True):
+        self.root = root
+        self.allowed = allowed
+        self.commands = []
+        self.throttled = False
+
+    def can_exec(self):
+        return self.allowed
+
+    def exec_command(self, command, timeout=None):
+        self.commands.append(command)
+        result = subprocess.run(command, shell=True, cwd=self.root, capture_output=True)
+        return result.returncode, result.stdout, result.stderr
+
+    def lease(self, blocking=True):
+        lease = MagicMock()
+        lease.__enter__.return_value = None
+        return lease
@@ -0,0 +1,42 @@
+import os
+
+from core.deploy import DeployOptions, deploy
+from tests.helpers import ShellManager
+
+
+def _local_tree(tmp_path):
+    local = tmp_path / "local"
+    (local / "src" / "acme").mkdir(parents=True)
+    (local / "plugin.yml").write_text("name: Test\n" * 50)
+    (local / "src" / "acme" / "Main.php").write_text("<?php echo 'hello';\n" * 200)
+    return str(local)
+
+
+def test_archive_transfer_extracts_remotely(tmp_path, local_sftp) -> None:
+    local = _local_tree(tmp_path)
+    os.makedirs(os.path.join(local_sftp.root, "plugins"))
+    manager = ShellManager(local_sftp.root)
+
+    stats = deploy(local_sftp, local, "plugins/Test",
+                   DeployOptions(strategy="full", mode="in_place", transfer="archive"), manager)
+
+    assert any("tar -xzf" in command for command in manager.commands)
+    assert stats.files == 2
+    assert stats.saved_bytes > 0
+    assert os.listdir(os.path.join(local_sftp.root, "plugins")) == ["Test"]
+    with open(os.path.join(local_sftp.root, "plugins/Test/src/acme/Main.php")) as f:
+        assert f.read() == "<?php echo 'hello';\n" * 200
+
+
+def test_archive_falls_back_to_files_without_exec(tmp_path, local_sftp) -> None:
+    local = _local_tree(tmp_path)
+    os.makedirs(os.path.join(local_sftp.root, "plugins"))
+    manager = ShellManager(local_sftp.root, allowed=False)
+
+    options = DeployOptions(strategy="delta", mode="staged", plugin_transfer={"test": "archive"}).for_plugin("Test")
+    stats = deploy(local_sftp, local, "plugins/Test", options, manager)
+
+    assert options.archive
+    assert manager.commands == []
+    assert stats.saved_bytes == 0
+    assert os.path.exists(os.path.join(local_sftp.root, "plugins/Test/src/acme/Main.php"))
@@ -0,0 +1,80 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from connection.sftp_client import SFTPManager
+from core.transfer import upload_files
+from tests.helpers import ShellManager
+from utils.bandwidth import BandwidthLimiter, TokenBucket, parse_schedule
+
+
+def test_token_bucket_borrows_and_follows_the_schedule() -> None:
+    now   = [0.0]
+    clock = SimpleNamespace(hour=12)
+    schedule = parse_schedule([{"start": "08:00", "end": "23:00", "limit": 100_000},
+                               {"start": 1380, "end": "08:00", "limit": 0}])
+    bucket = TokenBucket(0, schedule, clock=lambda: now[0],
+                         local_time=lambda: SimpleNamespace(tm_hour=clock.hour, tm_min=0))
+
+    # la rafale passe sans attendre, la suite s'endette au débit de la plage
+    assert bucket.reserve(25_000) == 0.0
+    assert bucket.reserve(50_000) == pytest.approx(0.5)
+    assert bucket.reserve(50_000) == pytest.approx(1.0)
+    now[0] = 1.0
+    assert bucket.reserve(100_000) == pytest.approx(1.0)
+
+    # plage de nuit à cheval sur minuit: plein débit
+    clock.hour = 2
+    assert bucket.rate() == 0
+    assert bucket.reserve(10_000_000) == 0.0
+
+    with pytest.raises(ValueError):
+        parse_schedule([{"start": "25:00", "end": "08:00", "limit": 0}])
+
+
+def test_small_files_go_first_when_throttled(local_sftp, tmp_path) -> None:
+    local_root = tmp_path / "local"
+    local_root.mkdir()
+    for name, size in (("big.jar", 50_000), ("mid.yml", 5_000), ("tiny.yml", 10)):
+        (local_root / name).write_bytes(b"x" * size)
+
+    opened    = []
+    open_file = local_sftp.open
+
+    def recording_open(path, mode="r", bufsize=-1):
+        opened.append(os.path.basename(path))
+        return open_file(path, mode, bufsize)
+
+    local_sftp.open = recording_open
+
+    manager = ShellManager(local_sftp.root)
+    manager.throttled = True
+    upload_files(local_sftp, str(local_root), "/", ["big.jar", "mid.yml", "tiny.yml"], manager)
+    assert opened == ["tiny.yml", "mid.yml", "big.jar"]
+
+
+def test_throttled_transport_caps_the_upload_rate(tmp_path) -> None:
+    from bench.sftp_server import LocalSFTPServer
+
+    local_root = tmp_path / "local"
+    local_root.mkdir()
+    (local_root / "asset.bin").write_bytes(os.urandom(384 * 1024))
+    (tmp_path / "remote").mkdir()
+
+    with LocalSFTPServer(str(tmp_path / "remote")) as server:
+        credentials = {"hostname": server.host, "port": server.port, "username": "bench", "password": "bench"}
+        manager = SFTPManager(credentials=credentials, limiters=[BandwidthLimiter(256 * 1024)])
+        try:
+            _, sftp = manager.connect()
+            assert manager.throttled
+            started = time.monotonic()
+            upload_files(sftp, str(local_root), "/", ["asset.bin"], manager)
+            elapsed = time.monotonic() - started
+        finally:
+            manager.close()
+
+    # 384 Ko à 256 Ko/s, moins la rafale initiale
+    assert elapsed >= 1.25
+    assert (tmp_path / "remote" / "asset.bin").stat().st_size == 384 * 1024
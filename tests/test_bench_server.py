@@ -0,0 +1,50 @@
+import paramiko
+
+from bench.github_stub import GitHubStub
+from bench.sftp_server import LocalSFTPServer
+from core.github import GitHubClient
+from core.state import StateStore
+
+
+def test_local_sftp_server_serves_files_and_counts_round_trips(tmp_path) -> None:
+    (tmp_path / "plugins").mkdir()
+
+    with LocalSFTPServer(str(tmp_path)) as server:
+        transport = paramiko.Transport((server.host, server.port))
+        transport.connect(username="bench", password="bench")
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        try:
+            with sftp.open("/plugins/a.txt", "wb") as f:
+                f.write(b"hello")
+            assert sftp.listdir("/plugins") == ["a.txt"]
+        finally:
+            sftp.close()
+            transport.close()
+
+        snapshot = server.stats.snapshot()
+
+    assert (tmp_path / "plugins" / "a.txt").read_bytes() == b"hello"
+    assert snapshot["sftp_requests"]["open"] == 1
+    assert snapshot["bytes_written"] == 5
+    assert snapshot["sftp_round_trips"] >= 4
+
+
+def test_github_stub_paginates_and_answers_304(tmp_path) -> None:
+    names = [f"Plugin{i:03d}" for i in range(150)]
+    state = StateStore(str(tmp_path / "state.db"))
+
+    with GitHubStub("bench", names) as stub:
+        client = GitHubClient("bench", "token", api_url=stub.url, state=state)
+        assert len(client.repositories) == 150
+        client.close()
+        first = stub.snapshot()
+        stub.reset()
+
+        client = GitHubClient("bench", "token", api_url=stub.url, state=state)
+        assert client.has_repository("plugin149")
+        client.close()
+        second = stub.snapshot()
+
+    state.close()
+    assert first["http_requests"] == {"list_repos": 2}
+    assert second["http_requests"] == {"list_repos": 2, "not_modified": 2}
@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import json
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+from core.daemon import Daemon, WebhookListener, verify_signature
+from utils.config_loader import Config
+
+
+def _post(listener, payload, event="push", secret=None):
+    body    = json.dumps(payload).encode()
+    headers = {"X-GitHub-Event": event, "Content-Type": "application/json"}
+    if secret:
+        headers["X-Hub-Signature-256"] = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(f"http://{listener.host}:{listener.port}/", data=body, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_signature_is_checked_against_the_secret() -> None:
+    signature = "sha256=" + hmac.new(b"s3cret", b"{}", hashlib.sha256).hexdigest()
+    assert verify_signature("s3cret", b"{}", signature)
+    assert not verify_signature("other", b"{}", signature)
+    assert not verify_signature("s3cret", b"{}", None)
+
+
+def test_webhook_only_forwards_signed_pushes_on_the_default_branch() -> None:
+    pushed   = []
+    listener = WebhookListener("127.0.0.1", 0, "s3cret", pushed.append).start()
+    try:
+        repository = {"name": "Moderation", "default_branch": "main"}
+        assert _post(listener, {"ref": "refs/heads/main", "repository": repository}, secret="s3cret") == 202
+        assert _post(listener, {"ref": "refs/heads/dev", "repository": repository}, secret="s3cret") == 204
+        assert _post(listener, {"ref": "refs/heads/main", "repository": repository}, secret="wrong") == 401
+        assert _post(listener, {"zen": "ok"}, event="ping", secret="s3cret") == 200
+    finally:
+        listener.stop()
+
+    assert pushed == ["Moderation"]
+
+
+class FakeGitHub:
+    def __init__(self):
+        self.heads = {"Moderation": "a" * 40, "Nick": "b" * 40}
+
+    def head_commit(self, name):
+        return self.heads[name]
+
+
+def test_poll_reports_only_repositories_with_a_new_commit() -> None:
+    app = SimpleNamespace(config=Config(target_plugins=["Moderation", "Nick"]), github=FakeGitHub())
+    daemon = Daemon(app)
+
+    assert daemon.poll() == []
+    app.github.heads["Nick"] = "c" * 40
+    assert daemon.poll() == ["Nick"]
+    assert daemon.poll() == []
+
+
+def test_pushes_outside_target_plugins_are_ignored() -> None:
+    app = SimpleNamespace(config=Config(target_plugins=["Moderation"]), github=FakeGitHub())
+    daemon = Daemon(app)
+    daemon.debounce = 0
+
+    daemon.notify("Other")
+    daemon.notify("moderation")
+    assert daemon._wait_for_pushes(0) == {"Moderation"}
@@ -0,0 +1,181 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from core import transfer
+from core.deploy import DeployOptions, deploy, execute_deploy, plan_deploy, wait_for_cleanups
+from utils.exceptions import TransferError
+
+
+def _write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.mark.parametrize("strategy", ["delta", "full"])
+def test_staged_deploy_swaps_directory(tmp_path, local_sftp, strategy) -> None:
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, "src/Main.php", "<?php new")
+    _write(local_sftp.root, "plugins/Test/plugin.yml", "name: Test")
+    _write(local_sftp.root, "plugins/Test/src/Old.php", "<?php")
+
+    stats = deploy(local_sftp, local, "plugins/Test", DeployOptions(strategy=strategy, mode="staged"))
+
+    assert stats is not None
+    assert sorted(os.listdir(os.path.join(local_sftp.root, "plugins"))) == ["Test"]
+    assert os.listdir(os.path.join(local_sftp.root, "plugins", "Test", "src")) == ["Main.php"]
+
+
+def test_failed_verification_keeps_live_copy(tmp_path, local_sftp, monkeypatch) -> None:
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test v2")
+    _write(local_sftp.root, "plugins/Test/plugin.yml", "name: Test")
+    monkeypatch.setattr("core.deploy.upload_tree", MagicMock())
+
+    with pytest.raises(TransferError):
+        deploy(local_sftp, local, "plugins/Test", DeployOptions(strategy="full", mode="staged"))
+
+    assert sorted(os.listdir(os.path.join(local_sftp.root, "plugins"))) == ["Test"]
+    with open(os.path.join(local_sftp.root, "plugins/Test/plugin.yml")) as f:
+        assert f.read() == "name: Test"
+
+
+@pytest.mark.parametrize("mode", ["staged", "in_place"])
+def test_deploy_resumes_after_a_connection_drop(tmp_path, mode, monkeypatch) -> None:
+    from bench.sftp_server import LocalSFTPServer
+    from connection.sftp_client import SFTPManager
+
+    local = tmp_path / "local"
+    (local / "src").mkdir(parents=True)
+    for i in range(6):
+        (local / "src" / f"Class{i}.php").write_text(f"<?php // {i}")
+    (tmp_path / "remote" / "plugins").mkdir(parents=True)
+
+    uploads = []
+    real_upload = transfer.upload_file
+
+    def flaky_upload(sftp, local_path, remote_path, *args, **kwargs):
+        uploads.append(os.path.basename(local_path))
+        if len(uploads) == 4:
+            # coupure franche au milieu du déploiement
+            manager._client.get_transport().close()
+        return real_upload(sftp, local_path, remote_path, *args, **kwargs)
+
+    monkeypatch.setattr(transfer, "upload_file", flaky_upload)
+
+    with LocalSFTPServer(str(tmp_path / "remote"), allow_exec=False) as server:
+        credentials = {"hostname": server.host, "port": server.port, "username": "bench", "password": "bench"}
+        manager = SFTPManager(credentials=credentials, allow_exec=False)
+        try:
+            with manager.lease() as sftp:
+                options = DeployOptions(strategy="full", mode=mode, retry_delay=0)
+                stats   = execute_deploy(sftp, plan_deploy(sftp, str(local), "/plugins/Test", options, manager), manager)
+        finally:
+            manager.close()
+
+    deployed = tmp_path / "remote" / "plugins" / "Test" / "src"
+    assert sorted(os.listdir(deployed)) == [f"Class{i}.php" for i in range(6)]
+    assert (deployed / "Class3.php").read_text() == "<?php // 3"
+    # seul le fichier en cours au moment de la coupure est renvoyé
+    assert len(uploads) == 7
+    assert stats.files == 6
+
+
+def test_staging_and_backup_are_never_listed_as_plugins(tmp_path, local_sftp, monkeypatch) -> None:
+    from core import deploy as deploy_module
+    from core.remote_index import RemoteTreeIndex
+
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test")
+    _write(local_sftp.root, "plugins/Test/plugin.yml", "name: Test")
+    _write(local_sftp.root, "plugins/Other/plugin.yml", "name: Other")
+
+    listings = []
+
+    def listing(moment):
+        # les deux chemins de listing: listdir_attr de plugins_dir et l'index distant
+        index = RemoteTreeIndex(local_sftp, "plugins", use_exec=False).build()
+        listings.append((moment, sorted(e.filename for e in local_sftp.listdir_attr("plugins")), index.plugin_names()))
+
+    verify_tree, remove_tree = deploy_module.verify_tree, deploy_module.remove_tree
+
+    def verifying(sftp, expected, staging):
+        listing("staging")
+        return verify_tree(sftp, expected, staging)
+
+    def removing(sftp, path, *args):
+        if path.endswith(".autosync-old"):
+            listing("backup")
+        return remove_tree(sftp, path, *args)
+
+    monkeypatch.setattr(deploy_module, "verify_tree", verifying)
+    monkeypatch.setattr(deploy_module, "remove_tree", removing)
+    deploy(local_sftp, local, "plugins/Test", DeployOptions(strategy="full", mode="staged"))
+
+    assert listings == [(moment, ["Other", "Test"], ["Other", "Test"]) for moment in ("staging", "backup")]
+    assert sorted(os.listdir(os.path.join(local_sftp.root, ".autosync"))) == []
+
+
+@pytest.mark.parametrize("trust_manifest", [True, False])
+def test_files_added_by_hand_in_a_subdirectory_are_removed(tmp_path, local_sftp, trust_manifest) -> None:
+    from tests.helpers import ShellManager
+
+    local   = str(tmp_path / "local")
+    manager = ShellManager(local_sftp.root)
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, "src/Main.php", "<?php v1")
+    os.makedirs(os.path.join(local_sftp.root, "plugins"))
+
+    def run(head, options):
+        plan = plan_deploy(local_sftp, local, "plugins/Test", options, manager, head=head)
+        return execute_deploy(local_sftp, plan, manager)
+
+    run("a" * 40, DeployOptions(mode="staged"))
+    # invisible pour le manifeste (ni à la racine, ni dans ses fichiers), copié par cp -a dans le staging
+    _write(local_sftp.root, "plugins/Test/src/Stray.php", "<?php ajouté à la main")
+    _write(local_sftp.root, "plugins/Test/src/extra/Note.txt", "notes")
+    _write(local, "src/Main.php", "<?php v22")
+
+    for head in ("b" * 40, "c" * 40):
+        # un second passage ne doit pas échouer à son tour
+        run(head, DeployOptions(mode="staged", trust_manifest=trust_manifest))
+        _write(local, "src/Main.php", "<?php v333")
+
+    deployed = os.path.join(local_sftp.root, "plugins", "Test")
+    assert sorted(os.listdir(os.path.join(deployed, "src"))) == ["Main.php"]
+    with open(os.path.join(deployed, "src", "Main.php")) as f:
+        assert f.read() == "<?php v333"
+    assert any(command.startswith("cp -a") for command in manager.commands)
+
+
+@pytest.mark.parametrize("can_exec", [True, False])
+def test_staged_delta_sends_only_changes_with_or_without_exec(tmp_path, local_sftp, monkeypatch, can_exec) -> None:
+    from tests.helpers import ShellManager
+
+    local   = str(tmp_path / "local")
+    manager = ShellManager(local_sftp.root, allowed=can_exec)
+    for i in range(5):
+        # déjà en ligne: même taille et même mtime
+        _write(local, f"src/Class{i}.php", f"<?php // {i}")
+        _write(local_sftp.root, f"plugins/Test/src/Class{i}.php", f"<?php // {i}")
+        os.utime(os.path.join(local_sftp.root, "plugins/Test/src", f"Class{i}.php"), (1_000_000, 1_000_000))
+        os.utime(os.path.join(local, "src", f"Class{i}.php"), (1_000_000, 1_000_000))
+    _write(local, "src/Class2.php", "<?php // modifié")
+
+    uploads     = []
+    real_upload = transfer.upload_file
+    monkeypatch.setattr(transfer, "upload_file", lambda sftp, local_path, *args, **kwargs:
+                        uploads.append(os.path.basename(local_path)) or real_upload(sftp, local_path, *args, **kwargs))
+
+    stats = deploy(local_sftp, local, "plugins/Test", DeployOptions(mode="staged"), manager)
+    wait_for_cleanups()
+
+    assert uploads == ["Class2.php"] and stats.files == 1
+    with open(os.path.join(local_sftp.root, "plugins/Test/src/Class2.php")) as f:
+        assert f.read() == "<?php // modifié"
+    # SFTP seul: appliqué en place, aucun staging rempli
+    assert [command.split()[0] for command in manager.commands] == (["cp", "mv", "rm"] if can_exec else [])
@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import pytest
+from git import Repo
+from git.exc import GitCommandError
+
+from core.git_cache import GitSource
+
+
+def _commit(repo, rel_path, content, message):
+    path = os.path.join(repo.working_dir, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    repo.index.add([rel_path])
+    return repo.index.commit(message).hexsha
+
+
+def _remote(tmp_path):
+    work = Repo.init(tmp_path / "work")
+    sha = _commit(work, "plugin.yml", "name: Nick", "init")
+    Repo.init(tmp_path / "remotes" / "acme" / "Nick.git", bare=True)
+    work.create_remote("origin", str(tmp_path / "remotes" / "acme" / "Nick.git"))
+    work.git.push("origin", "HEAD:refs/heads/main")
+    Repo(tmp_path / "remotes" / "acme" / "Nick.git").git.symbolic_ref("HEAD", "refs/heads/main")
+    return work, sha
+
+
+def test_mirror_fetches_and_reuses_worktree(tmp_path) -> None:
+    work, first_sha = _remote(tmp_path)
+    source = GitSource("acme", None, cache_dir=str(tmp_path / "cache"), base_url=(tmp_path / "remotes").as_uri())
+
+    assert source.remote_head("Nick") == first_sha
+    with source.checkout("Nick") as (path, sha):
+        assert sha == first_sha
+        yml_mtime = os.stat(os.path.join(path, "plugin.yml")).st_mtime_ns
+
+    second_sha = _commit(work, "src/Main.php", "<?php", "add src")
+    work.git.push("origin", "HEAD:refs/heads/main")
+
+    with source.checkout("Nick") as (path, sha):
+        assert sha == second_sha
+        assert os.path.exists(os.path.join(path, "src", "Main.php"))
+        assert os.stat(os.path.join(path, "plugin.yml")).st_mtime_ns == yml_mtime
+
+
+def test_mirror_is_kept_on_fetch_failure_and_reset_when_corrupt(tmp_path) -> None:
+    _, sha   = _remote(tmp_path)
+    remote   = tmp_path / "remotes" / "acme" / "Nick.git"
+    source   = GitSource("acme", None, cache_dir=str(tmp_path / "cache"), base_url=(tmp_path / "remotes").as_uri())
+    mirror   = tmp_path / "cache" / "mirrors" / "Nick.git"
+    worktree = tmp_path / "cache" / "worktrees" / "Nick"
+    with source.checkout("Nick"):
+        pass
+
+    # remote injoignable: l'erreur remonte, le cache reste en place
+    remote.rename(tmp_path / "offline.git")
+    with pytest.raises(GitCommandError):
+        with source.checkout("Nick"):
+            pass
+    assert (mirror / "HEAD").exists() and (worktree / "plugin.yml").exists()
+    (tmp_path / "offline.git").rename(remote)
+
+    # objets du miroir perdus: nouveau clone
+    shutil.rmtree(mirror / "objects")
+    (mirror / "objects").mkdir()
+    with source.checkout("Nick") as (path, head):
+        assert head == sha
+        assert os.path.exists(os.path.join(path, "plugin.yml"))
+
+
+def test_temporary_shallow_clone(tmp_path) -> None:
+    _, sha = _remote(tmp_path)
+    source = GitSource("acme", None, mirror=False, shallow=True, base_url=(tmp_path / "remotes").as_uri())
+
+    with source.checkout("Nick") as (path, head):
+        assert head == sha
+        assert os.path.exists(os.path.join(path, "plugin.yml"))
+    assert not os.path.exists(path)
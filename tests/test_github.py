@@ -0,0 +1,109 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.github import GitHubClient
+from core.state import StateStore
+from utils.exceptions import GitHubError
+
+
+def _response(repos, next_url=None, status_code=200):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = repos
+    resp.links = {"next": {"url": next_url}} if next_url else {}
+    return resp
+
+
+def test_repositories_are_listed_once_and_paginated() -> None:
+    client = GitHubClient("fenomeno", "token", timeout=5)
+    client.session = MagicMock()
+    client.session.get.side_effect = [
+        _response([{"name": "Nick", "owner": {"login": "Fenomeno"}}], next_url="https://api/page2"),
+        _response([
+            {"name": "Moderation", "owner": {"login": "fenomeno"}},
+            {"name": "Other", "owner": {"login": "someone"}},
+        ]),
+        _response({}, status_code=404),
+    ]
+
+    assert client.has_repository("nick")
+    assert client.has_repository("Moderation")
+    assert not client.has_repository("Other")
+    # deux pages, puis la vérification directe de fenomeno/Other
+    assert client.session.get.call_count == 3
+    assert all(call.kwargs["timeout"] == 5 for call in client.session.get.call_args_list)
+
+
+def test_repositories_missing_from_the_listing_are_looked_up() -> None:
+    # repository public du compte ou simple collaborateur: absent de /user/repos
+    client = GitHubClient("fenomeno", "token")
+    client.session = MagicMock()
+    client.session.get.side_effect = [
+        _response([{"name": "Nick", "owner": {"login": "fenomeno"}}]),
+        _response({}, status_code=200),
+        _response({}, status_code=404),
+    ]
+
+    assert client.has_repository("Nick")
+    assert client.has_repository("Shared")
+    assert not client.has_repository("Elsewhere")
+    assert not client.has_repository("elsewhere")
+    assert [call.args[0].rsplit("/", 2)[-2:] for call in client.session.get.call_args_list[1:]] == [
+        ["fenomeno", "Shared"], ["fenomeno", "Elsewhere"]]
+
+
+def test_concurrent_misses_send_a_single_lookup() -> None:
+    client  = GitHubClient("fenomeno", "token")
+    started = threading.Event()
+    release = threading.Event()
+
+    def get(url, **kwargs):
+        if url.endswith("/user/repos"):
+            return _response([])
+        started.set()
+        release.wait(5)
+        return _response({}, status_code=200)
+
+    client.session = MagicMock()
+    client.session.get.side_effect = get
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(client.has_repository, "Shared")
+        assert started.wait(5)
+        others = [executor.submit(client.has_repository, name) for name in ("Shared", "shared", "SHARED")]
+        release.set()
+        assert first.result() and all(other.result() for other in others)
+
+    # le listing, puis une seule vérification de fenomeno/Shared
+    assert client.session.get.call_count == 2
+
+
+def test_listing_failure_is_not_retried_per_plugin() -> None:
+    client = GitHubClient("fenomeno", "token")
+    client.session = MagicMock()
+    client.session.get.return_value = _response([], status_code=401)
+
+    with pytest.raises(GitHubError):
+        client.has_repository("Nick")
+    assert not client.has_repository("Nick")
+    assert client.session.get.call_count == 1
+
+
+def test_head_commit_uses_conditional_requests(tmp_path) -> None:
+    state  = StateStore(str(tmp_path / "state.db"))
+    client = GitHubClient("fenomeno", "token", state=state)
+    client.session = MagicMock()
+
+    first = _response([])
+    first.text, first.headers = "a" * 40 + "\n", {"ETag": '"v1"'}
+    client.session.get.side_effect = [first, _response([], status_code=304)]
+
+    assert client.head_commit("Nick") == "a" * 40
+    assert client.head_commit("Nick") == "a" * 40
+    second_call = client.session.get.call_args_list[1]
+    assert second_call.kwargs["headers"]["If-None-Match"] == '"v1"'
+    assert second_call.kwargs["headers"]["Accept"] == "application/vnd.github.sha"
+    state.close()
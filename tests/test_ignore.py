@@ -0,0 +1,109 @@
+import os
+
+import pytest
+from git import Repo
+
+from bench.github_stub import GitHubStub
+from core.deploy import DeployOptions, deploy
+from core.github import GitHubClient
+from core.plugin import Plugin
+from core.tarball import TarballSource
+from core.transfer import IgnoredFiles, scan_local_tree
+from utils.ignore import IgnoreRules
+
+
+def _write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _plugin_repo(root):
+    # dépôt git: la taille des dossiers élagués est lue dans l'index sans les parcourir
+    repo = Repo.init(root)
+    _write(root, "plugin.yml", "name: Test")
+    _write(root, "src/Main.php", "<?php")
+    _write(root, "README.md", "# Test")
+    _write(root, "CHANGELOG.md", "1.0")
+    _write(root, "tests/MainTest.php", "<?php test" * 10)
+    _write(root, "tests/fixtures/data.json", "{}")
+    _write(root, "docs/index.md", "doc")
+    _write(root, ".syncignore", "# pas sur le serveur\ntests/\n*.md\n!README.md\n")
+    repo.git.add(A=True)
+    repo.index.commit("init")
+    return repo
+
+
+def test_gitignore_semantics() -> None:
+    rules = IgnoreRules(["/build", "*.log", "!keep.log", "cache/", "src/**/*.tmp", "\\#notes"])
+
+    assert rules.matches("build", is_dir=True) and not rules.matches("lib/build", is_dir=True)
+    assert rules.matches("a/b/debug.log") and not rules.matches("a/keep.log")
+    assert rules.matches("lib/cache", is_dir=True) and not rules.matches("lib/cache")
+    assert rules.matches("src/tmp.tmp") and rules.matches("src/a/b/x.tmp") and not rules.matches("lib/x.tmp")
+    assert rules.matches("#notes")
+    # toujours exclus, même sans règle
+    assert rules.matches("repo/.git", is_dir=True) and rules.matches(".syncignore")
+    # membre d'archive: exclu par un dossier parent
+    assert rules.excludes("lib/cache/entry.bin") and not rules.excludes("lib/entry.bin")
+
+    with pytest.raises(ValueError):
+        IgnoreRules([42])
+
+
+def test_pruned_directories_are_never_walked(tmp_path, monkeypatch) -> None:
+    local = str(tmp_path / "local")
+    _plugin_repo(local)
+
+    walked = []
+    listdir, scandir = os.listdir, os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path=".": walked.append(str(path)) or scandir(path))
+    monkeypatch.setattr(os, "listdir", lambda path=".": walked.append(str(path)) or listdir(path))
+
+    ignored = IgnoredFiles()
+    files, dirs = scan_local_tree(local, IgnoreRules.for_tree(local, ["/docs/"]), ignored)
+
+    assert sorted(files) == ["README.md", "plugin.yml", "src/Main.php"]
+    assert dirs == {"src"}
+    assert sorted(ignored.dirs) == [".git", "docs", "tests"]
+    assert (ignored.files, ignored.bytes) == (2, 3 + 44)  # CHANGELOG.md, .syncignore
+    assert not [path for path in walked if os.sep + "tests" in path or ".git" in path]
+
+
+def test_deploy_removes_ignored_files_and_reports_savings(tmp_path, local_sftp) -> None:
+    local = str(tmp_path / "local")
+    _plugin_repo(local)
+    _write(local_sftp.root, "plugins/Test/plugin.yml", "name: Test")
+    _write(local_sftp.root, "plugins/Test/tests/MainTest.php", "<?php ancien")
+
+    stats = deploy(local_sftp, local, "plugins/Test", DeployOptions(mode="staged", excludes=["/docs/"]))
+
+    deployed = os.path.join(local_sftp.root, "plugins", "Test")
+    assert sorted(os.path.relpath(os.path.join(current, name), deployed) for current, _, names in os.walk(deployed)
+                  for name in names) == ["README.md", "plugin.yml", os.path.join("src", "Main.php")]
+    # CHANGELOG.md et .syncignore, puis docs/ et tests/ mesurés dans git
+    assert stats.ignored_files == 5
+    assert stats.ignored_bytes == 3 + 44 + 3 + 100 + 2
+    assert "5 fichiers ignorés" in stats.summary()
+
+
+def test_tarball_members_follow_the_repository_syncignore(tmp_path, local_sftp) -> None:
+    repo = tmp_path / "repo"
+    _write(str(repo), "plugin.yml", "name: Nick")
+    _write(str(repo), "src/Main.php", "<?php")
+    _write(str(repo), "tests/MainTest.php", "<?php test")
+    _write(str(repo), "phpstan.neon", "level: 5")
+    _write(str(repo), ".syncignore", "tests/\n")
+    os.makedirs(os.path.join(local_sftp.root, "plugins", "Nick"))
+
+    with GitHubStub("me", [], sources={"Nick": str(repo)}) as stub:
+        source = TarballSource(GitHubClient("me", None, api_url=stub.url))
+        plugin = Plugin("Nick", "plugins/Nick")
+        plugin.update(local_sftp, DeployOptions(mode="in_place", excludes=["phpstan*.neon"]), source=source)
+
+        assert stub.requests["contents"] == 1
+
+    deployed = os.path.join(local_sftp.root, "plugins", "Nick")
+    assert sorted(os.listdir(deployed)) == [".autosync-manifest.json", "plugin.yml", "src"]
+    assert (plugin.transfer_stats.ignored_files, plugin.transfer_stats.ignored_bytes) == (3, 10 + 8 + 7)
@@ -0,0 +1,36 @@
+import io
+import json
+
+from utils.logger import JsonSink, Logger, TextSink
+from utils.metrics import metrics
+
+
+def test_filtered_messages_are_never_formatted() -> None:
+    stream = io.StringIO()
+    logger = Logger("info", [TextSink(stream)])
+    calls  = []
+
+    logger.log("debug", lambda: calls.append("debug") or "hidden")
+    logger.log("info", lambda: calls.append("info") or "shown")
+    logger.log("warn", "%s: %d plugins", "lobby", 3)
+    logger.flush()
+
+    assert calls == ["info"]
+    lines = stream.getvalue().splitlines()
+    assert [line.split(" ", 1)[1] for line in lines] == ["[INFO] shown", "[WARN] lobby: 3 plugins"]
+
+
+def test_json_sink_writes_one_record_per_line(tmp_path) -> None:
+    path   = tmp_path / "logs" / "autosync.jsonl"
+    logger = Logger("debug", [JsonSink(str(path))])
+
+    with metrics.plugin("Nick"):
+        logger.log("error", "échec de l'upload")
+    logger.separator()
+    logger.log("debug", "100% terminé")
+    logger.close()
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["level"], r["msg"]) for r in records] == [("error", "échec de l'upload"), ("debug", "100% terminé")]
+    assert records[0]["plugin"] == "Nick"
+    assert "plugin" not in records[1]
@@ -0,0 +1,94 @@
+import os
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from bench.github_stub import GitHubStub
+from core.hosts import HostSync
+from main import AutoSync
+from tests.helpers import ShellManager
+
+
+class LocalManager(ShellManager):
+    # SFTPManager réduit au faux serveur local: connexion et canaux renvoient le même LocalSFTP
+    host      = "local"
+    pool_size = 2
+
+    def __init__(self, sftp):
+        super().__init__(sftp.root)
+        self.sftp = sftp
+
+    def connect(self):
+        return None, self.sftp
+
+    @contextmanager
+    def lease(self, blocking=True):
+        yield self.sftp
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("remote_index", [True, False])
+def test_scan_analyzes_every_plugin_end_to_end(tmp_path, local_sftp, monkeypatch, remote_index) -> None:
+    for name, author in (("Nick", "fenomeno"), ("Other", "someone")):
+        os.makedirs(os.path.join(local_sftp.root, "plugins", name, "src"))
+        with open(os.path.join(local_sftp.root, "plugins", name, "plugin.yml"), "w") as f:
+            f.write(f"name: {name}\nauthor: {author}\n")
+
+    with GitHubStub("me", ["Nick"]) as stub:
+        config = tmp_path / "config.yml"
+        config.write_text(f'plugins_dir: "plugins"\nstate_db: ""\nlog_format: text\nremote_index: {str(remote_index).lower()}\n'
+                          f'github_api_url: "{stub.url}"\nauthors: [fenomeno]\nmodes: [valid, owned, github, update]\n')
+        for var, value in (("SFTP_HOST", "local"), ("SFTP_PORT", "22"), ("SFTP_USER", "bench"), ("SFTP_PASS", "bench"),
+                           ("GITHUB", "me"), ("GITHUB_TOKEN", "token")):
+            monkeypatch.setenv(var, value)
+        # seul le transport est remplacé: configuration, listing, analyse et résumé sont ceux d'une vraie exécution
+        monkeypatch.setattr(AutoSync, "_build_hosts", lambda app: [HostSync("", app.config.plugins_dir,
+                                                                            LocalManager(local_sftp))])
+
+        app = AutoSync(config_path=str(config), command="scan")
+        assert app.run() == 0
+
+    plugins = {plugin.name: plugin for plugin in app.hosts[0].plugins}
+    assert sorted(plugins) == ["Nick", "Other"]
+    assert plugins["Nick"].is_valid and plugins["Nick"].is_owned and plugins["Nick"].is_github
+    assert plugins["Other"].is_valid and not plugins["Other"].is_owned and not plugins["Other"].is_github
+    # scan: le mode update de config.yml est retiré
+    assert not app.config.mode_flags["update"] and not any(plugin.updated for plugin in plugins.values())
+
+
+def test_worker_messages_are_printed_with_their_plugin_block(tmp_path, local_sftp, monkeypatch, capsys) -> None:
+    from core import plugin_manager
+    from core.plugin import Plugin
+    from utils.logger import info, logger, warn
+
+    names = ["Alpha", "Beta", "Gamma"]
+    for name in names:
+        os.makedirs(os.path.join(local_sftp.root, "plugins", name))
+
+    def analyze(sftp, name, plugins_dir, *args, **kwargs):
+        # le premier plugin termine en dernier: sans tampon, les messages des autres passeraient avant son bloc
+        time.sleep(0.3 if name == "Alpha" else 0)
+        warn(f"{name}: message du worker")
+        plugin = Plugin(name, f"{plugins_dir}/{name}")
+        plugin.explain = lambda: info(f"{name}: résultat")
+        return plugin
+
+    config = tmp_path / "config.yml"
+    config.write_text('plugins_dir: "plugins"\nstate_db: ""\nlog_format: text\nremote_index: false\n'
+                      'analysis_workers: 3\nmodes: [valid]\n')
+    for var, value in (("SFTP_HOST", "local"), ("SFTP_PORT", "22"), ("SFTP_USER", "bench"), ("SFTP_PASS", "bench"),
+                       ("GITHUB", "me"), ("GITHUB_TOKEN", "token")):
+        monkeypatch.setenv(var, value)
+    monkeypatch.setattr(plugin_manager, "analyze_plugin", analyze)
+    monkeypatch.setattr(AutoSync, "_build_hosts", lambda app: [HostSync("", app.config.plugins_dir,
+                                                                        LocalManager(local_sftp))])
+
+    assert AutoSync(config_path=str(config), command="scan").run() == 0
+    logger.flush()
+
+    lines = [line.split("] ", 1)[1] for line in capsys.readouterr().out.splitlines() if ": message du worker" in line
+             or ": résultat" in line]
+    assert lines == [f"{name}: {msg}" for name in names for msg in ("message du worker", "résultat")]
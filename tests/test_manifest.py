@@ -0,0 +1,72 @@
+import os
+
+from core.deploy import DeployOptions, execute_deploy, plan_deploy
+from core.manifest import find_drift, read_manifest
+
+
+def _write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _deploy(local_sftp, local, head, options=None):
+    os.makedirs(os.path.join(local_sftp.root, "plugins"), exist_ok=True)
+    plan = plan_deploy(local_sftp, local, "plugins/Test", options or DeployOptions(), head=head)
+    return plan, execute_deploy(local_sftp, plan)
+
+
+def test_deploy_writes_manifest_matching_the_remote_tree(tmp_path, local_sftp) -> None:
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, "src/Main.php", "<?php")
+
+    _deploy(local_sftp, local, "a" * 40)
+
+    manifest = read_manifest(local_sftp, "plugins/Test")
+    assert manifest.sha == "a" * 40
+    assert sorted(manifest.files) == ["plugin.yml", "src/Main.php"]
+    assert manifest.dirs == ["src"]
+    remote = os.stat(os.path.join(local_sftp.root, "plugins/Test/src/Main.php"))
+    assert manifest.files["src/Main.php"].mtime == int(remote.st_mtime)
+    assert find_drift(local_sftp, "plugins/Test", manifest) == []
+
+
+def test_next_delta_is_computed_from_the_manifest(tmp_path, local_sftp, monkeypatch) -> None:
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, "src/Main.php", "<?php")
+    _deploy(local_sftp, local, "a" * 40)
+
+    _write(local, "src/Main.php", "<?php echo 2;")
+    _write(local, "src/New.php", "<?php")
+    monkeypatch.setattr("core.deploy.compute_delta", None)
+
+    plan, stats = _deploy(local_sftp, local, "b" * 40, DeployOptions(mode="in_place"))
+
+    assert plan.delta.added == ["src/New.php"]
+    assert plan.delta.changed == ["src/Main.php"]
+    assert stats.files == 2
+    assert read_manifest(local_sftp, "plugins/Test").sha == "b" * 40
+
+
+def test_manual_edit_is_detected_and_bypasses_the_manifest(tmp_path, local_sftp) -> None:
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, "src/Main.php", "<?php")
+    _deploy(local_sftp, local, "a" * 40)
+
+    _write(local_sftp.root, "plugins/Test/src/Main.php", "<?php hacked();")
+    _write(local_sftp.root, "plugins/Test/debug.log", "x")
+
+    manifest = read_manifest(local_sftp, "plugins/Test")
+    listing  = local_sftp.listdir("plugins/Test")
+    assert find_drift(local_sftp, "plugins/Test", manifest, listing=listing) == ["debug.log", "src/Main.php"]
+
+    plan, _ = _deploy(local_sftp, local, "a" * 40)
+
+    assert plan.delta.changed == ["src/Main.php"]
+    assert plan.delta.removed == ["debug.log"]
+    with open(os.path.join(local_sftp.root, "plugins/Test/src/Main.php")) as f:
+        assert f.read() == "<?php"
@@ -0,0 +1,85 @@
+import json
+
+from core.transfer import upload_tree
+from utils.metrics import Metrics, format_prometheus
+
+
+def test_disabled_metrics_do_not_wrap_anything(local_sftp) -> None:
+    metrics = Metrics()
+
+    assert metrics.instrument_sftp(local_sftp) is local_sftp
+    with metrics.timed("sftp.stat"):
+        pass
+    metrics.add_bytes("sftp.file.write", 10)
+
+    assert metrics.report()["operations"] == {}
+
+
+def test_operations_are_counted_per_type_and_per_plugin(tmp_path, local_sftp) -> None:
+    metrics = Metrics(enabled=True)
+    source  = tmp_path / "source"
+    (source / "src").mkdir(parents=True)
+    (source / "plugin.yml").write_text("name: Demo\n")
+    (source / "src" / "Main.php").write_bytes(b"x" * 100)
+    (tmp_path / "remote" / "plugins").mkdir(parents=True, exist_ok=True)
+
+    sftp = metrics.instrument_sftp(local_sftp)
+    with metrics.plugin("Demo"):
+        upload_tree(sftp, str(source), "/plugins/Demo")
+    sftp.listdir("/plugins")
+
+    report = metrics.report()
+    assert report["operations"]["sftp.open"]["calls"] == 2
+    assert report["operations"]["sftp.file.write"]["bytes"] == 111
+    assert report["operations"]["sftp.listdir"]["calls"] == 1
+    assert report["plugins"]["Demo"]["bytes"] == 111
+    assert report["plugins"]["Demo"]["calls"]["sftp.mkdir"] == 2
+    assert "sftp.listdir" not in report["plugins"]["Demo"]["calls"]
+    assert report["operations"]["sftp.open"]["buckets"]["+Inf"] == 2
+
+
+def test_reports_are_written_as_json_and_prometheus_textfile(tmp_path) -> None:
+    metrics = Metrics(enabled=True)
+    with metrics.plugin('Odd"Name'):
+        metrics.record("github.get", 0.02, size=512)
+    metrics.record("github.get", 2.0, error=True)
+    metrics.set_gauge("run_success", 1)
+
+    metrics.write_json(str(tmp_path / "metrics.json"))
+    metrics.write_prometheus(str(tmp_path / "autosync.prom"))
+
+    report = json.loads((tmp_path / "metrics.json").read_text())
+    assert report["operations"]["github.get"]["calls"] == 2
+    assert report["operations"]["github.get"]["errors"] == 1
+
+    text = (tmp_path / "autosync.prom").read_text()
+    assert text == format_prometheus(report)
+    assert 'autosync_operation_calls_total{op="github.get"} 2' in text
+    assert 'autosync_operation_duration_seconds_bucket{op="github.get",le="0.025"} 1' in text
+    assert 'autosync_operation_duration_seconds_bucket{op="github.get",le="+Inf"} 2' in text
+    assert 'autosync_plugin_bytes_total{plugin="Odd\\"Name"} 512' in text
+    assert "autosync_run_success 1" in text
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["autosync.prom", "metrics.json"]
+
+
+def test_nested_timers_are_not_counted_twice_per_plugin(monkeypatch) -> None:
+    from utils import metrics as metrics_module
+
+    clock = iter([0.0, 1.0, 1.5, 3.5, 4.0, 4.5, 5.0, 5.0])
+    monkeypatch.setattr(metrics_module.time, "perf_counter", lambda: next(clock))
+    metrics = Metrics(enabled=True)
+
+    with metrics.plugin("Demo"), metrics.timed("pipeline.deploy"):  # 0 -> 5
+        with metrics.timed("sftp.stat"):  # 1 -> 4
+            with metrics.timed("sftp.file.close"):  # 1.5 -> 3.5
+                pass
+            metrics.record("bandwidth.wait", 0.5)
+        with metrics.timed("ssh.exec"):  # 4.5 -> 5
+            pass
+
+    report = metrics.report()["plugins"]["Demo"]
+    # seules les opérations les plus externes: sftp.stat (3s) et ssh.exec (0.5s), l'étape est une série à part
+    assert report["seconds"] == 3.5
+    assert report["stages"] == {"deploy": 5.0}
+    assert report["calls"]["sftp.file.close"] == 1 and report["calls"]["bandwidth.wait"] == 1
+    assert 'autosync_plugin_stage_seconds_total{plugin="Demo",stage="deploy"} 5.0' in format_prometheus(metrics.report())
@@ -0,0 +1,145 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from core.deploy import DeployOptions
+from core.hosts import HostSync
+from core.pipeline import DeployTarget, UpdateBatcher, UpdatePipeline
+from core.plugin import Plugin
+from tests.helpers import LocalSFTP
+
+
+class FakeSource:
+    streaming = False
+
+    def __init__(self, root, gate=None):
+        self.root = root
+        self.gate = gate
+        self.released = []
+
+    def remote_head(self, name):
+        return "f" * 40
+
+    @contextmanager
+    def checkout(self, name):
+        if self.gate is not None:
+            self.gate.wait()
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.join(path, "src"), exist_ok=True)
+        with open(os.path.join(path, "plugin.yml"), "w") as f:
+            f.write(f"name: {name}")
+        try:
+            yield path, "a" * 40
+        finally:
+            self.released.append(name)
+
+
+class PoolManager:
+    def __init__(self, sftp, down=False):
+        self.sftp = sftp
+        self.down = down
+        self.throttled = False
+
+    @contextmanager
+    def lease(self, blocking=True):
+        if self.down:
+            raise ConnectionError("serveur injoignable")
+        yield self.sftp
+
+    def can_exec(self):
+        return False
+
+
+def test_pipeline_deploys_every_plugin(tmp_path, local_sftp) -> None:
+    os.makedirs(os.path.join(local_sftp.root, "plugins"))
+    source = FakeSource(str(tmp_path / "clones"))
+    deployed = []
+    pipeline = UpdatePipeline(PoolManager(local_sftp), source, DeployOptions(mode="in_place"),
+                              fetch_workers=2, prepare_workers=2, deploy_workers=1, queue_size=1,
+                              on_deployed=deployed.append)
+
+    plugins = [Plugin(name, f"plugins/{name}") for name in ("A", "B", "C", "D")]
+    for plugin in plugins:
+        pipeline.submit(plugin)
+    pipeline.close()
+
+    assert all(plugin.updated and plugin.deployed_sha == "a" * 40 for plugin in plugins)
+    assert sorted(p.name for p in deployed) == ["A", "B", "C", "D"]
+    assert sorted(source.released) == ["A", "B", "C", "D"]
+    assert sorted(os.listdir(os.path.join(local_sftp.root, "plugins"))) == ["A", "B", "C", "D"]
+
+
+def test_cancelled_pipeline_drains_without_deploying(tmp_path, local_sftp) -> None:
+    gate = threading.Event()
+    source = FakeSource(str(tmp_path / "clones"), gate)
+    pipeline = UpdatePipeline(PoolManager(local_sftp), source, DeployOptions(mode="in_place"),
+                              fetch_workers=1, queue_size=4)
+
+    plugins = [Plugin(name, f"plugins/{name}") for name in ("A", "B", "C")]
+    for plugin in plugins:
+        pipeline.submit(plugin)
+    pipeline.cancel()
+    gate.set()
+    pipeline.close()
+
+    assert not any(plugin.updated for plugin in plugins)
+    assert len(source.released) <= 1
+    assert os.listdir(local_sftp.root) == []
+
+
+def test_already_deployed_commit_is_skipped_before_fetch(tmp_path, local_sftp) -> None:
+    source = FakeSource(str(tmp_path / "clones"))
+    pipeline = UpdatePipeline(PoolManager(local_sftp), source, DeployOptions())
+
+    plugin = Plugin("A", "plugins/A")
+    pipeline.submit(plugin, last_sha="f" * 40)
+    pipeline.close()
+
+    assert not plugin.updated
+    assert source.released == []
+
+
+def _host(tmp_path, name, down=False) -> HostSync:
+    root = tmp_path / name
+    (root / "plugins").mkdir(parents=True)
+    return HostSync(name, "plugins", PoolManager(LocalSFTP(str(root)), down=down))
+
+
+def test_one_checkout_is_deployed_to_every_server(tmp_path) -> None:
+    source  = FakeSource(str(tmp_path / "clones"))
+    hosts   = [_host(tmp_path, "lobby"), _host(tmp_path, "down", down=True), _host(tmp_path, "faction")]
+    plugins = [Plugin("A", "plugins/A") for _ in hosts]
+    pipeline = UpdatePipeline(None, source, DeployOptions(mode="in_place"))
+
+    pipeline.submit_targets("A", [DeployTarget(plugin, host) for plugin, host in zip(plugins, hosts)])
+    pipeline.close()
+
+    assert source.released == ["A"]
+    assert [plugin.updated for plugin in plugins] == [True, False, True]
+    assert hosts[1].failed and not hosts[0].failed and not hosts[2].failed
+    assert os.listdir(tmp_path / "lobby" / "plugins") == ["A"]
+    assert os.listdir(tmp_path / "faction" / "plugins") == ["A"]
+
+
+def test_batcher_waits_for_every_server_listing_the_plugin(tmp_path) -> None:
+    submitted = []
+
+    class Recorder:
+        def submit_targets(self, name, targets):
+            submitted.append((name, [target.host.name for target in targets]))
+
+    lobby, faction = HostSync("lobby", "plugins", None), HostSync("faction", "plugins", None)
+    lobby.plugin_names, faction.plugin_names = ["A", "B"], ["A"]
+    batcher = UpdateBatcher(Recorder(), [lobby, faction])
+
+    def pending(name):
+        plugin = Plugin(name, f"plugins/{name}")
+        plugin.pending_update = True
+        return plugin
+
+    batcher.report(lobby, "A", pending("A"))
+    batcher.report(lobby, "B", pending("B"))
+    assert submitted == [("B", ["lobby"])]
+
+    batcher.host_done(faction)
+    assert submitted == [("B", ["lobby"]), ("A", ["lobby"])]
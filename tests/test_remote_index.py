@@ -0,0 +1,64 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.plugin_manager import analyze_plugin
+from core.remote_index import RemoteTreeIndex
+from tests.helpers import ShellManager
+
+
+def _layout(root):
+    for name, author in (("Nick", "fenomeno"), ("Other", "someone")):
+        os.makedirs(os.path.join(root, "plugins", name, "src"))
+        with open(os.path.join(root, "plugins", name, "plugin.yml"), "w") as f:
+            f.write(f"name: {name}\nauthor: {author}\n")
+    os.makedirs(os.path.join(root, "plugins", "Broken"))
+    with open(os.path.join(root, "plugins", "README.md"), "w") as f:
+        f.write("pas un plugin")
+
+
+@pytest.mark.parametrize("use_exec", [False, True])
+def test_index_answers_plugin_checks(local_sftp, use_exec) -> None:
+    _layout(local_sftp.root)
+    manager = ShellManager(local_sftp.root, allowed=use_exec)
+
+    index = RemoteTreeIndex(local_sftp, "plugins", sftp_manager=manager, use_exec=True).build()
+
+    assert index.plugin_names() == ["Broken", "Nick", "Other"]
+    assert sorted(index.listdir("Nick")) == ["plugin.yml", "src"]
+    assert index.plugin_yml("Broken") is None
+    assert any("find" in command for command in manager.commands) == use_exec
+
+    # plus aucune requête SFTP pendant l'analyse
+    local_sftp.open = local_sftp.listdir = local_sftp.listdir_attr = None
+    nick   = analyze_plugin(local_sftp, "Nick", "plugins", ["fenomeno"], [], check_github=False, index=index)
+    other  = analyze_plugin(local_sftp, "Other", "plugins", ["fenomeno"], [], check_github=False, index=index)
+    broken = analyze_plugin(local_sftp, "Broken", "plugins", ["fenomeno"], [], check_github=False, index=index)
+
+    assert nick.is_valid and nick.is_owned
+    assert other.is_valid and not other.is_owned
+    assert not broken.is_valid and not broken.is_owned
+
+
+def test_unselected_plugins_are_pruned_before_any_read(local_sftp) -> None:
+    _layout(local_sftp.root)
+
+    index = RemoteTreeIndex(local_sftp, "plugins", select=lambda name: name.startswith("N")).build()
+
+    assert index.plugin_names() == ["Nick"]
+    assert index.plugin_yml("Other") is None
+
+
+def test_github_is_not_queried_once_ownership_fails(local_sftp) -> None:
+    _layout(local_sftp.root)
+    index  = RemoteTreeIndex(local_sftp, "plugins").build()
+    github = MagicMock(failed=False)
+    github.has_repository.return_value = True
+
+    other = analyze_plugin(local_sftp, "Other", "plugins", ["fenomeno"], ["Other"], github=github, index=index, update=True)
+    nick  = analyze_plugin(local_sftp, "Nick", "plugins", ["fenomeno"], [], github=github, index=index)
+
+    github.has_repository.assert_called_once_with("Nick")
+    assert other.skipped == ["github"] and not other.pending_update
+    assert nick.is_github and nick.skipped == []
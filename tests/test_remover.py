@@ -0,0 +1,46 @@
+import os
+from unittest.mock import MagicMock
+
+from core.remover import remove_tree
+
+
+def _build(root):
+    os.makedirs(os.path.join(root, "plugin", "src", "a", "b"))
+    os.makedirs(os.path.join(root, "outside"))
+    for rel in ("plugin/plugin.yml", "plugin/src/Main.php", "plugin/src/a/b/Deep.php", "outside/keep.txt"):
+        with open(os.path.join(root, rel), "w") as f:
+            f.write("x")
+    os.symlink(os.path.join(root, "outside"), os.path.join(root, "plugin", "src", "link"))
+
+
+def test_remove_tree_over_sftp(local_sftp) -> None:
+    _build(local_sftp.root)
+
+    remove_tree(local_sftp, "plugin")
+
+    assert not os.path.exists(os.path.join(local_sftp.root, "plugin"))
+    assert os.path.exists(os.path.join(local_sftp.root, "outside", "keep.txt"))
+
+
+def test_remove_tree_prefers_remote_exec(local_sftp) -> None:
+    manager = MagicMock()
+    manager.can_exec.return_value = True
+    manager.exec_command.return_value = (0, b"", b"")
+    local_sftp.remove = MagicMock()
+
+    remove_tree(local_sftp, "plugins/My Plugin", manager)
+
+    manager.exec_command.assert_called_once_with("rm -rf -- 'plugins/My Plugin'")
+    local_sftp.remove.assert_not_called()
+
+
+def test_remove_tree_falls_back_to_sftp(local_sftp) -> None:
+    _build(local_sftp.root)
+    manager = MagicMock()
+    manager.can_exec.return_value = True
+    manager.exec_command.return_value = (-1, b"", b"administratively prohibited")
+    manager.lease.return_value.__enter__.return_value = None
+
+    remove_tree(local_sftp, "plugin", manager, workers=2)
+
+    assert not os.path.exists(os.path.join(local_sftp.root, "plugin"))
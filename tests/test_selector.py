@@ -0,0 +1,23 @@
+import pytest
+
+from utils.config_loader import Config
+from utils.exceptions import ConfigurationError
+from utils.selector import PluginSelector
+
+
+def test_selector_matches_names_globs_and_regexes() -> None:
+    selector = PluginSelector(["Moderation", "Lobby*", r"re:^Nick\d+$"])
+
+    assert selector.filter(["moderation", "LobbyCore", "Lobby", "Nick2", "Nick", "Nicknames", "Other"]) == [
+        "moderation", "LobbyCore", "Lobby", "Nick2",
+    ]
+    assert selector.names == {"moderation": "Moderation"}
+    assert not PluginSelector([])
+    assert PluginSelector(["all"]).matches("Anything")
+
+
+def test_invalid_target_pattern_is_a_configuration_error() -> None:
+    with pytest.raises(ConfigurationError):
+        Config(target_plugins=["re:(unclosed"])
+
+    assert Config(target_all_plugins=True, target_plugins=["Nick"]).target_selector().matches("Other")
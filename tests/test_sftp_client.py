@@ -1,6 +1,9 @@
 from unittest.mock import MagicMock
 
-from sftp_auto_sync.connection.sftp_client import SFTPManager
+import pytest
+
+from connection.sftp_client import SFTPManager
+from utils.exceptions import TransferError
 
 
 def test_connect_success(mock_ssh_client_class, mock_load_credentials) -> None:
@@ -20,4 +23,93 @@ def test_connect_success(mock_ssh_client_class, mock_load_credentials) -> None:
     client, sftp = manager.connect()
 
     assert client is not None
-    assert sftp is not None
\ No newline at end of file
+    assert sftp is not None
+
+
+def test_connect_reuses_live_transport_without_listing(mock_ssh_client_class, mock_load_credentials) -> None:
+    mock_load_credentials.return_value = {"hostname": "localhost", "port": 22, "username": "user", "password": "pass"}
+    mock_client_instance = MagicMock()
+    mock_sftp_instance = MagicMock()
+    mock_sftp_instance.get_channel.return_value.closed = False
+    mock_client_instance.open_sftp.return_value = mock_sftp_instance
+    mock_ssh_client_class.return_value = mock_client_instance
+
+    manager = SFTPManager()
+    manager.connect()
+    manager.connect()
+
+    assert mock_client_instance.connect.call_count == 1
+    mock_sftp_instance.listdir.assert_not_called()
+
+
+def test_lease_replaces_broken_channels(mock_ssh_client_class, mock_load_credentials) -> None:
+    mock_load_credentials.return_value = {"hostname": "localhost", "port": 22, "username": "user", "password": "pass"}
+    mock_client_instance = MagicMock()
+    mock_ssh_client_class.return_value = mock_client_instance
+
+    channels = []
+
+    def open_sftp():
+        channel = MagicMock()
+        channel.get_channel.return_value.closed = False
+        channels.append(channel)
+        return channel
+
+    mock_client_instance.open_sftp.side_effect = open_sftp
+
+    manager = SFTPManager(pool_size=2)
+    manager.connect()
+
+    with manager.lease() as first:
+        pass
+    with manager.lease() as second:
+        assert second is first
+
+    first.get_channel.return_value.closed = True
+    with manager.lease() as third:
+        assert third is not first
+    first.close.assert_called()
+
+
+def test_transport_tuning_is_negotiated_with_the_server(tmp_path) -> None:
+    from bench.sftp_server import LocalSFTPServer
+
+    with LocalSFTPServer(str(tmp_path)) as server:
+        credentials = {"hostname": server.host, "port": server.port, "username": "bench", "password": "bench"}
+        manager = SFTPManager(credentials=credentials, compression=True, window_size=4 * 1024 * 1024,
+                              max_packet_size=16384, ciphers=["chacha20-poly1305@openssh.com", "aes256-gcm@openssh.com"],
+                              macs=["hmac-sha2-512-etm@openssh.com"])
+        try:
+            client, sftp = manager.connect()
+            transport = client.get_transport()
+            channel   = sftp.get_channel()
+
+            assert transport.local_cipher == "aes256-gcm@openssh.com"
+            assert transport.local_mac == "hmac-sha2-512-etm@openssh.com"
+            assert transport.local_compression == "zlib@openssh.com"
+            assert channel.in_window_size == 4 * 1024 * 1024
+            assert channel.in_max_packet_size == 16384
+            # les algorithmes non choisis restent proposés en repli
+            assert "aes128-ctr" in transport.get_security_options().ciphers
+        finally:
+            manager.close()
+
+
+def test_exec_drains_stderr_and_keeps_exec_after_a_timeout(tmp_path) -> None:
+    from bench.sftp_server import LocalSFTPServer
+
+    with LocalSFTPServer(str(tmp_path)) as server:
+        credentials = {"hostname": server.host, "port": server.port, "username": "bench", "password": "bench"}
+        manager = SFTPManager(credentials=credentials)
+        try:
+            manager.connect()
+            # plus de stderr que la fenêtre SSH: stdout et stderr sont lus ensemble, sinon blocage
+            status, stdout, stderr = manager.exec_command("head -c 5000000 /dev/zero >&2; echo fini", timeout=10)
+            assert (status, stdout, len(stderr)) == (0, b"fini\n", 5000000)
+
+            # commande encore en cours: erreur, sans conclure que exec est indisponible
+            with pytest.raises(TransferError):
+                manager.exec_command("sleep 2", timeout=0.3)
+            assert manager.can_exec()
+        finally:
+            manager.close()
@@ -0,0 +1,109 @@
+import os
+from unittest.mock import MagicMock
+
+from core.plugin_manager import analyze_plugin
+from core.state import StateStore
+from main import main
+from utils.config_loader import load_config
+from utils.logger import logger
+
+
+def _make_plugin(root, name, author):
+    os.makedirs(os.path.join(root, "plugins", name, "src"))
+    with open(os.path.join(root, "plugins", name, "plugin.yml"), "w") as f:
+        f.write(f"name: {name}\nauthor: {author}\n")
+
+
+def _analyze(sftp, state, full=False):
+    github = MagicMock(failed=False)
+    github.has_repository.return_value = True
+    plugin = analyze_plugin(sftp, "Nick", "plugins", ["fenomeno"], [], github=github,
+                            state=state, host="host", remote_mtime=1, full=full)
+    return plugin, github
+
+
+def test_unchanged_plugin_is_answered_from_state(tmp_path, local_sftp) -> None:
+    _make_plugin(local_sftp.root, "Nick", "Fenomeno")
+    state = StateStore(str(tmp_path / "state.db"))
+    local_sftp.open = MagicMock(wraps=local_sftp.open)
+
+    first, github = _analyze(local_sftp, state)
+    assert first.is_valid and first.is_owned and first.is_github
+    assert local_sftp.open.call_count == 1
+    github.has_repository.assert_called_once()
+
+    second, github = _analyze(local_sftp, state)
+    assert second.is_valid and second.is_owned and second.is_github
+    assert local_sftp.open.call_count == 1
+    github.has_repository.assert_not_called()
+
+    _analyze(local_sftp, state, full=True)
+    assert local_sftp.open.call_count == 2
+
+
+def test_changed_plugin_yml_invalidates_state(tmp_path, local_sftp) -> None:
+    _make_plugin(local_sftp.root, "Nick", "Fenomeno")
+    state = StateStore(str(tmp_path / "state.db"))
+    _analyze(local_sftp, state)
+
+    path = os.path.join(local_sftp.root, "plugins", "Nick", "plugin.yml")
+    with open(path, "w") as f:
+        f.write("name: Nick\nauthor: quelqu_un_autre\n")
+
+    plugin, _ = _analyze(local_sftp, state)
+    assert not plugin.is_owned
+    assert state.get("host", "plugins/Nick").authors == ["quelqu_un_autre"]
+
+
+def test_status_command_reads_the_state_database(tmp_path, local_sftp, capsys) -> None:
+    _make_plugin(local_sftp.root, "Nick", "Fenomeno")
+    db    = tmp_path / "state.db"
+    state = StateStore(str(db))
+    _analyze(local_sftp, state)
+    state.set_deployed("host", "plugins/Nick", "a" * 40)
+    state.close()
+
+    config = tmp_path / "config.yml"
+    config.write_text(f"state_db: {db}\ntarget_plugins: [Nick]\nlog_format: text\n")
+
+    assert main(["status", "--config", str(config)]) == 0
+    logger.flush()
+    assert "host Nick (cible): valide, sur GitHub, commit aaaaaaa" in capsys.readouterr().out
+
+
+def test_local_paths_are_relative_to_the_config_file(tmp_path, monkeypatch) -> None:
+    # cron / systemd: le répertoire courant n'est pas celui de config.yml
+    (tmp_path / "etc").mkdir()
+    config = tmp_path / "etc" / "config.yml"
+    config.write_text('state_db: ".autosync/state.db"\nmetrics_textfile: ""\nlog_json: /var/log/autosync.jsonl\n')
+    monkeypatch.chdir("/")
+
+    loaded = load_config(str(config))
+    assert loaded.state_db == str(tmp_path / "etc" / ".autosync" / "state.db")
+    assert loaded.git_cache_dir == str(tmp_path / "etc" / ".autosync" / "git")
+    assert loaded.metrics_report == str(tmp_path / "etc" / ".autosync" / "metrics.json")
+    assert loaded.metrics_textfile == "" and loaded.log_json == "/var/log/autosync.jsonl"
+
+
+def test_invalid_plugin_is_answered_from_state(tmp_path, local_sftp, monkeypatch) -> None:
+    from core import plugin_manager
+
+    os.makedirs(os.path.join(local_sftp.root, "plugins", "Nick"))
+    with open(os.path.join(local_sftp.root, "plugins", "Nick", "plugin.yml"), "w") as f:
+        f.write("name: Nick\nauthor: fenomeno\n")
+    state  = StateStore(str(tmp_path / "state.db"))
+    checks = MagicMock(wraps=plugin_manager.is_valid)
+    monkeypatch.setattr(plugin_manager, "is_valid", checks)
+
+    # pas de src/: échec au premier contrôle, plugin.yml n'est jamais lu
+    for _ in range(2):
+        plugin, github = _analyze(local_sftp, state)
+        assert not plugin.is_valid and plugin.skipped == ["owned", "github"]
+        github.has_repository.assert_not_called()
+    assert checks.call_count == 1
+    assert state.get("host", "plugins/Nick").yml_hash is None
+
+    # le listing change: nouvelle vérification
+    os.makedirs(os.path.join(local_sftp.root, "plugins", "Nick", "src"))
+    plugin, _ = _analyze(local_sftp, state)
+    assert plugin.is_valid and plugin.is_owned and checks.call_count == 2
@@ -0,0 +1,79 @@
+import hashlib
+import os
+
+from core import sync
+from core.manifest import ManifestEntry
+from core.sync import compute_delta, apply_delta
+
+
+def _write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_delta_only_transfers_changes(tmp_path, local_sftp) -> None:
+    local = str(tmp_path / "local")
+    remote = os.path.join(local_sftp.root, "plugin")
+
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, "src/Main.php", "<?php echo 1;")
+    _write(local, "src/sub/Util.php", "<?php")
+    _write(remote, "plugin.yml", "name: Test")
+    _write(remote, "src/Main.php", "<?php echo 2;")
+    _write(remote, "old/Gone.php", "<?php")
+    # clone récent: aucun mtime local ne correspond à ceux du serveur
+    for name in ("plugin.yml", "src/Main.php"):
+        os.utime(os.path.join(remote, name), (1_000_000, 1_000_000))
+
+    delta = compute_delta(local_sftp, local, "plugin", checksum=True)
+
+    assert delta.added == ["src/sub/Util.php"]
+    assert delta.changed == ["src/Main.php"]
+    assert delta.removed == ["old/Gone.php"]
+    assert delta.dirs_to_create == ["src/sub"]
+    assert delta.dirs_to_remove == ["old"]
+    assert delta.unchanged == 1
+
+    apply_delta(local_sftp, local, "plugin", delta)
+
+    assert compute_delta(local_sftp, local, "plugin", checksum=True).is_empty
+    assert not os.path.exists(os.path.join(remote, "old"))
+    with open(os.path.join(remote, "src/sub/Util.php")) as f:
+        assert f.read() == "<?php"
+
+
+def test_delta_on_missing_remote_dir(tmp_path, local_sftp) -> None:
+    local = str(tmp_path / "local")
+    _write(local, "plugin.yml", "name: Test")
+    _write(local, ".git/HEAD", "ref")
+
+    delta = compute_delta(local_sftp, local, "plugin")
+
+    assert delta.added == ["plugin.yml"]
+    apply_delta(local_sftp, local, "plugin", delta)
+    assert os.listdir(os.path.join(local_sftp.root, "plugin")) == ["plugin.yml"]
+
+
+def test_delta_reads_remote_content_only_as_a_last_resort(tmp_path, local_sftp, monkeypatch) -> None:
+    local  = str(tmp_path / "local")
+    remote = os.path.join(local_sftp.root, "plugin")
+    for name in ("same_mtime.php", "in_manifest.php", "unknown.php"):
+        _write(local, name, "<?php")
+        _write(remote, name, "<?php")
+    for name in ("in_manifest.php", "unknown.php"):
+        os.utime(os.path.join(remote, name), (1_000_000, 1_000_000))
+
+    read = []
+    monkeypatch.setattr(sync, "hash_remote_file", lambda _, path: read.append(os.path.basename(path)) or "")
+    known = {"in_manifest.php": ManifestEntry(5, 1_000_000, hashlib.sha1(b"<?php").hexdigest())}
+
+    # même mtime: rien n'est relu; manifeste encore exact: comparé à son sha1; sinon renvoyé
+    delta = compute_delta(local_sftp, local, "plugin", known=known)
+    assert delta.changed == ["unknown.php"] and delta.unchanged == 2
+    assert read == []
+
+    # checksum: seul le fichier que rien ne décrit est relu sur le serveur
+    compute_delta(local_sftp, local, "plugin", checksum=True, known=known)
+    assert read == ["unknown.php"]
@@ -0,0 +1,113 @@
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from bench.github_stub import GitHubStub
+from core import tarball
+from core.deploy import DeployOptions, wait_for_cleanups
+from core.github import GitHubClient
+from core.plugin import Plugin
+from core.tarball import TarballSource
+from tests.helpers import ShellManager
+from utils.exceptions import TransferError
+
+
+def _repo(tmp_path, big_size=0):
+    repo = tmp_path / "repo"
+    (repo / "src" / "acme").mkdir(parents=True)
+    (repo / "plugin.yml").write_text("name: Nick\n")
+    (repo / "src" / "acme" / "Main.php").write_text("<?php echo 'hello';\n" * 200)
+    if big_size:
+        (repo / "assets").mkdir()
+        (repo / "assets" / "skin.bin").write_bytes(os.urandom(big_size))
+    return repo
+
+
+def _tree(root):
+    return {os.path.relpath(os.path.join(current, name), root): open(os.path.join(current, name), "rb").read()
+            for current, _, names in os.walk(root) for name in names}
+
+
+def test_tarball_is_streamed_into_a_staged_deploy(tmp_path) -> None:
+    from bench.sftp_server import LocalSFTPServer
+    from connection.sftp_client import SFTPManager
+
+    repo   = _repo(tmp_path, big_size=16 * 1024 * 1024)
+    remote = tmp_path / "remote"
+    (remote / "plugins" / "Nick").mkdir(parents=True)
+    (remote / "plugins" / "Nick" / "old.txt").write_text("supprimé au déploiement")
+
+    with GitHubStub("me", [], sources={"Nick": str(repo)}) as stub, LocalSFTPServer(str(remote), allow_exec=False) as server:
+        source  = TarballSource(GitHubClient("me", None, api_url=stub.url))
+        manager = SFTPManager(credentials={"hostname": server.host, "port": server.port,
+                                           "username": "bench", "password": "bench"}, allow_exec=False)
+        plugin  = Plugin("Nick", "/plugins/Nick")
+        try:
+            with manager.lease() as sftp:
+                tracemalloc.start()
+                plugin.update(sftp, DeployOptions(mode="staged", workers=4), source=source, sftp_manager=manager)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            wait_for_cleanups()
+        finally:
+            manager.close()
+
+    head     = stub.heads["Nick"]
+    deployed = remote / "plugins" / "Nick"
+    manifest = json.loads((deployed / ".autosync-manifest.json").read_text())
+
+    assert plugin.updated and plugin.deployed_sha == head
+    assert stub.requests["codeload"] == 1
+    assert _tree(deployed) == {**_tree(repo), ".autosync-manifest.json": (deployed / ".autosync-manifest.json").read_bytes()}
+    assert manifest["sha"] == head
+    assert sorted(manifest["files"]) == ["assets/skin.bin", "plugin.yml", "src/acme/Main.php"]
+    assert sorted(os.listdir(remote / "plugins")) == ["Nick"]
+    # un asset de 16 Mo n'est jamais entièrement en mémoire (le serveur de test tourne dans le même processus)
+    assert peak < 8 * 1024 * 1024
+
+
+def test_tarball_in_place_and_already_deployed(tmp_path, local_sftp) -> None:
+    repo = _repo(tmp_path)
+    os.makedirs(os.path.join(local_sftp.root, "plugins", "Nick"))
+    manager = ShellManager(local_sftp.root)
+
+    with GitHubStub("me", [], sources={"Nick": str(repo)}) as stub:
+        source = TarballSource(GitHubClient("me", None, api_url=stub.url))
+        plugin = Plugin("Nick", "plugins/Nick")
+        plugin.update(local_sftp, DeployOptions(mode="in_place"), source=source, sftp_manager=manager)
+
+        assert plugin.deployed_sha == stub.heads["Nick"]
+        assert _tree(os.path.join(local_sftp.root, "plugins", "Nick")).keys() == {
+            "plugin.yml", os.path.join("src", "acme", "Main.php"), ".autosync-manifest.json"}
+
+        # même commit: rien n'est téléchargé
+        again = Plugin("Nick", "plugins/Nick")
+        again.update(local_sftp, DeployOptions(mode="in_place"), source=source, last_sha=plugin.deployed_sha,
+                     sftp_manager=manager)
+        assert not again.updated
+        assert stub.requests["codeload"] == 1
+
+
+def test_tarball_failure_never_touches_the_live_plugin(tmp_path, local_sftp, monkeypatch) -> None:
+    repo = _repo(tmp_path)
+    live = os.path.join(local_sftp.root, "plugins", "Nick")
+    os.makedirs(live)
+    with open(os.path.join(live, "plugin.yml"), "w") as f:
+        f.write("name: Nick\nversion: 1.0\n")
+
+    def cut(*args):
+        raise TransferError("téléchargement coupé")
+
+    monkeypatch.setattr(tarball, "stream_tarball", cut)
+    with GitHubStub("me", [], sources={"Nick": str(repo)}) as stub:
+        source = TarballSource(GitHubClient("me", None, api_url=stub.url))
+        # in_place demandé: l'archive passe quand même par le staging
+        with pytest.raises(TransferError):
+            tarball.deploy_tarball(local_sftp, source, "Nick", "plugins/Nick", DeployOptions(mode="in_place"),
+                                   ShellManager(local_sftp.root), head=stub.heads["Nick"])
+    wait_for_cleanups()
+
+    assert _tree(live) == {"plugin.yml": b"name: Nick\nversion: 1.0\n"}
+    assert os.listdir(os.path.join(local_sftp.root, "plugins")) == ["Nick"]
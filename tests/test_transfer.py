@@ -0,0 +1,84 @@
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from core.transfer import run_on_channels, upload_tree
+from utils.exceptions import TransferError
+
+
+class FakeManager:
+    def __init__(self, sftp, free):
+        self.sftp = sftp
+        self.free = free
+        self.leases = 0
+        self.throttled = False
+
+    @contextmanager
+    def lease(self, blocking=True):
+        if self.free == 0:
+            yield None
+            return
+        self.free -= 1
+        self.leases += 1
+        try:
+            yield self.sftp
+        finally:
+            self.free += 1
+
+
+def test_upload_tree_recurses_into_subdirectories(tmp_path, local_sftp) -> None:
+    local = tmp_path / "local"
+    (local / "src" / "acme" / "commands").mkdir(parents=True)
+    (local / ".git").mkdir()
+    (local / "plugin.yml").write_text("name: Test")
+    (local / "src" / "acme" / "Main.php").write_text("<?php")
+    (local / "src" / "acme" / "commands" / "Cmd.php").write_bytes(b"x" * 100_000)
+
+    manager = FakeManager(local_sftp, free=3)
+    stats = upload_tree(local_sftp, str(local), "plugin", manager, workers=4)
+
+    remote = os.path.join(local_sftp.root, "plugin")
+    assert stats.files == 3
+    assert stats.bytes == 100_000 + len("name: Test") + len("<?php")
+    assert os.path.getsize(os.path.join(remote, "src", "acme", "commands", "Cmd.php")) == 100_000
+    assert not os.path.exists(os.path.join(remote, ".git"))
+    assert manager.leases >= 1
+
+
+def test_run_on_channels_reports_failures_after_finishing(local_sftp) -> None:
+    done = []
+
+    def action(channel, item):
+        if item == 2:
+            raise IOError("boom")
+        done.append(item)
+
+    with pytest.raises(TransferError):
+        run_on_channels(local_sftp, [1, 2, 3], action, FakeManager(local_sftp, free=0), workers=2)
+    assert sorted(done) == [1, 3]
+
+
+def test_large_file_resumes_from_remote_size(tmp_path, local_sftp) -> None:
+    from core.transfer import LARGE_FILE_SIZE, TransferCheckpoint
+
+    local   = tmp_path / "local"
+    content = os.urandom(LARGE_FILE_SIZE + 1000)
+    local.mkdir()
+    (local / "big.phar").write_bytes(content)
+    (local / "small.php").write_text("<?php")
+    os.makedirs(os.path.join(local_sftp.root, "plugin"))
+    # premier essai coupé après 1 Mo, petit fichier déjà terminé
+    with open(os.path.join(local_sftp.root, "plugin", "big.phar"), "wb") as f:
+        f.write(content[:1024 * 1024])
+
+    checkpoint = TransferCheckpoint(uploaded={"small.php"}, started={"small.php", "big.phar"})
+    stats      = upload_tree(local_sftp, str(local), "plugin", checkpoint=checkpoint)
+
+    with open(os.path.join(local_sftp.root, "plugin", "big.phar"), "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(os.path.join(local_sftp.root, "plugin", "small.php"))
+    assert stats.files == 1
+    assert stats.bytes == len(content) - 1024 * 1024
+    assert stats.saved_bytes == 1024 * 1024
+    assert checkpoint.uploaded == {"small.php", "big.phar"}
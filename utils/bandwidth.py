@@ -0,0 +1,130 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from utils.metrics import metrics
+
+# rafale tolérée: un quart de seconde de débit (un paquet plus gros passe quand même, à crédit)
+BURST_SECONDS = 0.25
+
+
+@dataclass
+class RateWindow:
+    start: int  # minutes depuis minuit, heure locale
+    end: int
+    limit: int  # octets/s, 0: illimité
+
+    def contains(self, minute: int) -> bool:
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        # plage à cheval sur minuit (22:00 -> 06:00)
+        return minute >= self.start or minute < self.end
+
+
+def _minutes(value) -> int:
+    # YAML lit 18:00 sans guillemets comme l'entier sexagésimal 1080, soit déjà des minutes
+    if isinstance(value, int) and not isinstance(value, bool):
+        minutes = value
+    else:
+        hours, sep, mins = str(value).partition(":")
+        if not sep or not hours.isdigit() or not mins.isdigit():
+            raise ValueError(f"heure invalide: {value!r} (HH:MM)")
+        minutes = int(hours) * 60 + int(mins)
+    if not 0 <= minutes <= 24 * 60:
+        raise ValueError(f"heure invalide: {value!r} (HH:MM)")
+    return minutes
+
+
+def parse_schedule(entries: Optional[Iterable[dict]]) -> List[RateWindow]:
+    # [{start: "08:00", end: "23:00", limit: 2000000}, ...], la première plage qui contient l'heure s'applique
+    windows = []
+    for entry in entries or []:
+        if not isinstance(entry, dict) or not {"start", "end", "limit"} <= set(entry):
+            raise ValueError(f"plage invalide: {entry!r} (start, end et limit attendus)")
+        limit = entry["limit"]
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+            raise ValueError(f"limit invalide: {limit!r} (octets/s, 0 pour illimité)")
+        windows.append(RateWindow(_minutes(entry["start"]), _minutes(entry["end"]), limit))
+    return windows
+
+
+class TokenBucket:
+    def __init__(self, limit: int = 0, schedule: Optional[List[RateWindow]] = None,
+                 clock=time.monotonic, local_time=time.localtime):
+        self.limit       = limit
+        self.schedule    = list(schedule or [])
+        self._clock      = clock
+        self._local_time = local_time
+        self._lock       = threading.Lock()
+        self._tokens: Optional[float] = None  # None: seau plein au premier envoi
+        self._updated    = clock()
+
+    def rate(self) -> int:
+        if self.schedule:
+            now    = self._local_time()
+            minute = now.tm_hour * 60 + now.tm_min
+            for window in self.schedule:
+                if window.contains(minute):
+                    return window.limit
+        return self.limit
+
+    def reserve(self, size: int) -> float:
+        # réserve size octets quitte à s'endetter (les appelants suivants attendent leur tour), renvoie l'attente
+        rate = self.rate()
+        if rate <= 0 or size <= 0:
+            return 0.0
+
+        burst = rate * BURST_SECONDS
+        with self._lock:
+            now = self._clock()
+            if self._tokens is None:
+                self._tokens = burst
+            else:
+                self._tokens = min(burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= size
+            return -self._tokens / rate if self._tokens < 0 else 0.0
+
+
+class BandwidthLimiter:
+    # un seau par sens: l'envoi et la réception ont chacun le débit configuré
+    def __init__(self, limit: int = 0, schedule: Optional[List[RateWindow]] = None, **kwargs):
+        self.send = TokenBucket(limit, schedule, **kwargs)
+        self.recv = TokenBucket(limit, schedule, **kwargs)
+
+    @property
+    def enabled(self) -> bool:
+        return self.send.limit > 0 or any(window.limit > 0 for window in self.send.schedule)
+
+    def active(self) -> bool:
+        # débit borné à l'heure actuelle
+        return self.send.rate() > 0
+
+
+class ThrottledSocket:
+    # socket du Transport SSH: chaque octet envoyé ou reçu (SFTP, exec, keepalive) passe par les seaux
+    def __init__(self, sock, limiters: List[BandwidthLimiter]):
+        self._sock     = sock
+        self._limiters = limiters
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def _wait(self, buckets: Iterable[TokenBucket], size: int) -> None:
+        # réservé dans chaque seau (global, serveur), une seule attente: la plus longue
+        wait = max((bucket.reserve(size) for bucket in buckets), default=0.0)
+        if wait:
+            time.sleep(wait)
+            if metrics.enabled:
+                metrics.record("bandwidth.wait", wait)
+
+    def send(self, data) -> int:
+        self._wait((limiter.send for limiter in self._limiters), len(data))
+        return self._sock.send(data)
+
+    def recv(self, size: int) -> bytes:
+        # la réception se règle après coup: tant qu'on ne lit pas, la fenêtre TCP freine l'émetteur
+        data = self._sock.recv(size)
+        self._wait((limiter.recv for limiter in self._limiters), len(data))
+        return data
@@ -6,8 +6,97 @@ import yaml
 from dotenv import load_dotenv
 from yaml import YAMLError
 
-from .exceptions import ConfigurationError
-from .logger import warn
+from .bandwidth import BandwidthLimiter, parse_schedule
+from .exceptions import AuthentificationError, ConfigurationError
+from .ignore import IgnoreRules
+from .logger import LEVELS, warn
+from .selector import PluginSelector
+
+# bornes appliquées par paramiko (MIN_WINDOW_SIZE, MIN_PACKET_SIZE, MAX_WINDOW_SIZE)
+MIN_WINDOW_SIZE = 32768
+MIN_PACKET_SIZE = 4096
+MAX_WINDOW_SIZE = 2 ** 32 - 1
+
+
+def _validate_transport(owner: str, names: List[str], window_size, max_packet_size, ciphers, macs) -> None:
+    # names: clés affichées dans les erreurs (fenêtre, paquet, chiffrements, MAC)
+    window_key, packet_key, ciphers_key, macs_key = (owner + name for name in names)
+
+    if window_size is not None and (not isinstance(window_size, int) or not (MIN_WINDOW_SIZE <= window_size <= MAX_WINDOW_SIZE)):
+        raise ConfigurationError(f"{window_key} doit être un entier entre {MIN_WINDOW_SIZE} et {MAX_WINDOW_SIZE}.")
+
+    if max_packet_size is not None:
+        if not isinstance(max_packet_size, int) or max_packet_size < MIN_PACKET_SIZE:
+            raise ConfigurationError(f"{packet_key} doit être un entier supérieur ou égal à {MIN_PACKET_SIZE}.")
+        if window_size is not None and max_packet_size > window_size:
+            raise ConfigurationError(f"{packet_key} ne peut pas dépasser {window_key}.")
+
+    for key, value in ((ciphers_key, ciphers), (macs_key, macs)):
+        if value is not None and (not isinstance(value, list) or not all(isinstance(item, str) for item in value)):
+            raise ConfigurationError(f"{key} doit être une liste de noms d'algorithmes.")
+
+
+def _validate_bandwidth(owner: str, limit, schedule) -> None:
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+        raise ConfigurationError(f"{owner}bandwidth_limit doit être un entier positif en octets/s (0 pour illimité).")
+
+    if schedule is not None:
+        if not isinstance(schedule, list):
+            raise ConfigurationError(f"{owner}bandwidth_schedule doit être une liste de plages horaires.")
+        try:
+            parse_schedule(schedule)
+        except ValueError as e:
+            raise ConfigurationError(f"{owner}bandwidth_schedule: {e}")
+
+
+@dataclass
+class ServerConfig:
+    name: str
+    host: str
+    port: int = 22
+    user: Optional[str] = None
+    password_env: str = "SFTP_PASS"
+    plugins_dir: Optional[str] = None
+    channels: Optional[int] = None
+    # réglages du transport propres à ce serveur, None: valeurs globales
+    compression: Optional[bool] = None
+    ciphers: Optional[List[str]] = None
+    macs: Optional[List[str]] = None
+    window_size: Optional[int] = None
+    max_packet_size: Optional[int] = None
+    # débit propre à ce serveur, en plus du débit global partagé
+    bandwidth_limit: Optional[int] = None
+    bandwidth_schedule: Optional[List[dict]] = None
+
+    def __post_init__(self):
+        if not isinstance(self.name, str) or not self.name.strip():
+            raise ConfigurationError("Chaque serveur doit avoir un nom")
+
+        if not isinstance(self.host, str) or not self.host.strip():
+            raise ConfigurationError(f"{self.name}: host n'est pas initialisé")
+
+        if not isinstance(self.port, int) or not (1 <= self.port <= 65535):
+            raise ConfigurationError(f"{self.name}: le port doit être compris entre 1 et 65535.")
+
+        if self.channels is not None and (not isinstance(self.channels, int) or self.channels < 1):
+            raise ConfigurationError(f"{self.name}: channels doit être un entier supérieur ou égal à 1.")
+
+        if self.compression is not None and not isinstance(self.compression, bool):
+            raise ConfigurationError(f"{self.name}: compression doit valoir true ou false.")
+
+        _validate_transport(f"{self.name}: ", ["window_size", "max_packet_size", "ciphers", "macs"],
+                            self.window_size, self.max_packet_size, self.ciphers, self.macs)
+
+        _validate_bandwidth(f"{self.name}: ", self.bandwidth_limit, self.bandwidth_schedule)
+
+    def credentials(self) -> dict:
+        # le mot de passe reste dans l'environnement (.env), jamais dans config.yml
+        username = self.user or os.getenv("SFTP_USER")
+        password = os.getenv(self.password_env)
+        if not username or not password:
+            raise AuthentificationError(f"{self.name}: utilisateur ou mot de passe manquant ({self.password_env})")
+
+        return {"hostname": self.host, "port": self.port, "username": username, "password": password}
 
 @dataclass
 class Config:
@@ -15,15 +104,90 @@ class Config:
     authors: List[str] = field(default_factory=list)
     modes: List[str] = field(default_factory=list)
     target_plugins: List[str] = field(default_factory=list)
+    target_all_plugins: bool = False
     github_timeout: int = 30
+    github_api_url: str = "https://api.github.com"
+    github_url: str = "https://github.com"
     sftp_timeout: int = 60
     max_retries: int = 3
+    update_strategy: str = "delta"
+    delta_checksum: bool = False
+    deploy_mode: str = "staged"
+    transfer_mode: str = "files"
+    plugin_transfer_modes: Dict[str, str] = field(default_factory=dict)
+    analysis_workers: int = 8
+    sftp_channels: int = 4
+    sftp_keepalive: int = 30
+    upload_workers: int = 4
+    fetch_workers: int = 2
+    prepare_workers: int = 2
+    deploy_workers: int = 1
+    pipeline_queue_size: int = 2
+    remote_exec: bool = True
+    remote_index: bool = True
+    state_db: Optional[str] = ".autosync/state.db"
+    github_cache_ttl: int = 3600
+    git_cache_dir: Optional[str] = ".autosync/git"
+    git_mirror: bool = True
+    git_shallow: bool = True
+    git_single_branch: bool = True
+    update_source: str = "git"
+    sync_excludes: List[str] = field(default_factory=list)
+    metrics: bool = False
+    metrics_report: Optional[str] = ".autosync/metrics.json"
+    metrics_textfile: Optional[str] = None
+    servers: List[ServerConfig] = field(default_factory=list)
+    server_workers: int = 4
+    daemon_poll_interval: int = 60
+    daemon_sweep_interval: int = 3600
+    webhook_port: int = 0
+    webhook_host: str = "127.0.0.1"
+    webhook_secret_env: str = "GITHUB_WEBHOOK_SECRET"
+    deploy_manifest: bool = True
+    log_level: str = "info"
+    log_format: str = "auto"
+    log_json: Optional[str] = None
+    manifest_spot_checks: int = 20
+    ssh_compression: bool = False
+    ssh_ciphers: List[str] = field(default_factory=list)
+    ssh_macs: List[str] = field(default_factory=list)
+    sftp_window_size: int = 2097152
+    sftp_max_packet_size: int = 32768
+    transfer_retries: int = 5
+    transfer_retry_delay: float = 1.0
+    transfer_retry_max_delay: float = 30.0
+    bandwidth_limit: int = 0
+    bandwidth_schedule: List[dict] = field(default_factory=list)
 
     def __post_init__(self):
         self._validate()
 
+    def target_selector(self) -> PluginSelector:
+        return PluginSelector(["all"] if self.target_all_plugins else self.target_plugins)
+
+    def transport_options(self, server: Optional[ServerConfig] = None) -> dict:
+        # réglages SSH d'un serveur: ses valeurs propres, sinon les valeurs globales
+        options = {
+            "compression": self.ssh_compression,
+            "ciphers": self.ssh_ciphers,
+            "macs": self.ssh_macs,
+            "window_size": self.sftp_window_size,
+            "max_packet_size": self.sftp_max_packet_size,
+        }
+        if server is not None:
+            options.update({key: getattr(server, key) for key in options if getattr(server, key) is not None})
+        return options
+
+    def bandwidth_limiter(self, server: Optional[ServerConfig] = None) -> Optional[BandwidthLimiter]:
+        # sans serveur: le limiteur global, à partager entre tous les serveurs; None si rien n'est borné
+        if server is None:
+            limiter = BandwidthLimiter(self.bandwidth_limit, parse_schedule(self.bandwidth_schedule))
+        else:
+            limiter = BandwidthLimiter(server.bandwidth_limit or 0, parse_schedule(server.bandwidth_schedule))
+        return limiter if limiter.enabled else None
+
     def _validate(self) -> None:
-        valid_modes   = ["valid", "github", "owned", "update"]
+        valid_modes   = ["valid", "github", "owned", "update", "verify"]
         invalid_modes = set(self.modes) - set(valid_modes)
         if invalid_modes:
             raise ConfigurationError(f"Modes invalides: {invalid_modes}")
@@ -37,12 +201,99 @@ class Config:
         if not isinstance(self.target_plugins, list):
             raise ConfigurationError("target_plugins doit être une liste")
 
+        try:
+            self.target_selector()
+        except ValueError as e:
+            raise ConfigurationError(f"target_plugins: {e}")
+
         if self.github_timeout <= 0 or self.sftp_timeout <= 0:
             raise ConfigurationError("Timeouts doit être une valeur positive.")
 
         if self.max_retries < 0:
             raise ConfigurationError("max_retries doit être une valeur positive.")
 
+        if not isinstance(self.analysis_workers, int) or self.analysis_workers < 1:
+            raise ConfigurationError("analysis_workers doit être un entier supérieur ou égal à 1.")
+
+        if not isinstance(self.sftp_channels, int) or self.sftp_channels < 1:
+            raise ConfigurationError("sftp_channels doit être un entier supérieur ou égal à 1.")
+
+        if not isinstance(self.upload_workers, int) or self.upload_workers < 1:
+            raise ConfigurationError("upload_workers doit être un entier supérieur ou égal à 1.")
+
+        for name in ("fetch_workers", "prepare_workers", "deploy_workers", "pipeline_queue_size", "server_workers"):
+            value = getattr(self, name)
+            if not isinstance(value, int) or value < 1:
+                raise ConfigurationError(f"{name} doit être un entier supérieur ou égal à 1.")
+
+        if self.sftp_keepalive < 0:
+            raise ConfigurationError("sftp_keepalive doit être une valeur positive.")
+
+        if not isinstance(self.ssh_compression, bool):
+            raise ConfigurationError("ssh_compression doit valoir true ou false.")
+
+        _validate_transport("", ["sftp_window_size", "sftp_max_packet_size", "ssh_ciphers", "ssh_macs"],
+                            self.sftp_window_size, self.sftp_max_packet_size, self.ssh_ciphers, self.ssh_macs)
+
+        if not isinstance(self.transfer_retries, int) or self.transfer_retries < 0:
+            raise ConfigurationError("transfer_retries doit être un entier positif (0 pour désactiver).")
+
+        if self.transfer_retry_delay < 0 or self.transfer_retry_max_delay < self.transfer_retry_delay:
+            raise ConfigurationError("transfer_retry_delay doit être positif et inférieur à transfer_retry_max_delay.")
+
+        _validate_bandwidth("", self.bandwidth_limit, self.bandwidth_schedule)
+
+        if not isinstance(self.daemon_poll_interval, int) or self.daemon_poll_interval < 0:
+            raise ConfigurationError("daemon_poll_interval doit être un entier positif (0 pour désactiver).")
+
+        if not isinstance(self.daemon_sweep_interval, int) or self.daemon_sweep_interval < 1:
+            raise ConfigurationError("daemon_sweep_interval doit être un entier supérieur ou égal à 1.")
+
+        if not isinstance(self.webhook_port, int) or not (0 <= self.webhook_port <= 65535):
+            raise ConfigurationError("webhook_port doit être compris entre 0 et 65535 (0 pour désactiver).")
+
+        if not isinstance(self.manifest_spot_checks, int) or self.manifest_spot_checks < 0:
+            raise ConfigurationError("manifest_spot_checks doit être un entier positif (0 pour tous les fichiers).")
+
+        if self.github_cache_ttl < 0:
+            raise ConfigurationError("github_cache_ttl doit être une valeur positive.")
+
+        if self.update_strategy not in ("delta", "full"):
+            raise ConfigurationError(f"update_strategy invalide: {self.update_strategy} (delta ou full)")
+
+        if self.update_source not in ("git", "tarball"):
+            raise ConfigurationError(f"update_source invalide: {self.update_source} (git ou tarball)")
+
+        if not isinstance(self.sync_excludes, list):
+            raise ConfigurationError("sync_excludes doit être une liste de motifs (syntaxe .gitignore)")
+        try:
+            IgnoreRules(self.sync_excludes)
+        except ValueError as e:
+            raise ConfigurationError(f"sync_excludes: {e}")
+
+        if self.deploy_mode not in ("staged", "in_place"):
+            raise ConfigurationError(f"deploy_mode invalide: {self.deploy_mode} (staged ou in_place)")
+
+        names = [server.name for server in self.servers]
+        if len(set(names)) != len(names):
+            raise ConfigurationError(f"Noms de serveurs en double: {names}")
+
+        if self.log_level not in LEVELS:
+            raise ConfigurationError(f"log_level invalide: {self.log_level} ({', '.join(LEVELS)})")
+
+        if self.log_format not in ("auto", "pretty", "text"):
+            raise ConfigurationError(f"log_format invalide: {self.log_format} (auto, pretty ou text)")
+
+        if not isinstance(self.metrics, bool):
+            raise ConfigurationError("metrics doit être un booléen")
+
+        if not isinstance(self.plugin_transfer_modes, dict):
+            raise ConfigurationError("plugin_transfer_modes doit être un dictionnaire")
+
+        for transfer_mode in [self.transfer_mode, *self.plugin_transfer_modes.values()]:
+            if transfer_mode not in ("files", "archive"):
+                raise ConfigurationError(f"Mode de transfert invalide: {transfer_mode} (files ou archive)")
+
     @property
     def mode_flags(self) -> Dict[str, bool]:
         return {
@@ -50,11 +301,14 @@ class Config:
             "owned": "owned" in self.modes,
             "github": "github" in self.modes,
             "update": "update" in self.modes,
+            "verify": "verify" in self.modes,
         }
 
-def validate_environment() -> None:
+def validate_environment(require_sftp: bool = True) -> None:
     load_dotenv()
-    required_vars = ["SFTP_HOST", "SFTP_PORT", "SFTP_USER", "SFTP_PASS", "GITHUB", "GITHUB_TOKEN"]
+    # avec une liste de serveurs dans config.yml, les identifiants SFTP sont propres à chaque serveur
+    required_vars = ["SFTP_HOST", "SFTP_PORT", "SFTP_USER", "SFTP_PASS"] if require_sftp else []
+    required_vars += ["GITHUB", "GITHUB_TOKEN"]
     missing_vars = []
     for var in required_vars:
         if not os.getenv(var):
@@ -66,13 +320,28 @@ def validate_environment() -> None:
     if not os.getenv("GITHUB_TOKEN") and not os.getenv("GITHUB"):
         raise ConfigurationError("Les variables d'environnement GITHUB_TOKEN & GITHUB doivent être définie pour accéder à l'API GitHub.")
 
+# fichiers locaux: un chemin relatif part du dossier de config.yml, pas du répertoire courant (cron, systemd)
+LOCAL_PATHS = ["state_db", "git_cache_dir", "metrics_report", "metrics_textfile", "log_json"]
+
+
+def _resolve_local_paths(config: Config, config_path: str) -> Config:
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    for name in LOCAL_PATHS:
+        path = getattr(config, name)
+        # vide ou None: désactivé
+        if path:
+            path = os.path.expanduser(path)
+            setattr(config, name, path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path)))
+    return config
+
+
 def load_config(config_path: Optional[str] = None) -> Config:
     if config_path is None:
         config_path = os.path.join(os.path.dirname(__file__), "..", "config.yml")
 
     if not os.path.exists(config_path):
         warn(f"Le fichier de configuration n'a pas été trouvé dans {config_path}, utilisation des valeur par défaut...")
-        return Config()
+        return _resolve_local_paths(Config(), config_path)
 
     try:
         with open(config_path, "r", encoding="utf-8") as f:
@@ -87,13 +356,64 @@ def load_config(config_path: Optional[str] = None) -> Config:
             plugins_dir=data.get("plugins_dir", "./plugins"),
             authors=data.get("authors", []),
             modes=data.get("modes", []),
-            target_plugins=data.get("target_plugins", []),
+            target_plugins=data.get("target_plugins") or [],
+            target_all_plugins=data.get("target_all_plugins", False),
             github_timeout=data.get("github_timeout", 30),
+            github_api_url=data.get("github_api_url", "https://api.github.com"),
+            github_url=data.get("github_url", "https://github.com"),
             sftp_timeout=data.get("sftp_timeout", 60),
             max_retries=data.get("max_retries", 3),
+            update_strategy=data.get("update_strategy", "delta"),
+            delta_checksum=data.get("delta_checksum", False),
+            deploy_mode=data.get("deploy_mode", "staged"),
+            transfer_mode=data.get("transfer_mode", "files"),
+            plugin_transfer_modes=data.get("plugin_transfer_modes") or {},
+            analysis_workers=data.get("analysis_workers", 8),
+            sftp_channels=data.get("sftp_channels", 4),
+            sftp_keepalive=data.get("sftp_keepalive", 30),
+            upload_workers=data.get("upload_workers", 4),
+            fetch_workers=data.get("fetch_workers", 2),
+            prepare_workers=data.get("prepare_workers", 2),
+            deploy_workers=data.get("deploy_workers", 1),
+            pipeline_queue_size=data.get("pipeline_queue_size", 2),
+            remote_exec=data.get("remote_exec", True),
+            remote_index=data.get("remote_index", True),
+            state_db=data.get("state_db", ".autosync/state.db"),
+            github_cache_ttl=data.get("github_cache_ttl", 3600),
+            git_cache_dir=data.get("git_cache_dir", ".autosync/git"),
+            git_mirror=data.get("git_mirror", True),
+            git_shallow=data.get("git_shallow", True),
+            git_single_branch=data.get("git_single_branch", True),
+            update_source=data.get("update_source", "git"),
+            sync_excludes=data.get("sync_excludes") or [],
+            metrics=data.get("metrics", False),
+            metrics_report=data.get("metrics_report", ".autosync/metrics.json"),
+            metrics_textfile=data.get("metrics_textfile"),
+            servers=[ServerConfig(**server) for server in data.get("servers") or []],
+            server_workers=data.get("server_workers", 4),
+            daemon_poll_interval=data.get("daemon_poll_interval", 60),
+            daemon_sweep_interval=data.get("daemon_sweep_interval", 3600),
+            webhook_port=data.get("webhook_port") or 0,
+            webhook_host=data.get("webhook_host", "127.0.0.1"),
+            webhook_secret_env=data.get("webhook_secret_env", "GITHUB_WEBHOOK_SECRET"),
+            deploy_manifest=data.get("deploy_manifest", True),
+            log_level=data.get("log_level", "info"),
+            log_format=data.get("log_format", "auto"),
+            log_json=data.get("log_json"),
+            manifest_spot_checks=data.get("manifest_spot_checks", 20),
+            ssh_compression=data.get("ssh_compression", False),
+            ssh_ciphers=data.get("ssh_ciphers") or [],
+            ssh_macs=data.get("ssh_macs") or [],
+            sftp_window_size=data.get("sftp_window_size", 2097152),
+            sftp_max_packet_size=data.get("sftp_max_packet_size", 32768),
+            transfer_retries=data.get("transfer_retries", 5),
+            transfer_retry_delay=data.get("transfer_retry_delay", 1.0),
+            transfer_retry_max_delay=data.get("transfer_retry_max_delay", 30.0),
+            bandwidth_limit=data.get("bandwidth_limit") or 0,
+            bandwidth_schedule=data.get("bandwidth_schedule") or [],
         )
 
-        return config
+        return _resolve_local_paths(config, config_path)
 
     except Exception as e:
         raise ConfigurationError(f"La validation de la configuration a échoué: {e}")
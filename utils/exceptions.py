@@ -5,4 +5,10 @@ class ConfigurationError(AutoSyncError):
     pass
 
 class AuthentificationError(AutoSyncError):
-    pass
\ No newline at end of file
+    pass
+
+class GitHubError(AutoSyncError):
+    pass
+
+class TransferError(AutoSyncError):
+    pass
@@ -0,0 +1,117 @@
+import os
+import re
+from typing import Iterable, Optional, Tuple
+
+SYNCIGNORE_NAME = ".syncignore"
+# jamais envoyés, quelle que soit la configuration
+BUILTIN_PATTERNS = ["*.git", f"/{SYNCIGNORE_NAME}"]
+
+
+def _translate(pattern: str) -> str:
+    # glob gitignore -> regex: * et ? restent dans un segment, **/ traverse les dossiers
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex.append("/.*")
+            break
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        elif char == "[" and "]" in pattern[i + 2:]:
+            end     = pattern.index("]", i + 2)
+            content = pattern[i + 1:end].replace("\\", "\\\\")
+            regex.append("[^" + content[1:] + "]" if content.startswith("!") else "[" + content + "]")
+            i = end
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return "".join(regex)
+
+
+def _parse(line: str) -> Optional[Tuple[str, bool, bool]]:
+    # (regex, négation, dossiers seulement), None pour une ligne vide ou un commentaire
+    line = line.rstrip("\r\n").rstrip()
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line     = line.rstrip("/")
+    if not line:
+        return None
+
+    # un motif sans / interne vaut à toutes les profondeurs, sinon il part de la racine du plugin
+    anchored = "/" in line
+    regex    = _translate(line.lstrip("/"))
+    return (regex if anchored else "(?:.*/)?" + regex), negate, dir_only
+
+
+class IgnoreRules:
+    # motifs gitignore compilés une fois: excludes globaux de config.yml puis .syncignore du repository
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns = [*BUILTIN_PATTERNS, *patterns]
+        rules = []
+        for pattern in self.patterns:
+            if not isinstance(pattern, str):
+                raise ValueError(f"motif d'exclusion invalide: {pattern!r}")
+            parsed = _parse(pattern)
+            if parsed is not None:
+                try:
+                    rules.append((re.compile(parsed[0], re.DOTALL), parsed[1], parsed[2]))
+                except re.error as e:
+                    raise ValueError(f"motif d'exclusion invalide {pattern!r}: {e}")
+
+        self._ordered = any(negate for _, negate, _ in rules)
+        if self._ordered:
+            # avec des !motifs la dernière règle qui correspond l'emporte, évaluées une à une
+            self._rules = rules
+        else:
+            # sans négation, une seule expression pour les fichiers et une pour les dossiers
+            self._files = re.compile("|".join(f"(?:{r.pattern})" for r, _, dir_only in rules if not dir_only) or "(?!)", re.DOTALL)
+            self._dirs  = re.compile("|".join(f"(?:{r.pattern})" for r, _, _ in rules) or "(?!)", re.DOTALL)
+
+    @classmethod
+    def for_tree(cls, local_root: str, excludes: Iterable[str] = ()) -> "IgnoreRules":
+        path = os.path.join(local_root, SYNCIGNORE_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls([*excludes, *f.read().splitlines()])
+        except FileNotFoundError:
+            return cls(excludes)
+
+    def __repr__(self) -> str:
+        return f"IgnoreRules({self.patterns!r})"
+
+    def matches(self, rel_path: str, is_dir: bool = False) -> bool:
+        # rel_path seul, ses parents sont supposés déjà acceptés (parcours élagué)
+        if not self._ordered:
+            return (self._dirs if is_dir else self._files).fullmatch(rel_path) is not None
+
+        ignored = False
+        for regex, negate, dir_only in self._rules:
+            if (is_dir or not dir_only) and regex.fullmatch(rel_path):
+                ignored = not negate
+        return ignored
+
+    def excludes(self, rel_path: str, is_dir: bool = False) -> bool:
+        # chemin pris isolément (membre d'archive): exclu aussi quand l'un de ses dossiers parents l'est
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.matches("/".join(parts[:depth]), is_dir=True):
+                return True
+        return self.matches(rel_path, is_dir)
@@ -1,9 +1,236 @@
-from rich.console import Console
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
 
-console = Console()
+from utils.metrics import metrics
 
-def info(msg): console.log(f"[cyan][INFO][/cyan] {msg}")
-def warn(msg): console.log(f"[yellow][WARN][/yellow] {msg}")
-def error(msg): console.log(f"[bold red][ERROR][/bold red] {msg}")
-def success(msg): console.log(f"[bold green][SUCCESS][/bold green] {msg}")
-def debug(msg): console.log(f"[dim][DEBUG][/dim] {msg}")
\ No newline at end of file
+LEVELS = {"debug": 10, "info": 20, "success": 25, "warn": 30, "error": 40}
+STYLES = {"debug": "dim", "info": "cyan", "success": "bold green", "warn": "yellow", "error": "bold red"}
+SEPARATOR = "-" * 80
+
+
+class TextSink:
+    # sortie brute (cron, redirection vers un fichier), sys.stdout relu à chaque écriture
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, record: dict) -> None:
+        stream = self.stream or sys.stdout
+        if record["level"] is None:
+            stream.write(f"{record['msg']}\n")
+            return
+        stamp = time.strftime("%H:%M:%S", time.localtime(record["ts"]))
+        stream.write(f"{stamp} [{record['level'].upper()}] {record['msg']}\n")
+
+    def flush(self) -> None:
+        (self.stream or sys.stdout).flush()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class PrettySink:
+    # rendu rich pour un terminal interactif
+    def __init__(self, console=None):
+        from rich.console import Console
+        from rich.markup import escape
+
+        self.console = console or Console()
+        self._escape = escape
+
+    def write(self, record: dict) -> None:
+        level = record["level"]
+        if level is None:
+            self.console.print(record["msg"], markup=False, highlight=False)
+            return
+        stamp = time.strftime("%H:%M:%S", time.localtime(record["ts"]))
+        style = STYLES[level]
+        self.console.print(f"[dim]{stamp}[/dim] [{style}][{level.upper()}][/{style}] {self._escape(record['msg'])}")
+
+    def flush(self) -> None:
+        self.console.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class JsonSink:
+    # une ligne JSON par message, pour jq / un collecteur de logs
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path   = path
+        self.stream = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        if record["level"] is None:
+            return
+        data = {key: value for key, value in record.items() if value is not None}
+        data["ts"] = round(record["ts"], 3)
+        self.stream.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+class Logger:
+    def __init__(self, level: str = "info", sinks: Optional[List] = None):
+        self.level  = LEVELS[level]
+        # None: sortie par défaut choisie au premier message (rich n'est importé que s'il sert)
+        self.sinks  = sinks
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock  = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, level: Optional[str] = None, sinks: Optional[List] = None) -> None:
+        if level is not None:
+            if level not in LEVELS:
+                raise ValueError(f"niveau de log inconnu: {level} ({', '.join(LEVELS)})")
+            self.level = LEVELS[level]
+        if sinks is not None:
+            self.flush()
+            with self._lock:
+                previous, self.sinks = self.sinks or [], sinks
+            for sink in previous:
+                if sink not in sinks:
+                    sink.close()
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def log(self, level: str, msg, *args) -> None:
+        # filtré avant tout formatage: msg peut être un format %, ou une fonction pour un message coûteux
+        if LEVELS[level] < self.level:
+            return
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg % args
+        record = {
+            "ts": time.time(),
+            "level": level,
+            "msg": str(msg),
+            "thread": threading.current_thread().name,
+            "plugin": metrics.current_plugin(),
+        }
+        captured = getattr(self._local, "captured", None)
+        if captured is not None:
+            captured.append(record)
+        else:
+            self._put(record)
+
+    @contextmanager
+    def capture(self, records: Optional[list]):
+        # messages de ce thread gardés dans records au lieu d'être écrits, rendus plus tard d'un bloc par replay()
+        if records is None:
+            yield
+            return
+        previous = getattr(self._local, "captured", None)
+        self._local.captured = records
+        try:
+            yield
+        finally:
+            self._local.captured = previous
+
+    def replay(self, records: list) -> None:
+        for record in records:
+            self._put(record)
+
+    def separator(self) -> None:
+        if LEVELS["info"] >= self.level:
+            self._put({"ts": time.time(), "level": None, "msg": SEPARATOR})
+
+    def _put(self, item) -> None:
+        self._queue.put(item)
+        if self._thread is None:
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="logger", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        # l'appelant ne fait que poser le message dans la file, le rendu et les écritures se font ici
+        with self._lock:
+            if self.sinks is None:
+                self.sinks = [default_sink()]
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            try:
+                while len(batch) < 256:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            waiters = []
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    waiters.append(entry)
+                    continue
+                for sink in self.sinks:
+                    try:
+                        sink.write(entry)
+                    except Exception:
+                        pass
+
+            for sink in self.sinks:
+                try:
+                    sink.flush()
+                except Exception:
+                    pass
+            for waiter in waiters:
+                waiter.set()
+
+    def flush(self, timeout: Optional[float] = 5.0) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self) -> None:
+        self.flush()
+        for sink in self.sinks or []:
+            try:
+                sink.close()
+            except Exception:
+                pass
+
+
+def default_sink():
+    # rich seulement dans un terminal, texte brut sinon (cron, redirection)
+    return PrettySink() if sys.stdout.isatty() else TextSink()
+
+
+def build_sinks(fmt: str = "auto", json_path: Optional[str] = None) -> List:
+    if fmt not in ("auto", "pretty", "text"):
+        raise ValueError(f"format de log inconnu: {fmt} (auto, pretty ou text)")
+    sinks = [default_sink() if fmt == "auto" else PrettySink() if fmt == "pretty" else TextSink()]
+    if json_path:
+        sinks.append(JsonSink(json_path))
+    return sinks
+
+
+logger = Logger()
+atexit.register(logger.flush)
+
+
+def info(msg, *args): logger.log("info", msg, *args)
+def warn(msg, *args): logger.log("warn", msg, *args)
+def error(msg, *args): logger.log("error", msg, *args)
+def success(msg, *args): logger.log("success", msg, *args)
+def debug(msg, *args): logger.log("debug", msg, *args)
+def separator(): logger.separator()
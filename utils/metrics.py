@@ -0,0 +1,355 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# bornes (secondes) des histogrammes de latence, une requête SFTP sur un lien distant est autour de 10-100ms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# opérations SFTP chronométrées, le reste (get_channel...) est délégué tel quel
+SFTP_OPERATIONS = frozenset({
+    "listdir", "listdir_attr", "stat", "lstat", "open", "file", "remove", "unlink", "rename", "posix_rename",
+    "mkdir", "rmdir", "utime", "chmod", "chown", "symlink", "readlink", "normalize", "truncate",
+})
+
+# étapes du pipeline d'update: elles englobent des opérations, leur temps est une série à part
+STAGE_PREFIX = "pipeline."
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total  = 0.0
+        self.count  = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            running += count
+            yield bound, running
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, size: int) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "op", "bytes", "started", "stage")
+
+    def __init__(self, metrics: "Metrics", op: str):
+        self.metrics = metrics
+        self.op      = op
+        self.bytes   = 0
+        self.stage   = op.startswith(STAGE_PREFIX)
+
+    def __enter__(self):
+        if not self.stage:
+            self.metrics._nest(1)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        nested  = not self.stage and self.metrics._nest(-1) > 0
+        self.metrics.record(self.op, seconds, self.bytes, error=exc_type is not None, nested=nested)
+        return False
+
+    def add_bytes(self, size: int) -> None:
+        self.bytes += size
+
+
+class _InstrumentedFile:
+    def __init__(self, metrics: "Metrics", handle, op: str):
+        self._metrics = metrics
+        self._handle  = handle
+        self._op      = op
+
+    def __getattr__(self, name):
+        return getattr(self._handle, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __iter__(self):
+        return iter(self._handle)
+
+    def read(self, size=None):
+        data = self._handle.read(size)
+        self._metrics.add_bytes(f"{self._op}.read", len(data))
+        return data
+
+    def write(self, data):
+        # écritures pipelinées: seul le volume est compté, l'attente des acks est mesurée par close()
+        self._handle.write(data)
+        self._metrics.add_bytes(f"{self._op}.write", len(data))
+
+    def close(self):
+        with self._metrics.timed(f"{self._op}.close"):
+            self._handle.close()
+
+
+class InstrumentedSFTP:
+    def __init__(self, metrics: "Metrics", client):
+        self._metrics = metrics
+        self._client  = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in SFTP_OPERATIONS:
+            return attr
+
+        op = f"sftp.{name}"
+        if name in ("open", "file"):
+            def call(*args, **kwargs):
+                with self._metrics.timed(op):
+                    handle = attr(*args, **kwargs)
+                return _InstrumentedFile(self._metrics, handle, "sftp.file")
+        else:
+            def call(*args, **kwargs):
+                with self._metrics.timed(op):
+                    return attr(*args, **kwargs)
+        return call
+
+    @property
+    def unwrapped(self):
+        return self._client
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock   = threading.Lock()
+        self._local  = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls   = Counter()
+            self._errors  = Counter()
+            self._bytes   = Counter()
+            self._latency: Dict[str, _Histogram] = {}
+            self._plugin_calls = Counter()
+            self._plugin_bytes = Counter()
+            self._plugin_time  = Counter()
+            self._plugin_stage_time = Counter()
+            self._gauges: Dict[str, float] = {}
+            self.started_at = time.time()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def current_plugin(self) -> Optional[str]:
+        return getattr(self._local, "plugin", None)
+
+    @contextmanager
+    def plugin(self, name: Optional[str]):
+        # les opérations faites dans ce bloc (sur ce thread) sont attribuées au plugin
+        previous = self.current_plugin()
+        self._local.plugin = name
+        try:
+            yield
+        finally:
+            self._local.plugin = previous
+
+    def _nest(self, delta: int) -> int:
+        # opérations ouvertes sur ce thread: une opération comprise dans une autre (attente de bande passante dans un
+        # appel SFTP...) n'ajoute pas son temps une seconde fois à celui du plugin
+        depth = self._local.depth = getattr(self._local, "depth", 0) + delta
+        return depth
+
+    def timed(self, op: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, op)
+
+    def record(self, op: str, seconds: float, size: int = 0, error: bool = False, nested: Optional[bool] = None) -> None:
+        plugin = self.current_plugin()
+        if nested is None:
+            nested = getattr(self._local, "depth", 0) > 0
+        with self._lock:
+            self._calls[op] += 1
+            if error:
+                self._errors[op] += 1
+            if size:
+                self._bytes[op] += size
+            histogram = self._latency.get(op)
+            if histogram is None:
+                histogram = self._latency[op] = _Histogram()
+            histogram.observe(seconds)
+
+            if plugin is not None:
+                self._plugin_calls[(plugin, op)] += 1
+                if op.startswith(STAGE_PREFIX):
+                    self._plugin_stage_time[(plugin, op[len(STAGE_PREFIX):])] += seconds
+                elif not nested:
+                    self._plugin_time[plugin] += seconds
+                if size:
+                    self._plugin_bytes[plugin] += size
+
+    def count(self, op: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._calls[op] += value
+
+    def add_bytes(self, op: str, size: int) -> None:
+        if not self.enabled or not size:
+            return
+        plugin = self.current_plugin()
+        with self._lock:
+            self._bytes[op] += size
+            if plugin is not None:
+                self._plugin_bytes[plugin] += size
+
+    def set_gauge(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def instrument_sftp(self, client):
+        if not self.enabled or client is None or isinstance(client, InstrumentedSFTP):
+            return client
+        return InstrumentedSFTP(self, client)
+
+    def report(self) -> dict:
+        with self._lock:
+            operations = {}
+            for op in sorted(set(self._calls) | set(self._bytes)):
+                histogram = self._latency.get(op)
+                operations[op] = {
+                    "calls": self._calls[op],
+                    "errors": self._errors[op],
+                    "bytes": self._bytes[op],
+                    "seconds": round(histogram.total, 6) if histogram else 0.0,
+                    "buckets": {
+                        ("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in histogram.cumulative()
+                    } if histogram else {},
+                }
+
+            # seconds: temps des opérations (sans double compte des imbrications), stages: durée des étapes du pipeline
+            plugins = {}
+            for (plugin, op), calls in self._plugin_calls.items():
+                plugins.setdefault(plugin, {"calls": {}, "bytes": 0, "seconds": 0.0, "stages": {}})["calls"][op] = calls
+            for plugin, size in self._plugin_bytes.items():
+                plugins.setdefault(plugin, {"calls": {}, "bytes": 0, "seconds": 0.0, "stages": {}})["bytes"] = size
+            for plugin, seconds in self._plugin_time.items():
+                plugins[plugin]["seconds"] = round(seconds, 6)
+            for (plugin, stage), seconds in self._plugin_stage_time.items():
+                plugins[plugin]["stages"][stage] = round(seconds, 6)
+
+            return {
+                "started_at": self.started_at,
+                "finished_at": time.time(),
+                "gauges": dict(self._gauges),
+                "operations": operations,
+                "plugins": dict(sorted(plugins.items())),
+            }
+
+    def write_json(self, path: str) -> None:
+        _atomic_write(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        # node_exporter lit le fichier à tout moment: écriture dans un fichier temporaire puis rename
+        _atomic_write(path, format_prometheus(self.report()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_prometheus(report: dict, prefix: str = "autosync") -> str:
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples) -> None:
+        samples = list(samples)
+        if not samples:
+            return
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{prefix}_{name}{suffix}{_labels(**labels) if labels else ''} {value}")
+
+    operations = report["operations"]
+    metric("operation_calls_total", "counter", "Nombre d'appels par opération",
+           (("", {"op": op}, data["calls"]) for op, data in operations.items() if data["calls"]))
+    metric("operation_errors_total", "counter", "Nombre d'appels en erreur par opération",
+           (("", {"op": op}, data["errors"]) for op, data in operations.items() if data["calls"]))
+    metric("operation_bytes_total", "counter", "Octets transférés par opération",
+           (("", {"op": op}, data["bytes"]) for op, data in operations.items() if data["bytes"]))
+
+    def histogram_samples():
+        for op, data in operations.items():
+            if not data["buckets"]:
+                continue
+            for bound, count in data["buckets"].items():
+                yield "_bucket", {"op": op, "le": bound}, count
+            yield "_sum", {"op": op}, data["seconds"]
+            yield "_count", {"op": op}, data["calls"]
+
+    metric("operation_duration_seconds", "histogram", "Latence des opérations", histogram_samples())
+
+    plugins = report["plugins"]
+    metric("plugin_bytes_total", "counter", "Octets transférés par plugin",
+           (("", {"plugin": plugin}, data["bytes"]) for plugin, data in plugins.items()))
+    metric("plugin_operation_seconds_total", "counter", "Temps passé dans les opérations par plugin, hors étapes du pipeline",
+           (("", {"plugin": plugin}, data["seconds"]) for plugin, data in plugins.items()))
+    metric("plugin_stage_seconds_total", "counter", "Durée des étapes du pipeline d'update par plugin",
+           (("", {"plugin": plugin, "stage": stage}, seconds)
+            for plugin, data in plugins.items() for stage, seconds in data["stages"].items()))
+
+    for name, value in sorted(report["gauges"].items()):
+        metric(name, "gauge", name.replace("_", " "), [("", None, value)])
+
+    return "\n".join(lines) + "\n"
+
+
+def _atomic_write(path: str, content: str) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+metrics = Metrics()
@@ -0,0 +1,52 @@
+import fnmatch
+import re
+from typing import Dict, Iterable, List
+
+GLOB_CHARS = "*?["
+
+
+class PluginSelector:
+    # motifs de target_plugins compilés une fois: noms exacts, globs (Lobby*), regex (re:^Nick\d+$) ou all
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns = list(patterns)
+        self.all      = False
+        self.names: Dict[str, str] = {}  # nom en minuscules -> nom tel qu'écrit dans la config
+
+        regexes = []
+        for pattern in self.patterns:
+            if not isinstance(pattern, str) or not pattern.strip():
+                raise ValueError(f"motif de plugin invalide: {pattern!r}")
+            pattern = pattern.strip()
+            if pattern.lower() == "all":
+                self.all = True
+            elif pattern.startswith("re:"):
+                try:
+                    re.compile(pattern[3:])
+                except re.error as e:
+                    raise ValueError(f"regex invalide {pattern!r}: {e}")
+                regexes.append(pattern[3:])
+            elif any(char in pattern for char in GLOB_CHARS):
+                regexes.append(fnmatch.translate(pattern))
+            else:
+                self.names[pattern.lower()] = pattern
+
+        # globs et regex réunis en une seule expression, insensible à la casse comme les noms exacts
+        self._regex = re.compile("|".join(f"(?:{regex})" for regex in regexes), re.IGNORECASE) if regexes else None
+
+    @classmethod
+    def of(cls, targets) -> "PluginSelector":
+        return targets if isinstance(targets, PluginSelector) else cls(targets or [])
+
+    def __bool__(self) -> bool:
+        return self.all or bool(self.names) or self._regex is not None
+
+    def __repr__(self) -> str:
+        return f"PluginSelector({self.patterns!r})"
+
+    def matches(self, name: str) -> bool:
+        if self.all or name.lower() in self.names:
+            return True
+        return self._regex is not None and self._regex.fullmatch(name) is not None
+
+    def filter(self, names: Iterable[str]) -> List[str]:
+        return [name for name in names if self.matches(name)]